@@ -0,0 +1,48 @@
+"""Add catalog_sync_runs checkpoint table
+
+Revision ID: 3f6c1d8e2a7b
+Revises: 5e0f7a2c9d41
+Create Date: 2026-10-19 11:20:37.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c1d8e2a7b'
+down_revision: Union[str, None] = '5e0f7a2c9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('catalog_sync_runs',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('next_page', sa.Integer(), nullable=False),
+        sa.Column('expected_pages', sa.Integer(), nullable=True),
+        sa.Column('rows_written', sa.Integer(), nullable=False),
+        sa.Column('inserted_count', sa.Integer(), nullable=False),
+        sa.Column('updated_count', sa.Integer(), nullable=False),
+        sa.Column('unchanged_count', sa.Integer(), nullable=False),
+        sa.Column('deactivated_count', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('attempt_start_page', sa.Integer(), nullable=False),
+        sa.Column('attempt_started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_catalog_sync_runs'))
+    )
+    op.create_index(op.f('ix_catalog_sync_runs_source'), 'catalog_sync_runs', ['source'], unique=False)
+    op.create_index(op.f('ix_catalog_sync_runs_status'), 'catalog_sync_runs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_catalog_sync_runs_status'), table_name='catalog_sync_runs')
+    op.drop_index(op.f('ix_catalog_sync_runs_source'), table_name='catalog_sync_runs')
+    op.drop_table('catalog_sync_runs')
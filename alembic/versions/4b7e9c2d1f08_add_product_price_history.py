@@ -0,0 +1,36 @@
+"""Add change-only product price history
+
+Revision ID: 4b7e9c2d1f08
+Revises: 8d2e4b6a1c93
+Create Date: 2026-10-19 18:42:37.915204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e9c2d1f08'
+down_revision: Union[str, None] = '8d2e4b6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('product_price_history',
+        sa.Column('gift_id', sa.Text(), nullable=False),
+        sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('price', sa.Numeric(), nullable=False),
+        sa.ForeignKeyConstraint(['gift_id'], ['products.gift_id'], name=op.f('fk_product_price_history_gift_id_products'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('gift_id', 'ts', name=op.f('pk_product_price_history'))
+    )
+    # Seed one point per product with its current price, so windows have a starting price
+    op.execute(
+        "INSERT INTO product_price_history (gift_id, ts, price) "
+        "SELECT gift_id, COALESCE(updated_at, now()), price FROM products WHERE price IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_price_history')
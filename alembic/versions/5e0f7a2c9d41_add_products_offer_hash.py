@@ -0,0 +1,25 @@
+"""Add products.offer_hash
+
+Revision ID: 5e0f7a2c9d41
+Revises: cbbc021f4c0c
+Create Date: 2026-10-19 10:05:12.473518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0f7a2c9d41'
+down_revision: Union[str, None] = 'cbbc021f4c0c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('offer_hash', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('products', 'offer_hash')
@@ -0,0 +1,38 @@
+"""Add near-duplicate index (title_simhash, duplicate_cluster_id, LSH buckets)
+
+Revision ID: 8d2e4b6a1c93
+Revises: 3f6c1d8e2a7b
+Create Date: 2026-10-19 14:05:12.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a1c93'
+down_revision: Union[str, None] = '3f6c1d8e2a7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('title_simhash', sa.BigInteger(), nullable=True))
+    op.add_column('products', sa.Column('duplicate_cluster_id', sa.Text(), nullable=True))
+    op.create_index(op.f('ix_products_duplicate_cluster_id'), 'products', ['duplicate_cluster_id'], unique=False)
+    op.create_table('product_duplicate_buckets',
+        sa.Column('bucket', sa.Text(), nullable=False),
+        sa.Column('gift_id', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['gift_id'], ['products.gift_id'], name=op.f('fk_product_duplicate_buckets_gift_id_products'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'gift_id', name=op.f('pk_product_duplicate_buckets'))
+    )
+    op.create_index(op.f('ix_product_duplicate_buckets_gift_id'), 'product_duplicate_buckets', ['gift_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_product_duplicate_buckets_gift_id'), table_name='product_duplicate_buckets')
+    op.drop_table('product_duplicate_buckets')
+    op.drop_index(op.f('ix_products_duplicate_cluster_id'), table_name='products')
+    op.drop_column('products', 'duplicate_cluster_id')
+    op.drop_column('products', 'title_simhash')
@@ -0,0 +1,35 @@
+"""Add lease columns to compute_tasks
+
+Revision ID: 9a3f5d7e2b61
+Revises: 4b7e9c2d1f08
+Create Date: 2026-10-19 20:11:05.604718
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f5d7e2b61'
+down_revision: Union[str, None] = '4b7e9c2d1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('compute_tasks', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('compute_tasks', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    # Tasks claimed before leases existed: give them one lease from now, after that they are reclaimable
+    op.execute(
+        "UPDATE compute_tasks SET lease_expires_at = now() + interval '5 minutes', attempts = 1 "
+        "WHERE status = 'processing'"
+    )
+    # Claim order of the queue: what is claimable, by priority, oldest first
+    op.create_index('ix_compute_tasks_claim', 'compute_tasks', ['status', 'priority', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_compute_tasks_claim', table_name='compute_tasks')
+    op.drop_column('compute_tasks', 'attempts')
+    op.drop_column('compute_tasks', 'lease_expires_at')
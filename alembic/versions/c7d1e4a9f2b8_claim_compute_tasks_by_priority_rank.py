@@ -0,0 +1,43 @@
+"""Claim compute_tasks by a stored priority rank
+
+Revision ID: c7d1e4a9f2b8
+Revises: 9a3f5d7e2b61
+Create Date: 2026-10-19 23:02:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d1e4a9f2b8'
+down_revision: Union[str, None] = '9a3f5d7e2b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PRIORITY_RANK_SQL = "CASE priority WHEN 'high' THEN 0 WHEN 'low' THEN 1 ELSE 2 END"
+
+
+def upgrade() -> None:
+    # (status, priority, created_at) can't serve ORDER BY <rank of priority>, created_at over the claimable rows
+    op.drop_index('ix_compute_tasks_claim', table_name='compute_tasks')
+    op.add_column(
+        'compute_tasks',
+        sa.Column('priority_rank', sa.SmallInteger(), sa.Computed(PRIORITY_RANK_SQL, persisted=True), nullable=False),
+    )
+    op.create_index(
+        'ix_compute_tasks_pending', 'compute_tasks', ['priority_rank', 'created_at'], unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        'ix_compute_tasks_lease', 'compute_tasks', ['lease_expires_at'], unique=False,
+        postgresql_where=sa.text("status = 'processing'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_compute_tasks_lease', table_name='compute_tasks')
+    op.drop_index('ix_compute_tasks_pending', table_name='compute_tasks')
+    op.drop_column('compute_tasks', 'priority_rank')
+    op.create_index('ix_compute_tasks_claim', 'compute_tasks', ['status', 'priority', 'created_at'], unique=False)
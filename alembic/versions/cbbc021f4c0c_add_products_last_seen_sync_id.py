@@ -0,0 +1,25 @@
+"""Add products.last_seen_sync_id
+
+Revision ID: cbbc021f4c0c
+Revises: 77b8e12855d2
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'cbbc021f4c0c'
+down_revision: Union[str, None] = '77b8e12855d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('last_seen_sync_id', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('products', 'last_seen_sync_id')
@@ -77,6 +77,11 @@ class Settings(BaseSettings):
     takprodam_api_token: Optional[str] = Field(None, alias="TAKPRODAM_API_TOKEN")
     takprodam_source_id: Optional[int] = Field(None, alias="TAKPRODAM_SOURCE_ID")
 
+    # Parsing scheduler: the scraper fleet it publishes for (see queue_capacity in app/jobs/parsing_scheduler.py)
+    scraper_workers: int = Field(1, alias="SCRAPER_WORKERS")
+    scraper_concurrency: int = Field(4, alias="MAX_CONCURRENT_TASKS")
+    parsing_max_queued: Optional[int] = Field(None, alias="PARSING_MAX_QUEUED")
+
     # Intelligence API
     internal_api_token: str = Field("default_internal_token", alias="INTERNAL_API_TOKEN")
     intelligence_api_base: str = Field("https://api.giftyai.ru", alias="INTELLIGENCE_API_BASE")
@@ -1,32 +1,41 @@
 from __future__ import annotations
 
 import logging
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
 from app.db import get_session_context
+from app.jobs.catalog_sync_pipeline import BatchNormalizer, CatalogSyncPipeline, PageFetcher, UpsertWriter
 from app.repositories.catalog import PostgresCatalogRepository
 from integrations.takprodam.sync_client import TakprodamSyncClient
-from app.utils.catalog import build_content_text, build_content_hash
+from app.utils.catalog import build_content_text, build_content_hash, build_offer_hash
 
 logger = logging.getLogger(__name__)
 
+SOURCE_PREFIX = "takprodam"
+# A `running` run without a checkpoint for this long belongs to a dead process and may be resumed
+RESUME_RUNNING_AFTER = timedelta(minutes=15)
+
 
 def _normalize_product(item: dict) -> dict:
     """Convert Takprodam item to local Product model usage."""
     # Mapping based on the actual Takprodam response provided by the user
-    gift_id = f"takprodam:{item['id']}"
+    gift_id = f"{SOURCE_PREFIX}:{item['id']}"
     content_text = build_content_text(item)
     image_url = item.get("image_url")
+    price = float(item["price"]) if item.get("price") else None
+    currency = item.get("currency", "RUB")
     
     return {
         "gift_id": gift_id,
         "title": item.get("title") or "Untitled",
         "description": item.get("description"),
-        "price": float(item["price"]) if item.get("price") else None,
-        "currency": item.get("currency", "RUB"),
+        "price": price,
+        "currency": currency,
         "image_url": image_url,
         "product_url": item.get("tracking_link") or item.get("external_link") or "",
         "merchant": item.get("store_title"),
@@ -35,15 +44,36 @@ def _normalize_product(item: dict) -> dict:
         "is_active": True,
         "content_text": content_text,
         "content_hash": build_content_hash(content_text, image_url),
+        "offer_hash": build_offer_hash(price, currency, True),
     }
 
 
-async def catalog_sync_full(source_id: int | None = None) -> dict[str, Any]:
+def normalize_batch(items: list[dict]) -> list[dict]:
+    """Normalizes one Takprodam page. Module-level so it can run in a process pool."""
+    return [_normalize_product(item) for item in items if item.get("id")]
+
+
+async def catalog_sync_full(
+    source_id: int | None = None,
+    batch_size: int = 1000,
+    concurrency: int = 4,
+    max_pages: int | None = None,
+    resume: bool = True,
+    write_batch_size: int = 2000,
+) -> dict[str, Any]:
     """
     Full catalog synchronization job.
-    1. Iterates all pages from Takprodam.
-    2. Upserts products to DB.
+    1. Prefetches pages from Takprodam (`concurrency` requests in flight).
+    2. Normalizes and upserts them to DB, overlapped with fetching. Only new or
+       changed rows (by content_hash / offer_hash) are actually rewritten.
     3. Handles identifying inactive products (soft delete logic marks others as is_active=False).
+
+    Progress is checkpointed to `catalog_sync_runs` with every committed batch.
+    With `resume=True` an unfinished run continues from its last committed page
+    under the same sync generation, so the final sweep still sees every product
+    stamped by the earlier attempt. Only the latest run is resumed (an older unfinished
+    one is superseded by the runs after it), and a run still checkpointing in another
+    process is left alone: the job then returns with status "skipped".
     """
     settings = get_settings()
     client = TakprodamSyncClient(
@@ -51,46 +81,131 @@ async def catalog_sync_full(source_id: int | None = None) -> dict[str, Any]:
         api_base=settings.takprodam_api_base,
         api_token=settings.takprodam_api_token,
     )
-    total_synced = 0
-    pages_count = 0
-    
-    # We collect all IDs seen in this run to mark others as inactive later.
-    seen_ids = set()
+    deactivated_count = 0
 
     async with get_session_context() as session:
         repo = PostgresCatalogRepository(session)
-        
-        for batch in client.iter_all_products():
-            normalized_batch = []
-            for item in batch:
-                if not item.get("id"):
-                    continue
-                product = _normalize_product(item)
-                normalized_batch.append(product)
-                seen_ids.add(product["gift_id"])
-            
-            if normalized_batch:
-                count = await repo.upsert_products(normalized_batch)
-                total_synced += count
-                await session.commit()
-            
-            pages_count += 1
-            if pages_count % 10 == 0:
-                logger.info("Synced %d pages, %d products...", pages_count, total_synced)
-
-        # Soft-delete logic
-        if seen_ids:
-            logger.info("Marking inactive products (soft-delete)...")
-            deactivated_count = await repo.mark_inactive_except(seen_ids)
+
+        run = await repo.get_latest_sync_run(SOURCE_PREFIX) if resume else None
+        if run is not None and run.status not in ("running", "failed"):
+            run = None
+        if run is not None:
+            stale_before = datetime.now(timezone.utc) - RESUME_RUNNING_AFTER
+            sync_id = run.id
+            if not await repo.claim_sync_run(sync_id, stale_before=stale_before):
+                await session.rollback()
+                logger.warning("Catalog sync %s is still running in another process, not starting", sync_id)
+                return {"sync_id": sync_id, "status": "skipped", "reason": "sync already running"}
+            await session.refresh(run)
+            start_page = run.next_page
+            writer = UpsertWriter(
+                session, repo, sync_id=sync_id, write_batch_size=write_batch_size, checkpoint=True, next_page=start_page
+            )
+            writer.restore(run.rows_written, run.inserted_count, run.updated_count, run.unchanged_count)
+            logger.info("Resuming catalog sync %s from page %d", sync_id, start_page)
+        else:
+            # Monotonic generation stamped on every row seen by this run (mark phase)
+            sync_id = time.time_ns() // 1_000_000
+            start_page = 1
+            last = await repo.get_latest_sync_run(SOURCE_PREFIX, statuses=("completed",))
+            await repo.create_sync_run(sync_id, SOURCE_PREFIX, expected_pages=last.next_page - 1 if last else None)
+            writer = UpsertWriter(session, repo, sync_id=sync_id, write_batch_size=write_batch_size, checkpoint=True)
+        await session.commit()
+
+        pipeline = CatalogSyncPipeline(
+            fetcher=PageFetcher(
+                client, batch_size=batch_size, concurrency=concurrency, max_pages=max_pages, start_page=start_page
+            ),
+            normalizer=BatchNormalizer(normalize_batch),
+            writer=writer,
+        )
+        try:
+            stats = await pipeline.run()
+        except Exception as e:
+            # Committed batches and the checkpoint survive; the next run resumes from there
+            await session.rollback()
+            await repo.update_sync_run(sync_id, status="failed", error_message=str(e)[:1000])
             await session.commit()
+            raise
+
+        # Soft-delete logic (sweep phase). A run that saw nothing is most likely
+        # a broken sync, so we never deactivate the whole source in that case.
+        if writer.rows_written:
+            logger.info("Marking inactive products (soft-delete)...")
+            deactivated_count = await repo.deactivate_unseen(SOURCE_PREFIX, sync_id)
             logger.info("Deactivated %d products.", deactivated_count)
+
+        await repo.update_sync_run(
+            sync_id,
+            status="completed",
+            deactivated_count=deactivated_count,
+            finished_at=datetime.now(timezone.utc),
+        )
+        await session.commit()
         
         final_count = await repo.get_active_products_count()
-        logger.info("Sync complete. Total synced: %d. Active in DB: %d", total_synced, final_count)
+        logger.info(
+            "Sync complete. Total synced: %d (inserted %d, updated %d, unchanged %d). Active in DB: %d",
+            writer.rows_written,
+            writer.inserted,
+            writer.updated,
+            writer.unchanged,
+            final_count,
+        )
     
     return {
-        "synced_count": total_synced,
-        "pages_processed": pages_count,
-        "deactivated_count": deactivated_count if seen_ids else 0,
-        "status": "success"
+        "sync_id": sync_id,
+        "resumed_from_page": start_page if start_page > 1 else None,
+        "synced_count": writer.rows_written,
+        "inserted_count": writer.inserted,
+        "updated_count": writer.updated,
+        "unchanged_count": writer.unchanged,
+        "pages_processed": writer.next_page - 1,
+        "deactivated_count": deactivated_count,
+        "status": "success",
+        "metrics": stats.as_dict(),
+    }
+
+
+def describe_sync_run(run, now: datetime | None = None) -> dict[str, Any]:
+    """Progress of a catalog sync run with a rough ETA based on the current attempt's page rate."""
+    now = now or datetime.now(timezone.utc)
+    pages_done = run.next_page - 1
+    progress = eta_s = pages_per_sec = None
+
+    started_at = run.attempt_started_at
+    if started_at is not None and started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    if started_at is not None:
+        elapsed = (now - started_at).total_seconds()
+        attempt_pages = run.next_page - run.attempt_start_page
+        if elapsed > 0 and attempt_pages > 0:
+            pages_per_sec = attempt_pages / elapsed
+    if run.expected_pages:
+        progress = min(1.0, pages_done / run.expected_pages)
+        if run.status == "running" and pages_per_sec:
+            eta_s = max(0, run.expected_pages - pages_done) / pages_per_sec
+
+    return {
+        "sync_id": run.id,
+        "status": run.status,
+        "pages_done": pages_done,
+        "expected_pages": run.expected_pages,
+        "progress": round(progress, 4) if progress is not None else None,
+        "pages_per_sec": round(pages_per_sec, 2) if pages_per_sec else None,
+        "eta_s": round(eta_s) if eta_s is not None else None,
+        "rows_written": run.rows_written,
+        "inserted_count": run.inserted_count,
+        "updated_count": run.updated_count,
+        "unchanged_count": run.unchanged_count,
+        "deactivated_count": run.deactivated_count,
+        "attempts": run.attempts,
+        "error_message": run.error_message,
     }
+
+
+async def get_catalog_sync_status() -> dict[str, Any] | None:
+    """Status of the latest catalog sync run (for `scripts/run_sync.py status`)."""
+    async with get_session_context() as session:
+        run = await PostgresCatalogRepository(session).get_latest_sync_run(SOURCE_PREFIX)
+        return describe_sync_run(run) if run is not None else None
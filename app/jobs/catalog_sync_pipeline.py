@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional
+
+import httpx
+
+from app.services.near_duplicates import NearDuplicateIndex
+from integrations.takprodam.sync_client import TakprodamSyncClient
+
+logger = logging.getLogger(__name__)
+
+NormalizeFn = Callable[[list[dict]], list[dict]]
+
+_DONE = object()
+
+
+@dataclass
+class StageMetrics:
+    """Throughput counters of a single pipeline stage."""
+    name: str
+    batches: int = 0
+    items: int = 0
+    busy_s: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def start(self) -> None:
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+
+    def record(self, items: int, elapsed_s: float) -> None:
+        self.batches += 1
+        self.items += items
+        self.busy_s += elapsed_s
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    @property
+    def wall_s(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.items / self.wall_s if self.wall_s > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "busy_s": round(self.busy_s, 3),
+            "wall_s": round(self.wall_s, 3),
+            "items_per_sec": round(self.items_per_sec, 1),
+        }
+
+
+@dataclass
+class PipelineStats:
+    fetch: StageMetrics = field(default_factory=lambda: StageMetrics("fetch"))
+    normalize: StageMetrics = field(default_factory=lambda: StageMetrics("normalize"))
+    write: StageMetrics = field(default_factory=lambda: StageMetrics("write"))
+    elapsed_s: float = 0.0
+
+    @property
+    def pages(self) -> int:
+        return self.fetch.batches
+
+    @property
+    def rows(self) -> int:
+        return self.write.items
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "elapsed_s": round(self.elapsed_s, 3),
+            "pages": self.pages,
+            "rows": self.rows,
+            "pages_per_sec": round(self.pages_per_sec, 2),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "stages": {m.name: m.as_dict() for m in (self.fetch, self.normalize, self.write)},
+        }
+
+
+class PageFetcher:
+    """
+    Prefetches Takprodam pages with up to `concurrency` requests in flight.
+    Pages are yielded strictly in page order, so downstream stages (and
+    checkpoints) always see a contiguous prefix of the catalog.
+    """
+
+    def __init__(
+        self,
+        client: TakprodamSyncClient,
+        batch_size: int = 1000,
+        concurrency: int = 4,
+        max_pages: Optional[int] = None,
+        start_page: int = 1,
+        timeout_s: Optional[float] = None,
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_pages = max_pages
+        self.start_page = start_page
+        self.timeout_s = timeout_s or client.timeout_s
+        self.metrics = StageMetrics("fetch")
+
+    async def _fetch(self, http: httpx.AsyncClient, page: int) -> tuple[list[dict], float]:
+        started = time.perf_counter()
+        items = await self.client.aget_products_page(http, page=page, limit=self.batch_size)
+        return items, time.perf_counter() - started
+
+    async def pages(self) -> AsyncIterator[tuple[int, list[dict]]]:
+        self.metrics.start()
+        in_flight: dict[int, asyncio.Task] = {}
+        next_page = self.start_page
+        exhausted = False
+
+        async with httpx.AsyncClient(timeout=self.timeout_s) as http:
+            def schedule() -> None:
+                nonlocal next_page
+                while not exhausted and len(in_flight) < self.concurrency:
+                    if self.max_pages and next_page > self.max_pages:
+                        return
+                    in_flight[next_page] = asyncio.create_task(self._fetch(http, next_page))
+                    next_page += 1
+
+            try:
+                schedule()
+                expected = self.start_page
+                while expected in in_flight:
+                    items, elapsed_s = await in_flight.pop(expected)
+                    if len(items) < self.batch_size:
+                        # Last page: drop speculative requests past the end
+                        exhausted = True
+                        for task in in_flight.values():
+                            task.cancel()
+                        in_flight.clear()
+                    if items:
+                        # Only pages that reach the pipeline count; speculative ones past the end don't
+                        self.metrics.record(len(items), elapsed_s)
+                        logger.debug("Fetched Takprodam page %s (%s items)", expected, len(items))
+                        yield expected, items
+                    expected += 1
+                    schedule()
+            finally:
+                for task in in_flight.values():
+                    task.cancel()
+                if in_flight:
+                    await asyncio.gather(*in_flight.values(), return_exceptions=True)
+                self.metrics.finish()
+
+
+class BatchNormalizer:
+    """
+    Runs the normalization function inline for small pages and in a process
+    pool for large ones, so CPU-heavy hashing does not stall the event loop.
+    """
+
+    def __init__(
+        self,
+        normalize: NormalizeFn,
+        process_pool_threshold: int = 2000,
+        max_workers: Optional[int] = None,
+    ):
+        self.normalize = normalize
+        self.process_pool_threshold = process_pool_threshold
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.metrics = StageMetrics("normalize")
+
+    async def __call__(self, items: list[dict]) -> list[dict]:
+        self.metrics.start()
+        started = time.perf_counter()
+        if self.process_pool_threshold and len(items) >= self.process_pool_threshold:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(self._pool, self.normalize, items)
+        else:
+            rows = self.normalize(items)
+        self.metrics.record(len(rows), time.perf_counter() - started)
+        return rows
+
+    def close(self) -> None:
+        self.metrics.finish()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class UpsertWriter:
+    """
+    Coalesces normalized rows into large batches and upserts them through the
+    catalog repository, committing once per batch. Every row is stamped with
+    `sync_id`, so the run never has to remember which gift_ids it has seen.
+    Unchanged rows are skipped by the change-aware upsert and only counted.
+
+    With `checkpoint=True` the page cursor and counters are written to the
+    `catalog_sync_runs` row in the same transaction as each batch, so a
+    restarted run can continue from `next_page`.
+    """
+
+    def __init__(
+        self,
+        session,
+        repo,
+        sync_id: Optional[int] = None,
+        write_batch_size: int = 2000,
+        checkpoint: bool = False,
+        next_page: int = 1,
+    ):
+        self.session = session
+        self.repo = repo
+        self.sync_id = sync_id
+        self.write_batch_size = write_batch_size
+        self.checkpoint = checkpoint
+        self.next_page = next_page
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rows_written = 0
+        self._buffer: dict[str, dict] = {}
+        self._last_page: Optional[int] = None
+        self.metrics = StageMetrics("write")
+        self.duplicates = NearDuplicateIndex(repo)
+
+    def restore(self, rows_written: int = 0, inserted: int = 0, updated: int = 0, unchanged: int = 0) -> None:
+        """Continue the counters of an interrupted run."""
+        self.rows_written = rows_written
+        self.inserted = inserted
+        self.updated = updated
+        self.unchanged = unchanged
+
+    async def add(self, rows: list[dict], page: Optional[int] = None) -> None:
+        self.metrics.start()
+        for i, row in enumerate(rows):
+            # Pages can overlap when the catalog shifts during the run;
+            # a single INSERT ... ON CONFLICT must not touch the same row twice.
+            self._buffer[row["gift_id"]] = row
+            if len(self._buffer) >= self.write_batch_size:
+                # Mid-page flush: the rest of `page` is not committed yet
+                committed = page if page is None or i == len(rows) - 1 else page - 1
+                await self.flush(committed_page=committed)
+        if page is not None:
+            self._last_page = page
+
+    async def flush(self, committed_page: Optional[int] = None) -> None:
+        advanced = committed_page is not None and committed_page >= self.next_page
+        if not self._buffer and not (self.checkpoint and advanced):
+            return
+
+        started = time.perf_counter()
+        batch = list(self._buffer.values())
+        self._buffer = {}
+        if batch:
+            changed_ids: list[str] = []
+            counts = await self.repo.upsert_changed_products(batch, sync_id=self.sync_id, changed_ids=changed_ids)
+            if changed_ids:
+                changed = set(changed_ids)
+                await self.duplicates.assign([row for row in batch if row["gift_id"] in changed])
+            self.inserted += counts["inserted"]
+            self.updated += counts["updated"]
+            self.unchanged += counts["unchanged"]
+            self.rows_written += len(batch)
+        if advanced:
+            self.next_page = committed_page + 1
+        if self.checkpoint:
+            await self.repo.update_sync_run(
+                self.sync_id,
+                next_page=self.next_page,
+                rows_written=self.rows_written,
+                inserted_count=self.inserted,
+                updated_count=self.updated,
+                unchanged_count=self.unchanged,
+            )
+        await self.session.commit()
+        if batch:
+            self.metrics.record(len(batch), time.perf_counter() - started)
+
+    async def close(self) -> None:
+        await self.flush(committed_page=self._last_page)
+        self.metrics.finish()
+
+
+class CatalogSyncPipeline:
+    """fetch -> normalize -> write, connected by bounded queues and run concurrently."""
+
+    def __init__(
+        self,
+        fetcher: PageFetcher,
+        normalizer: BatchNormalizer,
+        writer: UpsertWriter,
+        queue_size: int = 4,
+    ):
+        self.fetcher = fetcher
+        self.normalizer = normalizer
+        self.writer = writer
+        self.queue_size = queue_size
+        self.stats = PipelineStats(fetch=fetcher.metrics, normalize=normalizer.metrics, write=writer.metrics)
+        self._fetch_error: Optional[BaseException] = None
+
+    async def _fetch_stage(self, out: asyncio.Queue) -> None:
+        try:
+            async for page, items in self.fetcher.pages():
+                await out.put((page, items))
+        except Exception as e:
+            # Let the downstream stages drain (and checkpoint) the pages fetched so far,
+            # the error is re-raised once the writer has finished.
+            self._fetch_error = e
+        finally:
+            await out.put(_DONE)
+
+    async def _normalize_stage(self, inp: asyncio.Queue, out: asyncio.Queue) -> None:
+        try:
+            while (entry := await inp.get()) is not _DONE:
+                page, items = entry
+                await out.put((page, await self.normalizer(items)))
+        finally:
+            self.normalizer.close()
+            await out.put(_DONE)
+
+    async def _write_stage(self, inp: asyncio.Queue) -> None:
+        while (entry := await inp.get()) is not _DONE:
+            page, rows = entry
+            await self.writer.add(rows, page=page)
+        await self.writer.close()
+
+    async def run(self) -> PipelineStats:
+        started = time.perf_counter()
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        normalized: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._fetch_stage(fetched)),
+            asyncio.create_task(self._normalize_stage(fetched, normalized)),
+            asyncio.create_task(self._write_stage(normalized)),
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+            if self._fetch_error is not None:
+                raise self._fetch_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.stats.elapsed_s = time.perf_counter() - started
+
+        logger.info(
+            "Catalog sync pipeline: %d pages, %d rows in %.1fs (%.2f pages/s, %.1f rows/s)",
+            self.stats.pages,
+            self.stats.rows,
+            self.stats.elapsed_s,
+            self.stats.pages_per_sec,
+            self.stats.rows_per_sec,
+        )
+        return self.stats
@@ -1,16 +1,68 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Optional
 
 from app.db import get_session_context
 from app.repositories.catalog import PostgresCatalogRepository
+from app.services.embedding_queue import EmbeddingQueue
 from app.services.embeddings import EmbeddingService
 from app.core.logic_config import logic_config
 
 logger = logging.getLogger(__name__)
 
 
+async def _embed_products(repo, embedding_service, products: list, model_name: str, model_version: str) -> list[dict]:
+    """
+    Rows for `save_embeddings`. Near-duplicates (same `duplicate_cluster_id`) share
+    a vector: it is copied from an already embedded cluster member, and within the
+    batch the model runs once per cluster.
+    """
+    cluster_ids = sorted({p.duplicate_cluster_id for p in products if p.duplicate_cluster_id})
+    cluster_vectors = await repo.get_cluster_embeddings(
+        cluster_ids, model_name, model_version, exclude_ids=[p.gift_id for p in products]
+    ) if cluster_ids else {}
+
+    to_embed = []
+    pending_clusters = set()
+    for p in products:
+        cluster_id = p.duplicate_cluster_id
+        if cluster_id and (cluster_id in cluster_vectors or cluster_id in pending_clusters):
+            continue
+        if cluster_id:
+            pending_clusters.add(cluster_id)
+        to_embed.append(p)
+
+    own_vectors = {}
+    if to_embed:
+        vectors = await embedding_service.embed_batch_async([p.content_text or "" for p in to_embed])
+        for p, vector in zip(to_embed, vectors):
+            own_vectors[p.gift_id] = vector
+            if p.duplicate_cluster_id:
+                cluster_vectors.setdefault(p.duplicate_cluster_id, vector)
+
+    reused = len(products) - len(to_embed)
+    if reused:
+        logger.info(f"Reused cluster vectors for {reused}/{len(products)} products")
+
+    rows = []
+    for p in products:
+        vector = own_vectors.get(p.gift_id)
+        if vector is None:
+            vector = cluster_vectors[p.duplicate_cluster_id]
+        rows.append({
+            "gift_id": p.gift_id,
+            "model_name": model_name,
+            "model_version": model_version,
+            "dim": len(vector),
+            "embedding": vector,
+            # Own hash: the product is up to date even though the vector is shared
+            "content_hash": p.content_hash,
+        })
+    return rows
+
+
 async def process_embeddings_job(
     batch_size: int = 32,
     limit_total: Optional[int] = None,
@@ -47,29 +99,16 @@ async def process_embeddings_job(
                 logger.info("No more products to embed.")
                 break
             
-            # 2. Extract texts
-            texts = [p.content_text or "" for p in products]
-            
-            # 3. Generate embeddings
+            # 2-3. Generate embeddings (near-duplicates reuse their cluster's vector)
             try:
-                vectors = await embedding_service.embed_batch_async(texts)
+                embeddings_data = await _embed_products(
+                    repo, embedding_service, products, actual_model, model_version
+                )
             except Exception as e:
                 logger.error(f"Failed to embed batch: {e}", exc_info=True)
                 break
             
-            # 4. Prepare data for save
-            embeddings_data = []
-            for product, vector in zip(products, vectors):
-                embeddings_data.append({
-                    "gift_id": product.gift_id,
-                    "model_name": actual_model,
-                    "model_version": model_version,
-                    "dim": len(vector),
-                    "embedding": vector,
-                    "content_hash": product.content_hash,
-                })
-            
-            # 5. Save to DB
+            # 4. Save to DB
             saved_count = await repo.save_embeddings(embeddings_data)
             await session.commit()
             
@@ -77,3 +116,59 @@ async def process_embeddings_job(
             logger.info(f"Processed batch of {saved_count} products. Total: {total_processed}")
 
     logger.info(f"Embeddings job finished. Total processed: {total_processed}")
+
+
+async def process_embedding_queue(
+    redis=None,
+    batch_size: int = 32,
+    model_name: Optional[str] = None,
+    model_version: str = "1.0",
+    idle_sleep_s: float = 1.0,
+    max_batches: Optional[int] = None,
+    embedding_service: Optional[EmbeddingService] = None,
+    session_factory=get_session_context,
+) -> int:
+    """
+    Incremental counterpart of `process_embeddings_job`: embeds only the gift_ids
+    pushed to the EmbeddingQueue by ingestion, so freshly scraped products become
+    searchable within seconds. Runs until `max_batches` batches are done (forever if None).
+    A failed batch is put back on the queue.
+    """
+    actual_model = model_name or logic_config.model_embedding
+    embedding_service = embedding_service or EmbeddingService(model_name=actual_model)
+    queue = EmbeddingQueue(redis)
+    total_processed = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        gift_ids = await queue.pop(batch_size)
+        if not gift_ids:
+            if max_batches is not None:
+                break
+            await asyncio.sleep(idle_sleep_s)
+            continue
+        batches += 1
+
+        async with session_factory() as session:
+            repo = PostgresCatalogRepository(session)
+            products = await repo.get_products_by_ids(gift_ids)
+            if not products:
+                continue
+
+            try:
+                embeddings_data = await _embed_products(
+                    repo, embedding_service, products, actual_model, model_version
+                )
+            except Exception as e:
+                logger.error(f"Failed to embed queued batch, requeueing {len(gift_ids)} ids: {e}", exc_info=True)
+                await queue.enqueue(gift_ids)
+                await asyncio.sleep(idle_sleep_s)
+                continue
+
+            saved_count = await repo.save_embeddings(embeddings_data)
+            await session.commit()
+
+        total_processed += saved_count
+        logger.info(f"Embedded {saved_count} queued products. Total: {total_processed}")
+
+    return total_processed
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Optional
+
+import orjson
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import ValidationError
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.db import get_session_context
+from app.schemas.parsing import IngestBatchRequest
+from app.services.ingestion import IngestionService
+from app.utils.ingest_queue import IngestMessage
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_DEPTH = Gauge("ingest_queue_depth", "Ready messages waiting in the ingest queue")
+INGEST_QUEUE_LAG = Histogram(
+    "ingest_queue_lag_seconds",
+    "Time from publishing an ingest batch to committing it",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600),
+)
+INGEST_CONSUMER_MESSAGES = Counter(
+    "ingest_consumer_messages_total",
+    "Ingest queue messages by outcome",
+    ["status"],  # acked, requeued, rejected
+)
+INGEST_CONSUMER_FLUSH_ITEMS = Histogram(
+    "ingest_consumer_flush_items",
+    "Items per coalesced bulk upsert",
+    buckets=(10, 50, 100, 250, 500, 1000, 2000, 5000),
+)
+
+# Errors worth retrying later (DB restart, network); anything else is treated as a bad batch
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, ConnectionError, OSError, asyncio.TimeoutError)
+
+
+class IngestionConsumer:
+    """
+    Drains the ingest queue into the catalog.
+    Deliveries are coalesced per source and crawl run into one `IngestionService.ingest_batch`
+    call (one bulk upsert, one commit) until `max_batch_items` items are pending or
+    the oldest pending message waited `max_wait_s`. Messages are acked only after
+    their commit; on a transient failure they are requeued, on a data error the
+    group is retried message by message and the offending one is rejected.
+    """
+
+    def __init__(
+        self,
+        broker,
+        session_factory=get_session_context,
+        redis=None,
+        max_batch_items: int = 2000,
+        max_wait_s: float = 1.0,
+        retry_delay_s: float = 5.0,
+        depth_interval_s: float = 15.0,
+    ):
+        self.broker = broker
+        self.session_factory = session_factory
+        self.redis = redis
+        self.max_batch_items = max_batch_items
+        self.max_wait_s = max_wait_s
+        self.retry_delay_s = retry_delay_s
+        self.depth_interval_s = depth_interval_s
+        # Never wait for more deliveries than the broker will hand out unacked
+        self.max_batch_messages = getattr(broker, "prefetch", None)
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def run(self) -> None:
+        depth_task = asyncio.create_task(self._depth_loop())
+        pending: list[tuple[IngestMessage, IngestBatchRequest]] = []
+        pending_items = 0
+        deadline = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = max(0.0, deadline - time.monotonic()) if pending else self.max_wait_s
+                message = await self._next_message(timeout)
+
+                if message is not None:
+                    request = await self._decode(message)
+                    if request is not None:
+                        if not pending:
+                            deadline = time.monotonic() + self.max_wait_s
+                        pending.append((message, request))
+                        pending_items += len(request.items) + len(request.categories)
+
+                if pending and (
+                    message is None
+                    or pending_items >= self.max_batch_items
+                    or (self.max_batch_messages and len(pending) >= self.max_batch_messages)
+                    or time.monotonic() >= deadline
+                ):
+                    await self.flush(pending)
+                    pending, pending_items = [], 0
+        finally:
+            if pending:
+                await self.flush(pending)
+            depth_task.cancel()
+
+    async def _next_message(self, timeout: float) -> Optional[IngestMessage]:
+        """`broker.get` that returns early (None) once `stop()` is called."""
+        getter = asyncio.ensure_future(self.broker.get(timeout=timeout))
+        stopper = asyncio.ensure_future(self._stop.wait())
+        await asyncio.wait({getter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        stopper.cancel()
+        if not getter.done():
+            getter.cancel()
+        try:
+            # A delivery that raced with the cancellation is still returned (and flushed)
+            return await getter
+        except asyncio.CancelledError:
+            return None
+
+    async def _decode(self, message: IngestMessage) -> Optional[IngestBatchRequest]:
+        try:
+            return IngestBatchRequest.model_validate(orjson.loads(message.body))
+        except (orjson.JSONDecodeError, ValidationError) as e:
+            logger.error(f"Rejecting malformed ingest message: {e}")
+            await message.nack(requeue=False)
+            INGEST_CONSUMER_MESSAGES.labels(status="rejected").inc()
+            return None
+
+    async def flush(self, pending: list[tuple[IngestMessage, IngestBatchRequest]]) -> None:
+        groups: dict[tuple[int, Optional[str]], list[tuple[IngestMessage, IngestBatchRequest]]] = defaultdict(list)
+        for message, request in pending:
+            # Stats are buffered per run, so batches of two runs of a source are never merged
+            groups[(request.source_id, request.run_id)].append((message, request))
+
+        transient_failure = False
+        for (source_id, _), entries in groups.items():
+            try:
+                await self._ingest(source_id, entries)
+            except TRANSIENT_ERRORS as e:
+                logger.error(f"Ingest of source {source_id} failed, requeueing {len(entries)} messages: {e}")
+                await self._settle(entries, requeue=True)
+                transient_failure = True
+            except Exception as e:
+                if len(entries) == 1:
+                    logger.error(f"Rejecting ingest message for source {source_id}: {e}")
+                    await self._settle(entries, requeue=False)
+                    continue
+                # Find the bad message(s) without dropping the good ones
+                logger.warning(f"Coalesced ingest for source {source_id} failed ({e}), retrying one by one")
+                for entry in entries:
+                    try:
+                        await self._ingest(source_id, [entry])
+                    except TRANSIENT_ERRORS:
+                        await self._settle([entry], requeue=True)
+                        transient_failure = True
+                    except Exception as inner:
+                        logger.error(f"Rejecting ingest message for source {source_id}: {inner}")
+                        await self._settle([entry], requeue=False)
+
+        if transient_failure:
+            await asyncio.sleep(self.retry_delay_s)
+
+    async def _ingest(self, source_id: int, entries: list[tuple[IngestMessage, IngestBatchRequest]]) -> None:
+        products = [p for _, request in entries for p in request.items]
+        categories = [c for _, request in entries for c in request.categories]
+        run_id = entries[0][1].run_id
+
+        async with self.session_factory() as session:
+            await IngestionService(session, redis=self.redis).ingest_batch(products, categories, source_id, run_id=run_id)
+
+        INGEST_CONSUMER_FLUSH_ITEMS.observe(len(products) + len(categories))
+        now = time.time()
+        for message, _ in entries:
+            # Ack strictly after the commit above
+            await message.ack()
+            INGEST_CONSUMER_MESSAGES.labels(status="acked").inc()
+            if message.published_at:
+                INGEST_QUEUE_LAG.observe(max(0.0, now - message.published_at))
+
+    async def _settle(self, entries, requeue: bool) -> None:
+        for message, _ in entries:
+            await message.nack(requeue=requeue)
+            INGEST_CONSUMER_MESSAGES.labels(status="requeued" if requeue else "rejected").inc()
+
+    async def _depth_loop(self) -> None:
+        while True:
+            depth = await self.broker.queue_depth()
+            if depth is not None:
+                INGEST_QUEUE_DEPTH.set(depth)
+            await asyncio.sleep(self.depth_interval_s)
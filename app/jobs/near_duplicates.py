@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import select
+
+from app.db import get_session_context
+from app.models import Product
+from app.repositories.catalog import PostgresCatalogRepository
+from app.services.near_duplicates import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_duplicate_index(batch_size: int = 2000, only_missing: bool = True, session_factory=get_session_context) -> int:
+    """
+    Backfills the near-duplicate index for products ingested before it existed
+    (or all active products with `only_missing=False`). Keyset batches over
+    gift_id, one commit per batch. Returns the number of products processed.
+    """
+    total = 0
+    last_gift_id = ""
+    while True:
+        async with session_factory() as session:
+            stmt = (
+                select(Product.gift_id, Product.title, Product.price)
+                .where(Product.gift_id > last_gift_id, Product.is_active.is_(True))
+                .order_by(Product.gift_id)
+                .limit(batch_size)
+            )
+            if only_missing:
+                stmt = stmt.where(Product.title_simhash.is_(None))
+            rows = [{"gift_id": g, "title": t, "price": p} for g, t, p in (await session.execute(stmt)).all()]
+            if not rows:
+                break
+
+            await NearDuplicateIndex(PostgresCatalogRepository(session)).assign(rows)
+            await session.commit()
+
+        total += len(rows)
+        last_gift_id = rows[-1]["gift_id"]
+        logger.info(f"Near-duplicate index: {total} products processed")
+    return total
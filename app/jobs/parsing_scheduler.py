@@ -1,45 +1,105 @@
 import logging
+from collections import Counter
+from typing import Optional
+
+from app.config import get_settings
 from app.db import get_session_context
 from app.repositories.parsing import ParsingRepository
-from app.utils.rabbitmq import publish_parsing_task
+from app.services.crawl_planner import SiteBudgets, plan_window
+from app.utils.rabbitmq import PARSING_TASKS_QUEUE, get_task_publisher
 
 logger = logging.getLogger(__name__)
 
-async def run_parsing_scheduler():
+# Sources considered per run, and how many of them one site may take
+SCHEDULING_WINDOW = 200
+WINDOW_PER_SITE = 20
+# Deliveries a scraper worker prefetches per crawl slot (run_worker.py: prefetch_count=MAX_CONCURRENT_TASKS * 2)
+WORKER_PREFETCH_PER_SLOT = 2
+
+
+def queue_capacity(workers: int, concurrency: int, prefetch_per_slot: int = WORKER_PREFETCH_PER_SLOT) -> int:
+    """
+    Published tasks worth keeping ahead of the workers: what their prefetch holds, so a
+    freed crawl slot always finds a task without waiting for the next pass. Publishing
+    more only moves the wait into RabbitMQ, where priorities and site budgets no longer apply.
+    """
+    return max(1, workers * concurrency * prefetch_per_slot)
+
+
+def default_max_queued() -> int:
+    """PARSING_MAX_QUEUED, or the prefetch of SCRAPER_WORKERS workers with MAX_CONCURRENT_TASKS slots each."""
+    settings = get_settings()
+    if settings.parsing_max_queued:
+        return settings.parsing_max_queued
+    return queue_capacity(settings.scraper_workers, settings.scraper_concurrency)
+
+
+def build_parsing_task(source) -> dict:
+    return {
+        "source_id": source.id,
+        "url": source.url,
+        "site_key": source.site_key,
+        "type": source.type,
+        "strategy": source.strategy,
+        "config": source.config
+    }
+
+
+async def run_parsing_scheduler(
+    redis=None,
+    publisher=None,
+    window: int = SCHEDULING_WINDOW,
+    per_site: int = WINDOW_PER_SITE,
+    max_queued: Optional[int] = None,
+):
+    """
+    One scheduling pass: loads the due window in one query, interleaves it across
+    sites by priority within each site's crawl budget (SiteBudgets), publishes as much
+    of the plan as the queue has room for in one confirmed batch and marks the published
+    sources queued with a single UPDATE and commit.
+    Sources left out (no budget, queue full, broker down) stay due for the next pass.
+    `max_queued` defaults to default_max_queued().
+    """
     logger.info("Starting parsing scheduler loop...")
+    publisher = publisher or get_task_publisher()
+    max_queued = max_queued or default_max_queued()
     
     async with get_session_context() as session:
         repo = ParsingRepository(session)
         
+        room = max_queued - await repo.count_queued()
+        if room <= 0:
+            logger.info(f"Parsing queue is full ({max_queued} tasks waiting for workers).")
+            return
+
         # 1. Get sources that need syncing
-        sources = await repo.get_due_sources(limit=20)
+        sources = await repo.get_due_window(limit=window, per_site=per_site)
         
         if not sources:
             logger.info("No sources due for syncing.")
             return
             
-        logger.info(f"Found {len(sources)} sources to sync.")
-        
-        for source in sources:
-            task = {
-                "source_id": source.id,
-                "url": source.url,
-                "site_key": source.site_key,
-                "type": source.type,
-                "strategy": source.strategy,
-                "config": source.config
-            }
-            
-            # 2. Publish to RabbitMQ
-            success = publish_parsing_task(task)
-            
-            if success:
-                # Update status and next_sync_at to prevent re-scheduling
-                await repo.set_queued(source.id)
-            else:
-                logger.error(f"Failed to queue task for source {source.id}")
+        budgets = SiteBudgets(redis)
+        tokens = await budgets.available(sources)
+        plan = plan_window(sources, tokens, limit=room)
 
+        # 2. Publish to RabbitMQ
+        accepted = await publisher.publish_many(PARSING_TASKS_QUEUE, [build_parsing_task(s) for s in plan])
+        queued = plan[:accepted]
+        if accepted < len(plan):
+            # Broker down and local buffer full: keep the rest of the plan for the next pass
+            logger.error(f"Failed to queue {len(plan) - accepted} tasks, postponing them")
+
+        # 3. Charge the site budgets and prevent re-scheduling, one commit for the window
+        await budgets.consume(Counter(s.site_key for s in queued))
+        await repo.set_queued_many([s.id for s in queued])
         await session.commit()
+
+        sites = len({s.site_key for s in sources})
+        logger.info(
+            f"Queued {len(queued)} of {len(sources)} due sources from {sites} sites "
+            f"({len(sources) - len(plan)} left for later: site budget or queue full)."
+        )
     
     logger.info("Parsing scheduler loop completed.")
 
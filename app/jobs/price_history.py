@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.db import get_session_context
+from app.repositories.catalog import PostgresCatalogRepository
+
+logger = logging.getLogger(__name__)
+
+# Full resolution for recent points, one point per product and day after that, nothing beyond retention
+DOWNSAMPLE_AFTER_DAYS = 30
+RETENTION_DAYS = 365
+
+
+async def compact_price_history(
+    downsample_after_days: int = DOWNSAMPLE_AFTER_DAYS,
+    retention_days: int = RETENTION_DAYS,
+    now: Optional[datetime] = None,
+    session_factory=get_session_context,
+) -> dict[str, int]:
+    """
+    Downsamples old price points to the last one of each day and drops points past
+    retention (keeping the one still in effect, so windows reaching back have a start price).
+    Returns {"downsampled": n, "pruned": n}.
+    """
+    now = now or datetime.now(timezone.utc)
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        downsampled = await repo.downsample_price_history(now - timedelta(days=downsample_after_days))
+        pruned = await repo.prune_price_history(now - timedelta(days=retention_days))
+        await session.commit()
+    logger.info(f"Price history compacted: {downsampled} points downsampled, {pruned} pruned")
+    return {"downsampled": downsampled, "pruned": pruned}
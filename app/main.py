@@ -17,6 +17,8 @@ from routes.weeek import router as weeek_router
 from app.config import get_settings
 from app.core.logic_config import logic_config
 from app.redis_client import init_redis
+from app.utils.rabbitmq import close_publisher, init_publisher
+from app.services.notifications import close_notification_service
 from app.utils.errors import install_exception_handlers
 from app.services.embeddings import EmbeddingService
 from prometheus_fastapi_instrumentator import Instrumentator
@@ -28,6 +30,8 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     # Initialize services
     app.state.redis = await init_redis()
+    # Long-lived RabbitMQ publisher (force-run, notifications); reconnects in the background if the broker is down
+    app.state.publisher = await init_publisher()
     
     # Initialize Embedding Service (stub)
     app.state.embedding_service = EmbeddingService(model_name=logic_config.llm.model_embedding)
@@ -36,6 +40,8 @@ async def lifespan(app: FastAPI):
     try:
         yield
     finally:
+        await close_notification_service()
+        await close_publisher()
         await app.state.redis.aclose()
 
 
@@ -181,6 +181,14 @@ class Product(TimestampMixin, Base):
     is_active: Mapped[bool] = mapped_column(sa.Boolean, server_default="true", default=True, index=True)
     content_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     content_hash: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Hash of price/currency/is_active, lets syncs skip rows whose offer didn't change
+    offer_hash: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Generation of the last full sync that saw this product (mark-and-sweep soft-delete)
+    last_seen_sync_id: Mapped[Optional[int]] = mapped_column(sa.BigInteger, nullable=True)
+    # Near-duplicate index: SimHash of the normalized title and the cluster of the same item
+    # across merchants (gift_id of the first product seen in the cluster)
+    title_simhash: Mapped[Optional[int]] = mapped_column(sa.BigInteger, nullable=True)
+    duplicate_cluster_id: Mapped[Optional[str]] = mapped_column(Text, nullable=True, index=True)
 
     # LLM Scoring
     llm_gift_score: Mapped[Optional[float]] = mapped_column(sa.Float, nullable=True, index=True)
@@ -191,6 +199,66 @@ class Product(TimestampMixin, Base):
     llm_scored_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
 
+class CatalogSyncRun(TimestampMixin, Base):
+    """
+    Чекпоинты полной синхронизации каталога (Takprodam).
+    id совпадает с поколением синка (products.last_seen_sync_id), поэтому
+    прерванный запуск можно продолжить с последней закоммиченной страницы.
+    """
+    __tablename__ = "catalog_sync_runs"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=False)
+    source: Mapped[str] = mapped_column(String, nullable=False, index=True)  # gift_id prefix, e.g. 'takprodam'
+    status: Mapped[str] = mapped_column(String, nullable=False, index=True)  # running, completed, failed
+
+    # Cursor: first page that is not committed yet
+    next_page: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    expected_pages: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # from the last completed run
+
+    rows_written: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    inserted_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    unchanged_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    deactivated_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # Current attempt (a resumed run starts a new attempt), used for the ETA
+    attempts: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    attempt_start_page: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    attempt_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+
+class ProductDuplicateBucket(Base):
+    """
+    LSH-корзины индекса почти-дубликатов.
+    Ключ корзины: номер полосы SimHash + её биты + ценовой диапазон
+    (см. app/utils/near_duplicates.py). Товары из одной корзины — кандидаты в дубликаты.
+    """
+    __tablename__ = "product_duplicate_buckets"
+
+    bucket: Mapped[str] = mapped_column(Text, primary_key=True)
+    gift_id: Mapped[str] = mapped_column(
+        Text, ForeignKey("products.gift_id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class ProductPriceHistory(Base):
+    """
+    История цен товара: точка пишется только когда цена изменилась
+    (см. CatalogRepository.upsert_changed_products), цена действует до следующей точки.
+    Ключ (gift_id, ts): история одного товара лежит подряд в индексе.
+    Старые точки прореживаются и удаляются (app/jobs/price_history.py).
+    """
+    __tablename__ = "product_price_history"
+
+    gift_id: Mapped[str] = mapped_column(
+        Text, ForeignKey("products.gift_id", ondelete="CASCADE"), primary_key=True
+    )
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    price: Mapped[float] = mapped_column(sa.Numeric, nullable=False)
+
+
 class ProductEmbedding(TimestampMixin, Base):
     """
     Векторные представления товаров для семантического поиска.
@@ -218,7 +286,7 @@ class ParsingSource(TimestampMixin, Base):
     url: Mapped[str] = mapped_column(Text, nullable=False, unique=True)
     type: Mapped[str] = mapped_column(String, nullable=False)  # hub, list, product, sitemap
     site_key: Mapped[str] = mapped_column(String, nullable=False, index=True)  # mrgeek, ozon, etc.
-    strategy: Mapped[str] = mapped_column(String, server_default="deep")  # deep, discovery
+    strategy: Mapped[str] = mapped_column(String, server_default="deep")  # deep, discovery, incremental
     priority: Mapped[int] = mapped_column(sa.Integer, server_default="50", index=True)
     refresh_interval_hours: Mapped[int] = mapped_column(sa.Integer, server_default="24")
     last_synced_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -348,16 +416,40 @@ class WeeekAccount(TimestampMixin, Base):
     is_active: Mapped[bool] = mapped_column(sa.Boolean, server_default="true", default=True)
 
 
+COMPUTE_PRIORITY_RANK_SQL = "CASE priority WHEN 'high' THEN 0 WHEN 'low' THEN 1 ELSE 2 END"
+
+
 class ComputeTask(TimestampMixin, Base):
     """
     Queue for offline compute tasks (embeddings, reranking, etc.).
     External workers (Kaggle, home clusters) poll this table via API.
     """
     __tablename__ = "compute_tasks"
+    __table_args__ = (
+        # Claim order of the queue (see ComputeTaskRepository.claim): pending only, by rank, oldest first
+        sa.Index(
+            "ix_compute_tasks_pending",
+            "priority_rank",
+            "created_at",
+            postgresql_where=sa.text("status = 'pending'"),
+            sqlite_where=sa.text("status = 'pending'"),
+        ),
+        # Expired leases (see ComputeTaskRepository.requeue_expired)
+        sa.Index(
+            "ix_compute_tasks_lease",
+            "lease_expires_at",
+            postgresql_where=sa.text("status = 'processing'"),
+            sqlite_where=sa.text("status = 'processing'"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(PG_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     task_type: Mapped[str] = mapped_column(String, nullable=False, index=True)  # 'embedding', 'rerank'
     priority: Mapped[str] = mapped_column(String, server_default="low", index=True)  # 'low', 'high'
+    # Claim order of `priority`: 'high' before 'low' (and anything unknown)
+    priority_rank: Mapped[int] = mapped_column(
+        sa.SmallInteger, sa.Computed(COMPUTE_PRIORITY_RANK_SQL, persisted=True), nullable=False
+    )
     status: Mapped[str] = mapped_column(String, server_default="pending", nullable=False, index=True)  # 'pending', 'processing', 'completed', 'failed'
     
     # Task data
@@ -367,6 +459,9 @@ class ComputeTask(TimestampMixin, Base):
     
     # Worker tracking
     worker_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # ID of worker that picked up the task
+    # Lease of the current claim (see ComputeTaskRepository): extended by heartbeats, reclaimable once expired
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, server_default="0", default=0, nullable=False)
     
     # Timing
     started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
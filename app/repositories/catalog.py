@@ -2,27 +2,96 @@ from __future__ import annotations
 
 import logging
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Sequence
 
 import sqlalchemy as sa
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import and_, bindparam, func, or_, select, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Product, ProductEmbedding
+from app.models import CatalogSyncRun, Product, ProductDuplicateBucket, ProductEmbedding, ProductPriceHistory
+from app.utils.catalog import build_offer_hash
 
 logger = logging.getLogger(__name__)
 
 
+def _price_key(price) -> Optional[str]:
+    # Same precision as build_offer_hash: a float round trip is not a price change
+    return f"{float(price):.2f}" if price is not None else None
+
+
 class CatalogRepository(ABC):
     @abstractmethod
-    async def upsert_products(self, products: list[dict]) -> int:
+    async def upsert_products(self, products: list[dict], sync_id: Optional[int] = None) -> int:
         """Upsert a batch of products returned by provider.
+        When `sync_id` is given, rows are stamped with it as `last_seen_sync_id`.
         Returns count of upserted items.
         """
         pass
 
+    @abstractmethod
+    async def upsert_changed_products(
+        self,
+        products: list[dict],
+        sync_id: Optional[int] = None,
+        changed_ids: Optional[list[str]] = None,
+    ) -> dict[str, int]:
+        """Change-aware upsert: writes only new rows and rows whose content/offer hash changed.
+        If `changed_ids` is given, gift_ids of new and content-changed rows are appended to it.
+        Returns {"inserted": n, "updated": n, "unchanged": n}.
+        """
+        pass
+
+    @abstractmethod
+    async def get_products_by_ids(self, gift_ids: list[str]) -> list[Product]:
+        pass
+
+    @abstractmethod
+    async def add_price_points(self, points: list[dict]) -> int:
+        """Appends price history points {"gift_id", "ts", "price"}. Does not commit."""
+        pass
+
+    @abstractmethod
+    async def get_price_points(self, gift_ids: list[str], since: datetime) -> list[tuple]:
+        """(gift_id, ts, price) from `since` on, plus the last point before `since` (the price at `since`)."""
+        pass
+
+    @abstractmethod
+    async def downsample_price_history(self, before: datetime) -> int:
+        """Keeps only the last point per product and day among points older than `before`. Returns deleted count."""
+        pass
+
+    @abstractmethod
+    async def prune_price_history(self, before: datetime) -> int:
+        """Deletes points older than `before`, except the one still in effect at `before`. Returns deleted count."""
+        pass
+
+    @abstractmethod
+    async def get_duplicate_candidates(self, buckets: list[str]) -> list[tuple]:
+        """(gift_id, title_simhash, price, duplicate_cluster_id) of products in any of the LSH buckets."""
+        pass
+
+    @abstractmethod
+    async def save_duplicate_signatures(self, rows: list[dict]) -> None:
+        """Stores title_simhash / duplicate_cluster_id and replaces the LSH buckets of the given products."""
+        pass
+
+    @abstractmethod
+    async def get_cluster_embeddings(
+        self,
+        cluster_ids: list[str],
+        model_name: str,
+        model_version: str,
+        exclude_ids: Optional[list[str]] = None,
+    ) -> dict[str, list[float]]:
+        pass
+
+    @abstractmethod
+    async def get_site_offers(self, site_key: str) -> list[tuple]:
+        """(gift_id, price) of the active products scraped from the site."""
+        pass
+
     @abstractmethod
     async def get_active_products_count(self) -> int:
         pass
@@ -49,26 +118,60 @@ class CatalogRepository(ABC):
         """Mark products NOT in seen_ids as is_active=False. Returns count of modified rows."""
         pass
 
+    @abstractmethod
+    async def deactivate_unseen(self, source_prefix: str, sync_id: int, batch_size: int = 5000) -> int:
+        """Mark active products of a source not stamped by `sync_id` as inactive. Returns count."""
+        pass
+
+    @abstractmethod
+    async def create_sync_run(self, sync_id: int, source: str, expected_pages: Optional[int] = None) -> CatalogSyncRun:
+        pass
+
+    @abstractmethod
+    async def get_latest_sync_run(self, source: str, statuses: Optional[Sequence[str]] = None) -> Optional[CatalogSyncRun]:
+        pass
+
+    @abstractmethod
+    async def update_sync_run(self, sync_id: int, **fields) -> None:
+        """Update checkpoint fields of a sync run. Does not commit (goes with the data batch)."""
+        pass
+
+    @abstractmethod
+    async def claim_sync_run(self, sync_id: int, stale_before: datetime) -> bool:
+        """
+        Atomically take over an unfinished sync run for a new attempt: a failed one, or a
+        running one whose last checkpoint is older than `stale_before` (its process died).
+        Returns False if the run is finished or another process holds it. Does not commit.
+        """
+        pass
+
 
 class PostgresCatalogRepository(CatalogRepository):
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def upsert_products(self, products: list[dict]) -> int:
+    async def upsert_products(self, products: list[dict], sync_id: Optional[int] = None) -> int:
         if not products:
             return 0
 
+        if sync_id is not None:
+            products = [{**p, "last_seen_sync_id": sync_id} for p in products]
+
         # Construct values for upsert.
         # We assume products list contains dicts matching Product model fields.
         stmt = insert(Product).values(products)
         
         # On conflict do update
-        # We update everything except created_at (and gift_id obviously)
+        # We update only the columns present in the incoming rows (never created_at / gift_id),
+        # so columns owned by other jobs (llm_*, ...) are not wiped by a provider sync.
+        incoming = set().union(*(p.keys() for p in products))
         update_dict = {
             col.name: col
             for col in stmt.excluded
-            if col.name not in ("created_at", "gift_id")
+            if col.name in incoming and col.name not in ("created_at", "gift_id")
         }
+        # Column onupdate defaults are not applied to ON CONFLICT DO UPDATE
+        update_dict["updated_at"] = func.now()
         
         stmt = stmt.on_conflict_do_update(
             index_elements=[Product.gift_id],
@@ -87,6 +190,182 @@ class PostgresCatalogRepository(CatalogRepository):
             result = await self.session.execute(stmt)
             return result.rowcount
 
+    async def upsert_changed_products(
+        self,
+        products: list[dict],
+        sync_id: Optional[int] = None,
+        changed_ids: Optional[list[str]] = None,
+    ) -> dict[str, int]:
+        """
+        Change-aware variant of `upsert_products`.
+        Stored `content_hash` / `offer_hash` of the batch are fetched in one query and compared
+        with the incoming ones:
+        - new rows and rows with a changed content_hash go through the full upsert;
+        - rows where only price/availability changed get a narrow UPDATE of the offer columns
+          (the large `raw` JSONB is left alone);
+        - unchanged rows are not rewritten at all, only stamped with `sync_id` if given,
+          without bumping `updated_at`.
+        New and content-changed rows are the ones whose embedding input changed; their
+        gift_ids are collected into `changed_ids` when a list is passed.
+        New products and products whose price changed get a point in product_price_history.
+        """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not products:
+            return counts
+
+        products = [
+            {
+                **p,
+                "offer_hash": p.get("offer_hash")
+                or build_offer_hash(p.get("price"), p.get("currency"), p.get("is_active", True)),
+            }
+            for p in products
+        ]
+
+        result = await self.session.execute(
+            select(Product.gift_id, Product.content_hash, Product.offer_hash, Product.price, Product.is_active)
+            .where(Product.gift_id.in_([p["gift_id"] for p in products]))
+        )
+        stored = {
+            gift_id: (content_hash, offer_hash, price, is_active)
+            for gift_id, content_hash, offer_hash, price, is_active in result.all()
+        }
+
+        full_rows: list[dict] = []
+        offer_rows: list[dict] = []
+        unchanged_ids: list[str] = []
+        price_points: dict[str, dict] = {}
+        now = datetime.now(timezone.utc)
+        for p in products:
+            current = stored.get(p["gift_id"])
+            price = _price_key(p.get("price"))
+            # An unknown price (None) is not a point: the last known one stays in effect
+            if price is not None and (current is None or _price_key(current[2]) != price):
+                price_points[p["gift_id"]] = {"gift_id": p["gift_id"], "ts": now, "price": p["price"]}
+            if current is None:
+                counts["inserted"] += 1
+                full_rows.append(p)
+            elif p.get("content_hash") is None or current[0] != p["content_hash"]:
+                counts["updated"] += 1
+                full_rows.append(p)
+            # The sweeps (deactivate_unseen, mark_inactive_except) flip is_active without touching
+            # offer_hash, so a reappearing product would otherwise look unchanged and stay inactive
+            elif current[1] != p["offer_hash"] or bool(current[3]) != bool(p.get("is_active", True)):
+                counts["updated"] += 1
+                offer_rows.append(p)
+            else:
+                counts["unchanged"] += 1
+                unchanged_ids.append(p["gift_id"])
+
+        if full_rows:
+            await self.upsert_products(full_rows, sync_id=sync_id)
+            if changed_ids is not None:
+                changed_ids.extend(p["gift_id"] for p in full_rows)
+
+        if offer_rows:
+            values = {
+                "price": bindparam("b_price"),
+                "currency": bindparam("b_currency"),
+                "is_active": bindparam("b_is_active"),
+                "offer_hash": bindparam("b_offer_hash"),
+                "updated_at": func.now(),
+            }
+            if sync_id is not None:
+                values["last_seen_sync_id"] = sync_id
+            stmt = sa.update(Product.__table__).where(Product.gift_id == bindparam("b_gift_id")).values(**values)
+            # Core executemany on the session's connection (not ORM bulk-by-PK)
+            conn = await self.session.connection()
+            await conn.execute(
+                stmt,
+                [
+                    {
+                        "b_gift_id": p["gift_id"],
+                        "b_price": p.get("price"),
+                        "b_currency": p.get("currency"),
+                        "b_is_active": p.get("is_active", True),
+                        "b_offer_hash": p["offer_hash"],
+                    }
+                    for p in offer_rows
+                ],
+            )
+
+        if unchanged_ids and sync_id is not None:
+            stmt = (
+                update(Product)
+                .where(Product.gift_id.in_(unchanged_ids))
+                # Explicit self-assignment suppresses the `onupdate=now()` of updated_at
+                .values(last_seen_sync_id=sync_id, updated_at=Product.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.execute(stmt)
+
+        if price_points:
+            await self.add_price_points(list(price_points.values()))
+
+        return counts
+
+    async def add_price_points(self, points: list[dict]) -> int:
+        if not points:
+            return 0
+        stmt = insert(ProductPriceHistory).values(points)
+        # Same product twice at the same instant: the later write wins
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductPriceHistory.gift_id, ProductPriceHistory.ts],
+            set_={"price": stmt.excluded.price},
+        )
+        await self.session.execute(stmt)
+        return len(points)
+
+    async def get_price_points(self, gift_ids: list[str], since: datetime) -> list[tuple]:
+        if not gift_ids:
+            return []
+        h = ProductPriceHistory
+        anchors = (
+            select(h.gift_id, func.max(h.ts).label("ts"))
+            .where(h.gift_id.in_(gift_ids), h.ts < since)
+            .group_by(h.gift_id)
+            .subquery()
+        )
+        stmt = (
+            select(h.gift_id, h.ts, h.price)
+            .outerjoin(anchors, and_(anchors.c.gift_id == h.gift_id, anchors.c.ts == h.ts))
+            .where(h.gift_id.in_(gift_ids), or_(h.ts >= since, anchors.c.ts.is_not(None)))
+            .order_by(h.gift_id, h.ts)
+        )
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def downsample_price_history(self, before: datetime) -> int:
+        h = ProductPriceHistory.__table__
+        later = h.alias("later")
+        if self.session.bind.dialect.name == "postgresql":
+            day, later_day = func.date_trunc("day", h.c.ts), func.date_trunc("day", later.c.ts)
+        else:
+            day, later_day = func.date(h.c.ts), func.date(later.c.ts)
+        # A point is redundant when a later point of the same day (also before the cutoff) exists
+        stmt = sa.delete(h).where(
+            h.c.ts < before,
+            sa.exists().where(
+                later.c.gift_id == h.c.gift_id,
+                later.c.ts > h.c.ts,
+                later.c.ts < before,
+                later_day == day,
+            ),
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount
+
+    async def prune_price_history(self, before: datetime) -> int:
+        h = ProductPriceHistory.__table__
+        later = h.alias("later")
+        # The last point before the cutoff is the price at the cutoff: it stays as the anchor
+        stmt = sa.delete(h).where(
+            h.c.ts < before,
+            sa.exists().where(later.c.gift_id == h.c.gift_id, later.c.ts > h.c.ts, later.c.ts <= before),
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount
+
     async def mark_inactive_except(self, seen_ids: set[str]) -> int:
         """
         Mark all products NOT in the provided set of gift_ids as inactive.
@@ -107,6 +386,196 @@ class PostgresCatalogRepository(CatalogRepository):
         result = await self.session.execute(stmt)
         return result.rowcount
 
+    async def deactivate_unseen(self, source_prefix: str, sync_id: int, batch_size: int = 5000) -> int:
+        """
+        Sweep phase of the full-sync mark-and-sweep soft-delete.
+        Deactivates products with gift_id `{source_prefix}:*` whose `last_seen_sync_id`
+        is older than `sync_id`. Works in keyset batches over the primary key and
+        commits after each batch, so statement size, lock footprint and memory
+        stay constant regardless of catalog size.
+        """
+        total = 0
+        last_gift_id = ""
+        while True:
+            candidates = (
+                select(Product.gift_id)
+                .where(
+                    Product.gift_id > last_gift_id,
+                    Product.gift_id.like(f"{source_prefix}:%"),
+                    Product.is_active.is_(True),
+                    or_(Product.last_seen_sync_id.is_(None), Product.last_seen_sync_id < sync_id),
+                )
+                .order_by(Product.gift_id)
+                .limit(batch_size)
+            )
+            stmt = (
+                update(Product)
+                .where(Product.gift_id.in_(candidates.scalar_subquery()))
+                .values(is_active=False, updated_at=func.now())
+                .returning(Product.gift_id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            deactivated = result.scalars().all()
+            await self.session.commit()
+
+            total += len(deactivated)
+            if len(deactivated) < batch_size:
+                return total
+            last_gift_id = max(deactivated)
+
+    async def create_sync_run(self, sync_id: int, source: str, expected_pages: Optional[int] = None) -> CatalogSyncRun:
+        run = CatalogSyncRun(
+            id=sync_id,
+            source=source,
+            status="running",
+            next_page=1,
+            expected_pages=expected_pages,
+            rows_written=0,
+            inserted_count=0,
+            updated_count=0,
+            unchanged_count=0,
+            deactivated_count=0,
+            attempts=1,
+            attempt_start_page=1,
+            attempt_started_at=datetime.now(timezone.utc),
+        )
+        self.session.add(run)
+        await self.session.flush()
+        return run
+
+    async def get_latest_sync_run(self, source: str, statuses: Optional[Sequence[str]] = None) -> Optional[CatalogSyncRun]:
+        stmt = select(CatalogSyncRun).where(CatalogSyncRun.source == source)
+        if statuses:
+            stmt = stmt.where(CatalogSyncRun.status.in_(statuses))
+        result = await self.session.execute(stmt.order_by(CatalogSyncRun.id.desc()).limit(1))
+        return result.scalar_one_or_none()
+
+    async def update_sync_run(self, sync_id: int, **fields) -> None:
+        stmt = (
+            update(CatalogSyncRun)
+            .where(CatalogSyncRun.id == sync_id)
+            .values(**fields)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def claim_sync_run(self, sync_id: int, stale_before: datetime) -> bool:
+        # Checkpoints bump updated_at, so a live run never looks stale; of two concurrent
+        # claims the second re-checks the row after the first commits and matches nothing
+        stmt = (
+            update(CatalogSyncRun)
+            .where(
+                CatalogSyncRun.id == sync_id,
+                or_(
+                    CatalogSyncRun.status == "failed",
+                    and_(CatalogSyncRun.status == "running", CatalogSyncRun.updated_at < stale_before),
+                ),
+            )
+            .values(
+                status="running",
+                attempts=CatalogSyncRun.attempts + 1,
+                attempt_start_page=CatalogSyncRun.next_page,
+                attempt_started_at=datetime.now(timezone.utc),
+                error_message=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount == 1
+
+    async def get_products_by_ids(self, gift_ids: list[str]) -> list[Product]:
+        """Active products among `gift_ids` (unknown or deactivated ids are skipped)."""
+        if not gift_ids:
+            return []
+        result = await self.session.execute(
+            select(Product).where(Product.gift_id.in_(gift_ids), Product.is_active.is_(True))
+        )
+        return list(result.scalars().all())
+
+    async def get_duplicate_candidates(self, buckets: list[str]) -> list[tuple]:
+        if not buckets:
+            return []
+        stmt = (
+            select(Product.gift_id, Product.title_simhash, Product.price, Product.duplicate_cluster_id)
+            .join(ProductDuplicateBucket, ProductDuplicateBucket.gift_id == Product.gift_id)
+            .where(ProductDuplicateBucket.bucket.in_(buckets), Product.is_active.is_(True))
+            .distinct()
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def get_site_offers(self, site_key: str) -> list[tuple]:
+        stmt = select(Product.gift_id, Product.price).where(
+            Product.gift_id.startswith(f"{site_key}:", autoescape=True),
+            Product.is_active.is_(True),
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def save_duplicate_signatures(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        gift_ids = [r["gift_id"] for r in rows]
+        await self.session.execute(
+            sa.delete(ProductDuplicateBucket).where(ProductDuplicateBucket.gift_id.in_(gift_ids))
+        )
+        bucket_rows = [{"bucket": b, "gift_id": r["gift_id"]} for r in rows for b in r["buckets"]]
+        if bucket_rows:
+            await self.session.execute(insert(ProductDuplicateBucket).values(bucket_rows).on_conflict_do_nothing())
+
+        products = Product.__table__
+        stmt = (
+            sa.update(products)
+            .where(products.c.gift_id == bindparam("b_gift_id"))
+            # Clustering is bookkeeping, it must not bump updated_at
+            .values(
+                title_simhash=bindparam("b_title_simhash"),
+                duplicate_cluster_id=bindparam("b_cluster_id"),
+                updated_at=products.c.updated_at,
+            )
+        )
+        conn = await self.session.connection()
+        await conn.execute(
+            stmt,
+            [
+                {"b_gift_id": r["gift_id"], "b_title_simhash": r["title_simhash"], "b_cluster_id": r["duplicate_cluster_id"]}
+                for r in rows
+            ],
+        )
+
+    async def get_cluster_embeddings(
+        self,
+        cluster_ids: list[str],
+        model_name: str,
+        model_version: str,
+        exclude_ids: Optional[list[str]] = None,
+    ) -> dict[str, list[float]]:
+        """
+        One up-to-date vector per near-duplicate cluster (from any member not in `exclude_ids`),
+        for reuse by the embedding jobs.
+        """
+        if not cluster_ids:
+            return {}
+        stmt = (
+            select(Product.duplicate_cluster_id, ProductEmbedding.embedding)
+            .join(ProductEmbedding, Product.gift_id == ProductEmbedding.gift_id)
+            .where(
+                Product.duplicate_cluster_id.in_(cluster_ids),
+                ProductEmbedding.model_name == model_name,
+                ProductEmbedding.model_version == model_version,
+                # A stale vector of the donor itself is not worth copying
+                ProductEmbedding.content_hash == Product.content_hash,
+            )
+        )
+        if exclude_ids:
+            stmt = stmt.where(Product.gift_id.notin_(exclude_ids))
+        result = await self.session.execute(stmt)
+        vectors: dict[str, list[float]] = {}
+        for cluster_id, embedding in result.all():
+            vectors.setdefault(cluster_id, list(embedding))
+        return vectors
+
     async def get_active_products_count(self) -> int:
         query = select(func.count(Product.gift_id)).where(Product.is_active.is_(True))
         result = await self.session.execute(query)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ComputeTask
+
+DEFAULT_LEASE_S = 300
+# Claims of a task whose lease ran out this many times (worker died, OOM on the payload...) fail it
+MAX_ATTEMPTS = 3
+
+
+class ComputeTaskRepository:
+    """
+    compute_tasks as a lease-based work queue for the external workers.
+    A claim is one UPDATE over a `FOR UPDATE SKIP LOCKED` subselect of pending tasks in
+    (priority_rank, created_at) order, which is the partial index ix_compute_tasks_pending,
+    so concurrent pollers never get the same task and never wait on each other. A claimed
+    task is leased to its worker until `lease_expires_at`; heartbeats extend the lease, and
+    a task whose lease ran out goes back to pending (up to MAX_ATTEMPTS claims in total).
+    Methods do not commit.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def claim(
+        self,
+        worker_id: str,
+        limit: int = 10,
+        task_type: Optional[str] = None,
+        lease_s: float = DEFAULT_LEASE_S,
+        now: Optional[datetime] = None,
+    ) -> list[ComputeTask]:
+        now = now or self._now()
+        await self.requeue_expired(now=now)
+
+        candidates = select(ComputeTask.id).where(ComputeTask.status == "pending")
+        if task_type:
+            candidates = candidates.where(ComputeTask.task_type == task_type)
+        candidates = (
+            candidates.order_by(ComputeTask.priority_rank, ComputeTask.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(ComputeTask)
+            # Re-checked on the locked row: a task another claim took in the meantime is skipped
+            .where(ComputeTask.id.in_(candidates.scalar_subquery()), ComputeTask.status == "pending")
+            .values(
+                status="processing",
+                worker_id=worker_id,
+                started_at=now,
+                lease_expires_at=now + timedelta(seconds=lease_s),
+                attempts=ComputeTask.attempts + 1,
+                updated_at=now,
+            )
+            .returning(ComputeTask)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        tasks = list(result.scalars().all())
+        # RETURNING comes in no particular order
+        tasks.sort(key=lambda t: (t.priority_rank, t.created_at))
+        return tasks
+
+    async def heartbeat(
+        self,
+        worker_id: str,
+        task_ids: Sequence[UUID],
+        lease_s: float = DEFAULT_LEASE_S,
+        now: Optional[datetime] = None,
+    ) -> list[UUID]:
+        """Extends the leases the worker still holds. Returns their ids; missing ones were reclaimed."""
+        if not task_ids:
+            return []
+        now = now or self._now()
+        stmt = (
+            update(ComputeTask)
+            .where(
+                ComputeTask.id.in_(list(task_ids)),
+                ComputeTask.worker_id == worker_id,
+                ComputeTask.status == "processing",
+            )
+            .values(lease_expires_at=now + timedelta(seconds=lease_s), updated_at=now)
+            .returning(ComputeTask.id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def requeue_expired(self, max_attempts: int = MAX_ATTEMPTS, now: Optional[datetime] = None) -> int:
+        """
+        Puts tasks whose lease ran out back to pending, or fails them once they have used up
+        their claims. Runs on every claim: it only reads the ix_compute_tasks_lease partial
+        index and skips rows another poller is already handling.
+        """
+        now = now or self._now()
+        expired = (ComputeTask.status == "processing", ComputeTask.lease_expires_at < now)
+        locked = select(ComputeTask.id).where(*expired).with_for_update(skip_locked=True)
+        exhausted = ComputeTask.attempts >= max_attempts
+        stmt = (
+            update(ComputeTask)
+            .where(ComputeTask.id.in_(locked.scalar_subquery()), *expired)
+            .values(
+                status=case((exhausted, "failed"), else_="pending"),
+                error=case((exhausted, f"Lease expired {max_attempts} times without a result"), else_=ComputeTask.error),
+                completed_at=case((exhausted, now), else_=ComputeTask.completed_at),
+                lease_expires_at=None,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount
+
+    async def get(self, task_id: UUID, for_update: bool = False) -> Optional[ComputeTask]:
+        stmt = select(ComputeTask).where(ComputeTask.id == task_id)
+        if for_update:
+            # Result submission vs. a concurrent reclaim of the same task
+            stmt = stmt.with_for_update()
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import random
 from datetime import datetime, timedelta
 from typing import Optional, List, Sequence, Any
 
@@ -8,6 +9,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import ParsingSource, CategoryMap, ParsingRun
 
+# Разброс next_sync_at (±10%), чтобы источники, добавленные или спарсенные одновременно,
+# не становились due в одну и ту же минуту
+SYNC_JITTER = 0.1
+# Сколько источник остаётся queued, пока задачу не взял воркер; потом он снова due.
+# Не меньше времени, которое задача может простоять в prefetch воркера за чужим краулом
+# (до SUBPROCESS_TIMEOUT = 1 ч), иначе планировщик публикует дубликат ещё живой задачи
+QUEUED_LEASE = timedelta(hours=2)
+
+
+def jittered(delay: timedelta, jitter: float = SYNC_JITTER) -> timedelta:
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
 class ParsingRepository:
     def __init__(self, session: AsyncSession, redis: Optional[Any] = None):
         self.session = session
@@ -29,6 +43,48 @@ class ParsingRepository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_due_window(self, limit: int = 200, per_site: int = 20) -> Sequence[ParsingSource]:
+        """
+        Окно планирования одним запросом: до `limit` due-источников, не больше `per_site`
+        на один site_key (лучшие по priority / самые просроченные), чтобы сайт с сотнями
+        категорий не вытеснял остальные. Строки блокируются (SKIP LOCKED) до коммита планировщика.
+        """
+        ranked = (
+            select(
+                ParsingSource.id,
+                func.row_number().over(
+                    partition_by=ParsingSource.site_key,
+                    order_by=(ParsingSource.priority.desc(), ParsingSource.next_sync_at.asc()),
+                ).label("site_rank"),
+            )
+            .where(
+                and_(
+                    ParsingSource.is_active.is_(True),
+                    ParsingSource.next_sync_at <= func.now()
+                )
+            )
+            .subquery()
+        )
+        stmt = (
+            select(ParsingSource)
+            .where(ParsingSource.id.in_(select(ranked.c.id).where(ranked.c.site_rank <= per_site)))
+            .order_by(ParsingSource.priority.desc(), ParsingSource.next_sync_at.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def count_queued(self) -> int:
+        """Источники, опубликованные в очередь и ещё не взятые воркером (таймаут set_queued не истёк)."""
+        stmt = select(func.count(ParsingSource.id)).where(
+            and_(
+                ParsingSource.status == "queued",
+                ParsingSource.next_sync_at > func.now()
+            )
+        )
+        return (await self.session.execute(stmt)).scalar_one()
+
     async def update_source_stats(self, source_id: int, stats: dict):
         stmt = select(ParsingSource).where(ParsingSource.id == source_id)
         result = await self.session.execute(stmt)
@@ -36,7 +92,7 @@ class ParsingRepository:
         
         if source:
             source.last_synced_at = func.now()
-            source.next_sync_at = datetime.now() + timedelta(hours=source.refresh_interval_hours)
+            source.next_sync_at = datetime.now() + jittered(timedelta(hours=source.refresh_interval_hours))
             source.status = "waiting"
             if source.config is None:
                 source.config = {}
@@ -50,11 +106,21 @@ class ParsingRepository:
         """Marks source as queued in RabbitMQ. Status 'running' will be set by worker."""
         stmt = update(ParsingSource).where(ParsingSource.id == source_id).values(
             status="queued", 
-            next_sync_at=datetime.now() + timedelta(minutes=15)
+            next_sync_at=datetime.now() + QUEUED_LEASE
         )
         await self.session.execute(stmt)
         await self.session.commit()
 
+    async def set_queued_many(self, source_ids: List[int]):
+        """Как set_queued, но одним UPDATE и без коммита (коммитит планировщик)."""
+        if not source_ids:
+            return
+        stmt = update(ParsingSource).where(ParsingSource.id.in_(source_ids)).values(
+            status="queued",
+            next_sync_at=datetime.now() + QUEUED_LEASE
+        )
+        await self.session.execute(stmt)
+
     async def get_or_create_category_maps(self, names: List[str]) -> List[CategoryMap]:
         if not names:
             return []
@@ -87,6 +153,53 @@ class ParsingRepository:
             
         return list(existing.values())
 
+    async def ensure_category_maps(self, names: List[str]) -> None:
+        """
+        Registers unknown external categories without reading them back.
+        Does not commit: used inside the single ingest transaction.
+        """
+        names = sorted(set(n for n in names if n))
+        if not names:
+            return
+        if self.session.bind.dialect.name == "postgresql":
+            stmt = insert(CategoryMap).values([
+                {"external_name": name, "internal_category_id": None}
+                for name in names
+            ]).on_conflict_do_nothing()
+            await self.session.execute(stmt)
+        else:
+            await self.get_or_create_category_maps(names)
+
+    async def finish_crawl(self, source_id: int, stats: dict, status: str = "completed", error_message: str = None):
+        """
+        Записывает итоги краулинга одним коммитом: last_stats в конфиге источника и строку ParsingRun.
+        Для успешного краулинга также сдвигает расписание (как update_source_stats).
+        """
+        stmt = select(ParsingSource).where(ParsingSource.id == source_id)
+        result = await self.session.execute(stmt)
+        source = result.scalar_one_or_none()
+        if not source:
+            return None
+
+        if status == "completed":
+            source.last_synced_at = func.now()
+            source.next_sync_at = datetime.now() + jittered(timedelta(hours=source.refresh_interval_hours))
+            source.status = "waiting"
+        cfg = dict(source.config or {})
+        cfg["last_stats"] = {**stats, "status": status}
+        source.config = cfg
+
+        self.session.add(ParsingRun(
+            source_id=source_id,
+            status=status,
+            items_scraped=stats.get("processed_items", 0),
+            items_new=stats.get("new_items", 0),
+            error_message=error_message,
+            duration_seconds=stats.get("duration_seconds"),
+        ))
+        await self.session.commit()
+        return source
+
     async def get_unmapped_categories(self, limit: int = 100) -> Sequence[CategoryMap]:
         """Возвращает категории, у которых еще нет привязки к внутренней категории Gifty."""
         stmt = (
@@ -178,7 +291,7 @@ class ParsingRepository:
                 cfg["retry_count"] = retries + 1
                 source.status = "error"
                 # Back-off: wait 10 mins * retries
-                source.next_sync_at = datetime.now() + timedelta(minutes=10 * (retries + 1))
+                source.next_sync_at = datetime.now() + jittered(timedelta(minutes=10 * (retries + 1)))
             
             source.config = cfg
             await self.session.commit()
@@ -460,6 +573,30 @@ class ParsingRepository:
             logger.error(f"Error fetching workers from Redis: {e}")
         return workers
 
+    async def get_existing_source_urls(self, urls: List[str]) -> set:
+        """Which of the given URLs are already registered (single IN query)."""
+        if not urls:
+            return set()
+        stmt = select(ParsingSource.url).where(ParsingSource.url.in_(urls))
+        result = await self.session.execute(stmt)
+        return set(result.scalars().all())
+
+    async def insert_new_sources(self, rows: List[dict]) -> List[str]:
+        """
+        Bulk INSERT ... ON CONFLICT (url) DO NOTHING. Returns URLs that were actually inserted.
+        Does not commit.
+        """
+        if not rows:
+            return []
+        stmt = (
+            insert(ParsingSource)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=[ParsingSource.url])
+            .returning(ParsingSource.url)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
     async def get_source_by_url(self, url: str) -> Optional[ParsingSource]:
         stmt = select(ParsingSource).where(ParsingSource.url == url)
         result = await self.session.execute(stmt)
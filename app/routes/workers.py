@@ -3,14 +3,14 @@ from uuid import UUID
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from sqlalchemy.orm import selectinload
 
 from app.db import get_db
-from app.models import ComputeTask
+from app.repositories.compute import DEFAULT_LEASE_S, ComputeTaskRepository
 from app.schemas.compute import (
     ComputeTaskResponse,
     ComputeTaskResultSubmit,
+    WorkerHeartbeat,
+    WorkerHeartbeatResponse,
     WorkerTasksResponse
 )
 from app.auth.dependencies import verify_internal_token
@@ -23,48 +23,48 @@ async def get_tasks(
     task_type: Optional[str] = Query(None, description="Filter by task type"),
     limit: int = Query(10, ge=1, le=100, description="Number of tasks to fetch"),
     worker_id: str = Query(..., description="Worker identifier"),
+    lease_seconds: int = Query(DEFAULT_LEASE_S, ge=10, le=3600, description="How long the tasks are leased to the worker"),
     db: AsyncSession = Depends(get_db),
     _: None = Depends(verify_internal_token)
 ):
     """
-    Poll for pending compute tasks.
-    Marks fetched tasks as 'processing' and assigns them to the worker.
+    Poll for compute tasks: 'high' priority first, then oldest first.
+    Claimed tasks are 'processing' and leased to the worker for `lease_seconds`;
+    extend the lease with POST /tasks/heartbeat, or the task goes to another worker.
+    Concurrent polls never return the same task.
     """
-    # Build query for pending tasks
-    query = select(ComputeTask).where(ComputeTask.status == "pending")
-    
-    if task_type:
-        query = query.where(ComputeTask.task_type == task_type)
-    
-    query = query.order_by(ComputeTask.created_at).limit(limit)
-    
-    result = await db.execute(query)
-    tasks = result.scalars().all()
-    
-    # Mark tasks as processing and assign to worker
-    task_ids = [task.id for task in tasks]
-    if task_ids:
-        await db.execute(
-            update(ComputeTask)
-            .where(ComputeTask.id.in_(task_ids))
-            .values(
-                status="processing",
-                worker_id=worker_id,
-                started_at=datetime.utcnow()
-            )
-        )
-        await db.commit()
-        
-        # Refresh tasks to get updated values
-        for task in tasks:
-            await db.refresh(task)
-    
+    tasks = await ComputeTaskRepository(db).claim(
+        worker_id, limit=limit, task_type=task_type, lease_s=lease_seconds
+    )
+    await db.commit()
+
     return WorkerTasksResponse(
         tasks=[ComputeTaskResponse.model_validate(task) for task in tasks],
         count=len(tasks)
     )
 
 
+@router.post("/tasks/heartbeat", response_model=WorkerHeartbeatResponse)
+async def heartbeat(
+    data: WorkerHeartbeat,
+    db: AsyncSession = Depends(get_db),
+    _: None = Depends(verify_internal_token)
+):
+    """
+    Extend the leases of tasks the worker is still processing.
+    Tasks in `lost` were reclaimed after their lease expired (or are already finished):
+    the worker should drop them.
+    """
+    held = await ComputeTaskRepository(db).heartbeat(data.worker_id, data.task_ids, lease_s=data.lease_seconds)
+    await db.commit()
+
+    held_set = set(held)
+    return WorkerHeartbeatResponse(
+        task_ids=[task_id for task_id in data.task_ids if task_id in held_set],
+        lost=[task_id for task_id in data.task_ids if task_id not in held_set],
+    )
+
+
 @router.post("/tasks/{task_id}/result")
 async def submit_task_result(
     task_id: UUID,
@@ -77,10 +77,7 @@ async def submit_task_result(
     Updates task status to 'completed' or 'failed'.
     """
     # Fetch the task
-    result = await db.execute(
-        select(ComputeTask).where(ComputeTask.id == task_id)
-    )
-    task = result.scalar_one_or_none()
+    task = await ComputeTaskRepository(db).get(task_id, for_update=True)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -90,12 +87,19 @@ async def submit_task_result(
             status_code=400,
             detail=f"Cannot update task with status '{task.status}'"
         )
+
+    if result_data.worker_id and task.worker_id and task.worker_id != result_data.worker_id:
+        raise HTTPException(
+            status_code=409,
+            detail="Task lease expired and the task was reclaimed by another worker"
+        )
     
     # Update task
     task.status = result_data.status
     task.result = result_data.result
     task.error = result_data.error
     task.completed_at = datetime.utcnow()
+    task.lease_expires_at = None
     
     await db.commit()
     await db.refresh(task)
@@ -21,6 +21,8 @@ class ComputeTaskResponse(BaseModel):
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     worker_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    attempts: int = 0
     created_at: datetime
     updated_at: datetime
     started_at: Optional[datetime] = None
@@ -35,9 +37,23 @@ class ComputeTaskResultSubmit(BaseModel):
     status: str = Field(..., description="'completed' or 'failed'")
     result: Optional[Dict[str, Any]] = Field(None, description="Task output data")
     error: Optional[str] = Field(None, description="Error message if failed")
+    worker_id: Optional[str] = Field(None, description="Submitting worker; rejected if the task was reclaimed by another")
 
 
 class WorkerTasksResponse(BaseModel):
     """Schema for batch task retrieval."""
     tasks: List[ComputeTaskResponse]
     count: int
+
+
+class WorkerHeartbeat(BaseModel):
+    """Schema for extending the leases of tasks a worker is still processing."""
+    worker_id: str
+    task_ids: List[UUID]
+    lease_seconds: int = Field(default=300, ge=10, le=3600, description="New lease length from now")
+
+
+class WorkerHeartbeatResponse(BaseModel):
+    """Leases that were extended, and tasks the worker no longer holds (reclaimed or finished)."""
+    task_ids: List[UUID]
+    lost: List[UUID]
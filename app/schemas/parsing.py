@@ -25,6 +25,7 @@ class IngestBatchRequest(BaseModel):
     items: List[ScrapedProduct] = Field(..., description="Список собранных товаров")
     categories: List[ScrapedCategory] = Field(default_factory=list, description="Список найденных категорий (для discovery)")
     source_id: int = Field(..., description="Идентификатор источника задачи")
+    run_id: Optional[str] = Field(None, description="Идентификатор запуска краулинга (статистика копится по нему)")
     stats: dict[str, Any] = Field(default_factory=dict, description="Техническая статистика парсинга (время, ошибки)")
 
 class ParsingSourceSchema(BaseModel):
@@ -63,6 +64,7 @@ class ParsingSourceCreate(BaseModel):
 class ParsingErrorReport(BaseModel):
     error: str
     is_broken: bool = True
+    run_id: Optional[str] = None
 
 class SpiderSyncRequest(BaseModel):
     available_spiders: List[str]
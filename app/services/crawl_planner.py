@@ -0,0 +1,125 @@
+import heapq
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Redis hash: site_key -> {"tokens": float, "ts": unix time of the last update}
+SITE_BUDGET_KEY = "scheduler:site_budget"
+
+# Crawls a site may start back to back, and how fast that allowance comes back.
+# Per site overrides: ParsingSource.config["crawl_budget"] = {"burst": 3, "per_hour": 2}
+# One crawl start per scheduler pass on average, enough for a site with a few hundred
+# daily categories (~20/h) to catch up after an outage instead of idling the workers.
+DEFAULT_BURST = 20
+DEFAULT_PER_HOUR = 60.0
+
+# Fallback when Redis is not configured (single scheduler process, e.g. local runs)
+_memory_budgets: dict[str, dict] = {}
+
+
+class SiteBudgets:
+    """
+    Token bucket per site_key: every crawl the scheduler queues takes one token,
+    tokens come back at `per_hour` up to `burst`. Keeps one big site (hundreds of
+    discovered categories) from flooding the workers and from getting us banned.
+    The scheduler is the only writer, so a plain read-modify-write is enough.
+    """
+
+    def __init__(self, redis=None, burst: float = DEFAULT_BURST, per_hour: float = DEFAULT_PER_HOUR):
+        self.redis = redis
+        self.burst = burst
+        self.per_hour = per_hour
+        self._limits: dict[str, tuple[float, float]] = {}
+        self._tokens: dict[str, float] = {}
+
+    def _learn_limits(self, sources: Sequence) -> list[str]:
+        for source in sources:
+            budget = (source.config or {}).get("crawl_budget")
+            # Any source of the site may carry the override
+            if budget or source.site_key not in self._limits:
+                budget = budget or {}
+                self._limits[source.site_key] = (
+                    float(budget.get("burst", self.burst)),
+                    float(budget.get("per_hour", self.per_hour)),
+                )
+        return list(dict.fromkeys(s.site_key for s in sources))
+
+    async def _load(self, sites: list[str]) -> dict[str, Optional[dict]]:
+        if self.redis is not None:
+            try:
+                values = await self.redis.hmget(SITE_BUDGET_KEY, sites)
+                return {site: json.loads(v) if v else None for site, v in zip(sites, values)}
+            except Exception as e:
+                logger.warning(f"SiteBudgets: Redis unavailable, using in-memory budgets: {e}")
+        return {site: _memory_budgets.get(site) for site in sites}
+
+    async def available(self, sources: Sequence, now: Optional[float] = None) -> dict[str, float]:
+        """Whole tokens each site of `sources` can spend right now."""
+        now = time.time() if now is None else now
+        sites = self._learn_limits(sources)
+        stored = await self._load(sites)
+        for site in sites:
+            burst, per_hour = self._limits[site]
+            state = stored.get(site)
+            if state is None:
+                tokens = burst
+            else:
+                elapsed = max(0.0, now - state["ts"])
+                tokens = min(burst, state["tokens"] + elapsed * per_hour / 3600)
+            self._tokens[site] = tokens
+        return {site: self._tokens[site] for site in sites}
+
+    async def consume(self, counts: dict[str, int], now: Optional[float] = None):
+        """Takes the tokens of the crawls that were actually queued (after `available`)."""
+        now = time.time() if now is None else now
+        updates = {}
+        for site, count in counts.items():
+            if site not in self._tokens:
+                continue
+            self._tokens[site] = max(0.0, self._tokens[site] - count)
+            updates[site] = {"tokens": round(self._tokens[site], 4), "ts": now}
+        if not updates:
+            return
+        if self.redis is not None:
+            try:
+                await self.redis.hset(SITE_BUDGET_KEY, mapping={k: json.dumps(v) for k, v in updates.items()})
+                return
+            except Exception as e:
+                logger.warning(f"SiteBudgets: failed to save budgets to Redis: {e}")
+        _memory_budgets.update(updates)
+
+
+def plan_window(sources: Sequence, tokens: dict[str, float], limit: int) -> list:
+    """
+    Picks up to `limit` sources to queue, interleaved across sites.
+    `sources` come in the order of `ParsingRepository.get_due_window` (priority desc,
+    oldest due first), which is also the order within a site. Sites take turns by
+    stride scheduling: a site's turn moves forward by 1/priority of the source it just
+    queued, so higher-priority work gets proportionally more slots while every site
+    with due work and budget still gets its turn. A site drops out when its tokens run out.
+    """
+    queues: dict[str, deque] = defaultdict(deque)
+    for source in sources:
+        queues[source.site_key].append(source)
+
+    def weight(source) -> float:
+        return float(max(source.priority or 0, 1))
+
+    budget = {site: int(tokens.get(site, 0)) for site in queues}
+    # (pass, -head priority, site): on equal passes the site with more urgent work goes first
+    heap = [(0.0, -weight(q[0]), site) for site, q in queues.items() if budget[site] > 0]
+    heapq.heapify(heap)
+
+    plan = []
+    while heap and len(plan) < limit:
+        pass_, _, site = heapq.heappop(heap)
+        source = queues[site].popleft()
+        plan.append(source)
+        budget[site] -= 1
+        if queues[site] and budget[site] > 0:
+            heapq.heappush(heap, (pass_ + 1 / weight(source), -weight(queues[site][0]), site))
+    return plan
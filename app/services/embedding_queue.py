@@ -0,0 +1,64 @@
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Redis set of gift_ids whose embedding input (content_hash) changed and that still need a vector
+EMBEDDING_QUEUE_KEY = "embedding_queue:pending"
+
+# Fallback when Redis is not configured (single process, e.g. local runs)
+_memory_queue: set[str] = set()
+# Beyond this the fallback drops ids; the full scan picks them up later
+MAX_MEMORY_QUEUE = 100_000
+
+
+class EmbeddingQueue:
+    """
+    Work queue for incremental embedding.
+    Ingestion pushes the gift_ids of new / content-changed products after its commit;
+    `process_embedding_queue` pops them. Being a set, a product re-scraped several
+    times before it is embedded is only embedded once.
+    The queue is best-effort: anything lost here is still picked up by the
+    full `process_embeddings_job` scan (missing or outdated content_hash).
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    async def enqueue(self, gift_ids: Iterable[str]) -> int:
+        gift_ids = list(dict.fromkeys(gift_ids))
+        if not gift_ids:
+            return 0
+        if self.redis is not None:
+            try:
+                return int(await self.redis.sadd(EMBEDDING_QUEUE_KEY, *gift_ids))
+            except Exception as e:
+                logger.warning(f"EmbeddingQueue: Redis unavailable, keeping {len(gift_ids)} ids in memory: {e}")
+        before = len(_memory_queue)
+        _memory_queue.update(gift_ids[: max(0, MAX_MEMORY_QUEUE - before)])
+        return len(_memory_queue) - before
+
+    async def pop(self, limit: int) -> list[str]:
+        gift_ids: list[str] = []
+        if self.redis is not None:
+            try:
+                popped = await self.redis.spop(EMBEDDING_QUEUE_KEY, limit) or []
+                gift_ids = [_decode(v) for v in popped]
+            except Exception as e:
+                logger.warning(f"EmbeddingQueue: failed to pop from Redis: {e}")
+        while _memory_queue and len(gift_ids) < limit:
+            gift_ids.append(_memory_queue.pop())
+        return gift_ids
+
+    async def size(self) -> int:
+        size = len(_memory_queue)
+        if self.redis is not None:
+            try:
+                size += int(await self.redis.scard(EMBEDDING_QUEUE_KEY))
+            except Exception as e:
+                logger.warning(f"EmbeddingQueue: failed to read queue size: {e}")
+        return size
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
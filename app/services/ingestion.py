@@ -7,6 +7,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.repositories.catalog import PostgresCatalogRepository
 from app.repositories.parsing import ParsingRepository
 from app.schemas.parsing import ScrapedProduct, ScrapedCategory
+from app.services.embedding_queue import EmbeddingQueue
+from app.services.ingestion_stats import CrawlStatsBuffer
+from app.services.near_duplicates import NearDuplicateIndex
+from app.utils.bloom import BloomFilter
+from app.utils.catalog import build_content_hash, build_content_text, build_known_offer_key
 
 logger = logging.getLogger(__name__)
 
@@ -36,28 +41,104 @@ def normalize_url(url: str, strip_params: Optional[Set[str]] = None) -> str:
         logger.warning(f"Failed to normalize URL {url}: {e}")
         return url
 
+def _strip_params(source) -> Set[str]:
+    custom_strip = (source.config or {}).get("strip_params") if source else None
+    return set(custom_strip) if isinstance(custom_strip, list) else DEFAULT_STRIP_PARAMS
+
 class IngestionService:
     def __init__(self, db: AsyncSession, redis=None):
         self.db = db
         self.catalog_repo = PostgresCatalogRepository(db)
         self.parsing_repo = ParsingRepository(db, redis=redis)
+        self.crawl_stats = CrawlStatsBuffer(redis)
+        self.embedding_queue = EmbeddingQueue(redis)
+        self.duplicates = NearDuplicateIndex(self.catalog_repo)
+
+    async def ingest_batch(
+        self,
+        products: List[ScrapedProduct],
+        categories: List[ScrapedCategory],
+        source_id: int,
+        run_id: Optional[str] = None,
+    ) -> tuple[dict, dict]:
+        """
+        Ingests one scraper batch (products + discovered categories) with a single commit.
+        Returns the product report {"ingested": n, "new": n} (products upserted after in-batch
+        dedupe, changed or not, and how many of them were not stored before) and the
+        `ingest_categories` report.
+        Source statistics are only buffered here, under the crawl's `run_id`, and written
+        once per crawl by `finish_crawl`.
+        New and content-changed products are pushed to the embedding queue after the commit.
+        """
+        counts, changed_ids = await self._upsert_products(products, source_id) if products else ({}, [])
+        report = {"ingested": sum(counts.values()), "new": counts.get("inserted", 0)}
+        discovery = await self.ingest_categories(categories, commit=False)
+        await self.db.commit()
+
+        if changed_ids:
+            await self.embedding_queue.enqueue(changed_ids)
+        await self.crawl_stats.record(
+            source_id,
+            run_id,
+            processed_items=len(products),
+            new_items=report["new"],
+            content_changed=len(changed_ids),
+            categories_found=discovery["inserted"],
+            categories_backlogged=discovery["backlogged"],
+        )
+        return report, discovery
 
     async def ingest_products(self, products: List[ScrapedProduct], source_id: int):
         if not products:
             return 0
+        report, _ = await self.ingest_batch(products, [], source_id)
+        return report["ingested"]
+
+    async def finish_crawl(
+        self,
+        source_id: int,
+        status: str = "completed",
+        error_message: Optional[str] = None,
+        run_id: Optional[str] = None,
+    ):
+        """Flushes the buffered counters of the crawl `run_id` to ParsingSource.config["last_stats"] and ParsingRun."""
+        stats = await self.crawl_stats.pop(source_id, run_id)
+        return await self.parsing_repo.finish_crawl(source_id, stats, status=status, error_message=error_message)
+
+    async def known_products_filter(self, source_id: int, fp_rate: float = 0.01) -> Optional[dict]:
+        """
+        Bloom filter of the source site's active products at their current price, for
+        incremental crawls: a scraped item whose key is in the filter is (almost surely)
+        already stored unchanged. Keys are `build_known_offer_key(gift_id, price)`; the
+        URL normalization parameters are returned so the scraper builds the same gift_ids.
+        """
+        source = await self.parsing_repo.get_source(source_id)
+        if source is None:
+            return None
+        offers = await self.catalog_repo.get_site_offers(source.site_key)
+        bloom = BloomFilter.for_capacity(len(offers), fp_rate)
+        for gift_id, price in offers:
+            bloom.add(build_known_offer_key(gift_id, price))
+        return {
+            "site_key": source.site_key,
+            "strip_params": sorted(_strip_params(source)),
+            **bloom.to_dict(),
+        }
 
+    async def _upsert_products(self, products: List[ScrapedProduct], source_id: int) -> tuple[dict, List[str]]:
+        """
+        Categories + change-aware product upsert, without committing.
+        Returns the upsert counts ({"inserted", "updated", "unchanged"}) and the gift_ids
+        whose content (embedding input) changed.
+        """
         # Fetch source config for custom normalization
         source = await self.parsing_repo.get_source(source_id)
-        strip_params = DEFAULT_STRIP_PARAMS
-        if source and source.config:
-            custom_strip = source.config.get("strip_params")
-            if isinstance(custom_strip, list):
-                strip_params = set(custom_strip)
+        strip_params = _strip_params(source)
 
         # 1. Handle Categories
         external_categories = list(set([p.category for p in products if p.category]))
         if external_categories:
-            await self.parsing_repo.get_or_create_category_maps(external_categories)
+            await self.parsing_repo.ensure_category_maps(external_categories)
 
         # 2. Prepare Product data for Upsert
         product_dicts = []
@@ -71,7 +152,7 @@ class IngestionService:
                 continue
             seen_gift_ids.add(gift_id)
             
-            product_dicts.append({
+            row = {
                 "gift_id": gift_id,
                 "title": p.title,
                 "description": p.description,
@@ -83,72 +164,77 @@ class IngestionService:
                 "category": p.category, 
                 "raw": p.raw_data,
                 "is_active": True
-            })
+            }
+            # Same enrichment as the Takprodam sync, so scraped products are embedded incrementally
+            row["content_text"] = build_content_text(row)
+            row["content_hash"] = build_content_hash(row["content_text"], p.image_url)
+            product_dicts.append(row)
 
-        # 3. Bulk Upsert
-        count = await self.catalog_repo.upsert_products(product_dicts)
-        
-        # 4. Update Source Stats
-        await self.parsing_repo.update_source_stats(source_id, {
-            "processed_items": len(products),
-            "new_items": count
-        })
-        
-        # 5. Log Run History
-        await self.parsing_repo.log_parsing_run(
-            source_id=source_id,
-            status="completed",
-            items_scraped=len(products),
-            items_new=count
-        )
-        
-        await self.db.commit()
-        return count
+        # 3. Bulk Upsert (unchanged rows are not rewritten)
+        changed_ids: List[str] = []
+        counts = await self.catalog_repo.upsert_changed_products(product_dicts, changed_ids=changed_ids)
+
+        # 4. Near-duplicate clusters for new / retitled products
+        if changed_ids:
+            changed = set(changed_ids)
+            await self.duplicates.assign([p for p in product_dicts if p["gift_id"] in changed])
+        return counts, changed_ids
 
-    async def ingest_categories(self, categories: List[ScrapedCategory], activation_quota: int = 50):
-        """Discovers new ParsingSources. Activates some, puts others in backlog."""
+    async def ingest_categories(self, categories: List[ScrapedCategory], activation_quota: int = 50, commit: bool = True) -> dict:
+        """
+        Discovers new ParsingSources. Activates some, puts others in backlog.
+        Set-based: one query for already known URLs and one INSERT ... ON CONFLICT (url) DO NOTHING,
+        the activation quota is applied in memory.
+        Returns {"inserted": n, "skipped": n, "backlogged": n} (backlogged ones are part of inserted).
+        """
+        result = {"inserted": 0, "skipped": 0, "backlogged": 0}
         if not categories:
-            return 0
-            
+            return result
+
+        # Normalize and dedupe within the batch (first occurrence wins)
+        by_url = {}
+        for cat in categories:
+            by_url.setdefault(normalize_url(cat.url), cat)
+
+        existing = await self.parsing_repo.get_existing_source_urls(list(by_url))
+        new_urls = [url for url in by_url if url not in existing]
+        result["skipped"] = len(categories) - len(new_urls)
+        if not new_urls:
+            return result
+
         # Count how many we already activated today
         activated_today = await self.parsing_repo.count_discovered_today()
         remaining_quota = max(0, activation_quota - activated_today)
 
-        count = 0
-        for i, cat in enumerate(categories):
-            clean_url = normalize_url(cat.url)
-            
+        discovered_at = datetime.utcnow().isoformat()
+        rows = []
+        for i, url in enumerate(new_urls):
+            cat = by_url[url]
             # If within quota, status is 'waiting', else 'discovered' (backlog)
             # hub (list) sources are activated by default if within quota
-            is_within_quota = (i < remaining_quota)
-            status = "waiting" if is_within_quota else "discovered"
-            is_active = True if is_within_quota else False
-
-            # Check if source already exists
-            existing = await self.parsing_repo.get_source_by_url(clean_url)
-            if existing:
-                continue
-
-            source_data = {
-                "url": clean_url,
+            is_within_quota = i < remaining_quota
+            rows.append({
+                "url": url,
                 "site_key": cat.site_key,
                 "type": "list", 
                 "strategy": "deep", 
                 "priority": 50,
                 "refresh_interval_hours": 24,
-                "is_active": is_active,
-                "status": status,
+                "is_active": is_within_quota,
+                "status": "waiting" if is_within_quota else "discovered",
                 "config": {
                     "discovery_name": cat.name,
                     "parent_url": cat.parent_url,
-                    "discovered_at": datetime.utcnow().isoformat()
+                    "discovered_at": discovered_at
                 }
-            }
-            try:
-                await self.parsing_repo.upsert_source(source_data)
-                count += 1
-            except Exception as e:
-                logger.error(f"Failed to upsert discovered source {clean_url}: {e}")
-        
-        await self.db.commit()
-        return count
+            })
+
+        inserted = set(await self.parsing_repo.insert_new_sources(rows))
+        result["inserted"] = len(inserted)
+        # Rows lost to a concurrent insert of the same URL count as skipped
+        result["skipped"] += len(rows) - len(inserted)
+        result["backlogged"] = sum(1 for r in rows if r["url"] in inserted and r["status"] == "discovered")
+
+        if commit:
+            await self.db.commit()
+        return result
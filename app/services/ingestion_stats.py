@@ -0,0 +1,80 @@
+import logging
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "ingest_stats:{source_id}:{run_id}"
+# Counters of a crawl that never reported its end are dropped after this long
+STATS_TTL_S = 3 * 24 * 3600
+
+# Store when Redis is not configured at all (single API process, e.g. local runs)
+_memory_stats: dict[tuple[int, str], dict[str, float]] = {}
+
+
+def _run_key(run_id: Optional[str]) -> str:
+    # Batches of scrapers that don't send a run id share one bucket per source
+    return run_id or "-"
+
+
+class CrawlStatsBuffer:
+    """
+    Write-behind crawl counters, keyed by source and crawl run id.
+    Each ingest batch only increments counters (one pipelined Redis round trip);
+    they are written to the database once per crawl by `ParsingRepository.finish_crawl`.
+    Batches of a run that arrive after its end (queue drains, spool replays) land in
+    the finished run's own key and expire with it instead of leaking into the next crawl.
+    Stats are best-effort: a Redis failure never fails the ingestion itself, the
+    counters of that batch are dropped (a per-process fallback would split a crawl's
+    stats across API workers).
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    async def record(self, source_id: int, run_id: Optional[str] = None, **counters: int) -> None:
+        if not source_id:
+            return
+        if self.redis is not None:
+            key = STATS_KEY.format(source_id=source_id, run_id=_run_key(run_id))
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for name, value in counters.items():
+                    pipe.hincrby(key, name, int(value))
+                pipe.hincrby(key, "batches", 1)
+                pipe.hsetnx(key, "started_at", time.time())
+                pipe.expire(key, STATS_TTL_S)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"CrawlStatsBuffer: Redis unavailable, dropping stats of a batch of source {source_id}: {e}")
+            return
+
+        stats = _memory_stats.setdefault((source_id, _run_key(run_id)), {"started_at": time.time()})
+        for name, value in list(counters.items()) + [("batches", 1)]:
+            stats[name] = stats.get(name, 0) + int(value)
+
+    async def pop(self, source_id: int, run_id: Optional[str] = None) -> dict[str, Any]:
+        """Returns and resets the counters accumulated for the given crawl run of the source."""
+        stats: dict[str, float] = {}
+        if self.redis is not None:
+            key = STATS_KEY.format(source_id=source_id, run_id=_run_key(run_id))
+            try:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.hgetall(key)
+                pipe.delete(key)
+                raw, _ = await pipe.execute()
+                stats = {_decode(k): float(v) for k, v in (raw or {}).items()}
+            except Exception as e:
+                logger.warning(f"CrawlStatsBuffer: failed to read stats for source {source_id}: {e}")
+        else:
+            stats = _memory_stats.pop((source_id, _run_key(run_id)), {})
+
+        started_at: Optional[float] = stats.pop("started_at", None)
+        result: dict[str, Any] = {name: int(value) for name, value in stats.items()}
+        if started_at is not None:
+            result["duration_seconds"] = round(max(0.0, time.time() - started_at), 3)
+        return result
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
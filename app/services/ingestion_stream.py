@@ -0,0 +1,272 @@
+import logging
+import zlib
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, List, Optional
+
+import orjson
+from pydantic import ValidationError
+
+from app.schemas.parsing import ScrapedCategory, ScrapedProduct
+
+try:  # Python 3.14+
+    from compression import zstd
+except ImportError:  # pragma: no cover - depends on the interpreter
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+logger = logging.getLogger(__name__)
+
+# A single NDJSON line larger than this is rejected (the rest of the stream is still processed)
+MAX_LINE_BYTES = 1024 * 1024
+# Only the first N line errors are returned to the client, the total is always counted
+MAX_REPORTED_ERRORS = 100
+# Decompressed output is produced at most this many bytes at a time, so a small compressed
+# chunk (a gzip/zstd bomb) never expands into one huge buffer
+DECOMPRESS_CHUNK_BYTES = 64 * 1024
+
+
+class UnsupportedEncodingError(ValueError):
+    pass
+
+
+class CorruptedStreamError(ValueError):
+    pass
+
+
+def make_decompressor(content_encoding: Optional[str]):
+    """Returns an object with `.decompress(bytes) -> bytes` for the given Content-Encoding, or None."""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        if zstd is None:
+            raise UnsupportedEncodingError("zstd support is not installed")
+        return zstd.ZstdDecompressor()
+    raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+_DECOMPRESS_ERRORS = (zlib.error, EOFError) + ((zstd.ZstdError,) if zstd is not None else ())
+
+
+class StreamDecoder:
+    """
+    Incremental decompression of a request body with bounded output.
+    Concatenated gzip members / zstd frames are decoded one after another, and a body
+    that ends inside a member raises CorruptedStreamError from `finish()`.
+    """
+
+    def __init__(self, content_encoding: Optional[str], max_output: int = DECOMPRESS_CHUNK_BYTES):
+        self.content_encoding = content_encoding
+        self.max_output = max_output
+        self._decompressor = make_decompressor(content_encoding)
+        self._started = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._decompressor is not None
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Yields the output for `data` in pieces of at most `max_output` bytes."""
+        self._started = self._started or bool(data)
+        d = self._decompressor
+        try:
+            while True:
+                if d.eof:
+                    data = d.unused_data + data
+                    if not data:
+                        return
+                    # Next gzip member / zstd frame
+                    d = self._decompressor = make_decompressor(self.content_encoding)
+                out = d.decompress(data, self.max_output)
+                # zlib keeps the input it had no room for; zstd buffers it internally
+                data = getattr(d, "unconsumed_tail", b"")
+                if out:
+                    yield out
+                if not data and len(out) < self.max_output and not (d.eof and d.unused_data):
+                    return
+        except _DECOMPRESS_ERRORS as e:
+            raise CorruptedStreamError(f"cannot decompress body: {e}") from e
+
+    def finish(self) -> Iterator[bytes]:
+        yield from self.feed(b"")
+        if self._started and not self._decompressor.eof:
+            raise CorruptedStreamError("cannot decompress body: stream ended before the end of the compressed data")
+
+
+async def _decoded(chunks: AsyncIterator[bytes], content_encoding: Optional[str]) -> AsyncIterator[bytes]:
+    decoder = StreamDecoder(content_encoding)
+    async for chunk in chunks:
+        if not decoder.enabled:
+            yield chunk
+            continue
+        for data in decoder.feed(chunk):
+            yield data
+    if decoder.enabled:
+        for data in decoder.finish():
+            yield data
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str] = None,
+    max_line_bytes: int = MAX_LINE_BYTES,
+) -> AsyncIterator[tuple[int, Optional[bytes]]]:
+    """
+    Decompresses the body chunk by chunk and yields (line_no, raw_line).
+    Only one partial line is buffered at a time. Lines exceeding `max_line_bytes`
+    are yielded as (line_no, None) and skipped.
+    """
+    buffer = bytearray()
+    line_no = 0
+    oversized = False
+
+    async for data in _decoded(chunks, content_encoding):
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                break
+            line_no += 1
+            if oversized or len(buffer) + (end - start) > max_line_bytes:
+                yield line_no, None
+            else:
+                buffer += data[start:end]
+                yield line_no, bytes(buffer)
+            buffer.clear()
+            oversized = False
+            start = end + 1
+        if not oversized:
+            buffer += data[start:]
+            if len(buffer) > max_line_bytes:
+                # Drop the tail of a huge line instead of buffering it
+                oversized = True
+                buffer.clear()
+
+    if buffer or oversized:
+        line_no += 1
+        yield line_no, None if oversized else bytes(buffer)
+
+
+@dataclass
+class StreamIngestResult:
+    lines: int = 0
+    truncated: bool = False
+    items_ingested: int = 0
+    items_new: int = 0
+    products: int = 0
+    categories_ingested: int = 0
+    categories_skipped: int = 0
+    categories_backlogged: int = 0
+    chunks: int = 0
+    errors_count: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def add_error(self, line_no: int, error: str) -> None:
+        self.errors_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ok",
+            "lines": self.lines,
+            "truncated": self.truncated,
+            "items_ingested": self.items_ingested,
+            "items_new": self.items_new,
+            "products_accepted": self.products,
+            "categories_ingested": self.categories_ingested,
+            "categories_skipped": self.categories_skipped,
+            "categories_backlogged": self.categories_backlogged,
+            "chunks": self.chunks,
+            "errors_count": self.errors_count,
+            "errors": self.errors,
+        }
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+async def ingest_ndjson_stream(
+    service,
+    chunks: AsyncIterator[bytes],
+    source_id: int,
+    content_encoding: Optional[str] = None,
+    chunk_size: int = 500,
+    run_id: Optional[str] = None,
+) -> StreamIngestResult:
+    """
+    Streams NDJSON items (ScrapedProduct / ScrapedCategory per line) into
+    `IngestionService.ingest_batch`, `chunk_size` validated lines at a time.
+    Invalid lines are reported and skipped; they never reject the whole upload.
+    """
+    result = StreamIngestResult()
+    products: List[ScrapedProduct] = []
+    categories: List[ScrapedCategory] = []
+
+    async def flush() -> None:
+        if not products and not categories:
+            return
+        report, discovery = await service.ingest_batch(products, categories, source_id, run_id=run_id)
+        result.items_ingested += report["ingested"]
+        result.items_new += report["new"]
+        result.categories_ingested += discovery["inserted"]
+        result.categories_skipped += discovery["skipped"]
+        result.categories_backlogged += discovery["backlogged"]
+        result.chunks += 1
+        products.clear()
+        categories.clear()
+
+    lines = iter_ndjson_lines(chunks, content_encoding)
+    while True:
+        try:
+            line_no, raw = await lines.__anext__()
+        except StopAsyncIteration:
+            break
+        except CorruptedStreamError as e:
+            # Keep everything that was decoded before the damage
+            result.truncated = True
+            result.add_error(result.lines + 1, str(e))
+            break
+        result.lines = line_no
+        if raw is None:
+            result.add_error(line_no, f"line exceeds {MAX_LINE_BYTES} bytes")
+            continue
+        if not raw.strip():
+            continue
+        try:
+            item = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            result.add_error(line_no, f"invalid JSON: {e}")
+            continue
+        if not isinstance(item, dict):
+            result.add_error(line_no, "expected a JSON object")
+            continue
+
+        try:
+            # Same routing as the scraper pipeline: products have product_url, categories url + name
+            if "product_url" in item:
+                products.append(ScrapedProduct.model_validate(item))
+                result.products += 1
+            elif "url" in item and "name" in item:
+                categories.append(ScrapedCategory.model_validate(item))
+            else:
+                result.add_error(line_no, "neither a product nor a category")
+                continue
+        except ValidationError as e:
+            result.add_error(line_no, _validation_message(e))
+            continue
+
+        if len(products) + len(categories) >= chunk_size:
+            await flush()
+
+    await flush()
+    if result.errors_count:
+        logger.warning(
+            f"Stream ingest for source {source_id}: {result.errors_count} bad lines out of {result.lines}"
+        )
+    return result
@@ -0,0 +1,78 @@
+import logging
+from typing import Optional
+
+from app.utils.near_duplicates import hamming_distance, is_near_duplicate, lsh_buckets, price_band, title_simhash
+
+logger = logging.getLogger(__name__)
+
+
+class NearDuplicateIndex:
+    """
+    Incrementally maintained cross-merchant near-duplicate index.
+    Each product gets a SimHash of its normalized title; products whose signatures
+    are within a few bits and whose prices fall in the same or adjacent log-scale
+    band are the same item. The product joins the cluster of its closest match
+    (`duplicate_cluster_id`), or starts its own cluster named after its gift_id.
+    Candidates are found through LSH buckets, so assigning a batch costs one
+    lookup query and one write, independent of catalog size. Does not commit.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    async def assign(self, products: list[dict]) -> dict[str, Optional[str]]:
+        """Clusters the given rows (gift_id, title, price). Returns gift_id -> duplicate_cluster_id."""
+        signatures = []
+        lookup: set[str] = set()
+        for p in products:
+            simhash = title_simhash(p.get("title") or "")
+            band = price_band(p.get("price"))
+            signatures.append((p["gift_id"], simhash, band))
+            if simhash is not None:
+                lookup.update(lsh_buckets(simhash, band, neighbours=True))
+
+        # Local copy of the relevant part of the index; the batch is added to it as we go
+        index: dict[str, list[tuple]] = {}
+
+        def add(gift_id, simhash, band, cluster_id):
+            for bucket in lsh_buckets(simhash, band):
+                index.setdefault(bucket, []).append((gift_id, simhash, band, cluster_id))
+
+        batch_ids = {gift_id for gift_id, _, _ in signatures}
+        for gift_id, simhash, price, cluster_id in await self.repo.get_duplicate_candidates(sorted(lookup)):
+            if gift_id in batch_ids or simhash is None:
+                continue
+            add(gift_id, simhash, price_band(price), cluster_id or gift_id)
+
+        rows = []
+        assigned: dict[str, Optional[str]] = {}
+        for gift_id, simhash, band in signatures:
+            if simhash is None:
+                rows.append({"gift_id": gift_id, "title_simhash": None, "duplicate_cluster_id": None, "buckets": []})
+                assigned[gift_id] = None
+                continue
+
+            best = None
+            for bucket in lsh_buckets(simhash, band, neighbours=True):
+                for other_id, other_hash, other_band, other_cluster in index.get(bucket, []):
+                    if other_id == gift_id or not is_near_duplicate(simhash, band, other_hash, other_band):
+                        continue
+                    distance = hamming_distance(simhash, other_hash)
+                    if best is None or distance < best[0]:
+                        best = (distance, other_cluster)
+
+            cluster_id = best[1] if best else gift_id
+            add(gift_id, simhash, band, cluster_id)
+            assigned[gift_id] = cluster_id
+            rows.append({
+                "gift_id": gift_id,
+                "title_simhash": simhash,
+                "duplicate_cluster_id": cluster_id,
+                "buckets": lsh_buckets(simhash, band),
+            })
+
+        await self.repo.save_duplicate_signatures(rows)
+        clustered = sum(1 for gift_id, cluster_id in assigned.items() if cluster_id and cluster_id != gift_id)
+        if clustered:
+            logger.info(f"NearDuplicateIndex: {clustered}/{len(rows)} products joined an existing cluster")
+        return assigned
@@ -1,68 +1,236 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-import pika
+import time
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, Optional
 
-from app.config import get_settings
+from prometheus_client import Counter, Gauge
 
 logger = logging.getLogger(__name__)
 
+NOTIFICATIONS_QUEUE = "notifications"
+
+NOTIFICATIONS = Counter(
+    "notifications_total",
+    "Notifications by outcome",
+    ["topic", "status"],  # queued, coalesced, sent, dropped
+)
+NOTIFICATIONS_DROPPED = Counter(
+    "notifications_dropped_total",
+    "Notifications that were never published",
+    ["topic", "reason"],  # buffer_full, publisher_full
+)
+NOTIFICATIONS_BUFFER = Gauge("notifications_buffer_size", "Notifications waiting to be published")
+
+
+def _json_serial(obj):
+    # Helper to handle non-serializable objects (like HttpUrl)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if hasattr(obj, "model_dump"): # Pydantic v2
+        return obj.model_dump()
+    if hasattr(obj, "dict"): # Pydantic v1
+        return obj.dict()
+    return str(obj)
+
+
+@dataclass
+class _Window:
+    started: float
+    topic: str
+    message: str
+    data: Dict[str, Any]
+    repeats: int = 0
+
+
 class NotificationService:
-    def __init__(self):
-        self.settings = get_settings()
-        self.queue_name = "notifications"
+    """
+    Publishes notifications to the RabbitMQ 'notifications' queue (read by the Telegram bot)
+    without ever making the caller wait on the broker: `notify` only puts the message into a
+    bounded in-memory buffer, a background task publishes it.
 
-    def _get_connection(self):
-        params = pika.URLParameters(self.settings.rabbitmq_url)
-        return pika.BlockingConnection(params)
+    - Identical alerts (same topic, text and target chat) within `coalesce_window_s` are sent
+      once; when the window closes, one follow-up message carries the repeat count.
+    - Each topic publishes at most `topic_rate_per_min` messages a minute (bursts of `topic_burst`);
+      the rest waits in the buffer.
+    - When the buffer is full, `drop_policy` "oldest" drops the oldest waiting message and
+      "newest" rejects the incoming one; both are counted in notifications_dropped_total.
+    """
 
-    async def notify(self, topic: str, message: str, data: Optional[Dict[str, Any]] = None):
+    def __init__(
+        self,
+        publisher=None,
+        buffer_size: int = 500,
+        coalesce_window_s: float = 60.0,
+        topic_rate_per_min: float = 20.0,
+        topic_burst: int = 10,
+        drop_policy: str = "oldest",
+        tick_s: float = 1.0,
+    ):
+        self.publisher = publisher
+        self.queue_name = NOTIFICATIONS_QUEUE
+        self.buffer_size = buffer_size
+        self.coalesce_window_s = coalesce_window_s
+        self.topic_rate_per_min = topic_rate_per_min
+        self.topic_burst = topic_burst
+        self.drop_policy = drop_policy
+        self.tick_s = tick_s
+        self._buffer: deque[dict] = deque()
+        self._recent: dict[tuple, _Window] = {}
+        self._tokens: dict[str, tuple[float, float]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    async def notify(self, topic: str, message: str, data: Optional[Dict[str, Any]] = None) -> bool:
         """
-        Publishes a notification message to the RabbitMQ 'notifications' queue.
+        Queues a notification for the 'notifications' queue. Returns False only if it was dropped.
         """
-        # Helper to handle non-serializable objects (like HttpUrl)
-        def json_serial(obj):
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if hasattr(obj, "dict"): # Pydantic v1
-                return obj.dict()
-            if hasattr(obj, "model_dump"): # Pydantic v2
-                return obj.model_dump()
-            return str(obj)
+        data = data or {}
+        now = time.monotonic()
+        # Private messages go to one chat: the same text for two chats is not a repeat
+        key = (topic, message, data.get("target_chat_id"))
+        window = self._recent.get(key)
+        if window is not None and now - window.started < self.coalesce_window_s:
+            window.repeats += 1
+            NOTIFICATIONS.labels(topic=topic, status="coalesced").inc()
+            return True
+        self._recent[key] = _Window(started=now, topic=topic, message=message, data=data)
 
+        accepted = self._enqueue(topic, message, data)
+        self._ensure_sender()
+        return accepted
+
+    def _enqueue(self, topic: str, message: str, data: Dict[str, Any]) -> bool:
         payload = {
             "topic": topic,
             "text": message,
-            "data": data or {},
+            "data": data,
             "timestamp": datetime.utcnow().isoformat()
         }
+        # Serialize now: the caller may mutate `data` before the background task publishes it
+        payload = json.loads(json.dumps(payload, default=_json_serial))
 
-        try:
-            # We use a context manager or local connection to avoid keeping long-lived pika connections
-            # in the sync-in-async context of FastAPI without a proper connection manager.
-            # For small load, this is acceptable.
-            connection = self._get_connection()
-            channel = connection.channel()
-            
-            channel.queue_declare(queue=self.queue_name, durable=True)
-            
-            channel.basic_publish(
-                exchange='',
-                routing_key=self.queue_name,
-                body=json.dumps(payload, default=json_serial),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # make message persistent
-                )
-            )
-            connection.close()
-            logger.info(f"Notification published to topic '{topic}': {message}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to publish notification: {e}")
+        if len(self._buffer) >= self.buffer_size:
+            if self.drop_policy == "newest":
+                self._drop(topic, "buffer_full")
+                return False
+            self._drop(self._buffer.popleft()["topic"], "buffer_full")
+        self._buffer.append(payload)
+        NOTIFICATIONS.labels(topic=topic, status="queued").inc()
+        NOTIFICATIONS_BUFFER.set(len(self._buffer))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _drop(self, topic: str, reason: str):
+        NOTIFICATIONS.labels(topic=topic, status="dropped").inc()
+        NOTIFICATIONS_DROPPED.labels(topic=topic, reason=reason).inc()
+        logger.warning(f"Dropped a '{topic}' notification ({reason})")
+
+    def _ensure_sender(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def _close_windows(self, now: float, force: bool = False):
+        for key, window in list(self._recent.items()):
+            if force or now - window.started >= self.coalesce_window_s:
+                del self._recent[key]
+                if window.repeats:
+                    self._enqueue(
+                        window.topic,
+                        f"{window.message}\n\n(repeated {window.repeats} more times in {self.coalesce_window_s:g}s)",
+                        {**window.data, "repeat_count": window.repeats},
+                    )
+
+    def _take_token(self, topic: str, now: float) -> bool:
+        tokens, ts = self._tokens.get(topic, (float(self.topic_burst), now))
+        tokens = min(float(self.topic_burst), tokens + (now - ts) * self.topic_rate_per_min / 60)
+        if tokens < 1:
+            self._tokens[topic] = (tokens, now)
             return False
+        self._tokens[topic] = (tokens - 1, now)
+        return True
+
+    def _take_ready(self, now: float) -> list[dict]:
+        """Messages allowed by their topic's rate limit, in buffer order; the rest stays."""
+        ready, waiting = [], deque()
+        for payload in self._buffer:
+            (ready if self._take_token(payload["topic"], now) else waiting).append(payload)
+        self._buffer = waiting
+        NOTIFICATIONS_BUFFER.set(len(self._buffer))
+        return ready
+
+    async def _publish(self, batch: list[dict]):
+        if self.publisher is None:
+            from app.utils.rabbitmq import get_task_publisher
+
+            self.publisher = get_task_publisher()
+        accepted = await self.publisher.publish_many(self.queue_name, batch)
+        for payload in batch[:accepted]:
+            NOTIFICATIONS.labels(topic=payload["topic"], status="sent").inc()
+        for payload in batch[accepted:]:
+            self._drop(payload["topic"], "publisher_full")
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.monotonic()
+                self._close_windows(now)
+                batch = self._take_ready(now)
+                if batch:
+                    await self._publish(batch)
+                    logger.info(f"Published {len(batch)} notifications")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to publish notifications: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self, timeout: float = 5.0):
+        """Sends pending repeat counts and waits (up to `timeout`) for the buffer to drain."""
+        self._close_windows(time.monotonic(), force=True)
+        deadline = time.monotonic() + timeout
+        if self._buffer:
+            self._ensure_sender()
+        while self._buffer and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+        self._task = None
+        if self._buffer:
+            logger.warning(f"Closing NotificationService with {len(self._buffer)} unsent notifications")
+
+
+_service: Optional[NotificationService] = None
+
 
 def get_notification_service() -> NotificationService:
-    return NotificationService()
+    """The process-wide notifier (one buffer and background publisher per process)."""
+    global _service
+    if _service is None:
+        _service = NotificationService()
+    return _service
+
+
+async def close_notification_service():
+    global _service
+    if _service is not None:
+        await _service.close()
+        _service = None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Window of the "price dropped" signal and how far below the window average counts as a drop
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_MIN_DROP = 0.1
+
+
+@dataclass
+class PriceStats:
+    gift_id: str
+    current: float
+    min: float
+    max: float
+    # Time-weighted: a price that held for a week counts seven times a price that held for a day
+    avg: float
+    changes: int
+
+    @property
+    def drop(self) -> float:
+        """How far the current price is below the window average (0.2 = 20% cheaper), 0 if not below."""
+        if not self.avg or self.current >= self.avg:
+            return 0.0
+        return (self.avg - self.current) / self.avg
+
+
+def _utc(ts: datetime) -> datetime:
+    # SQLite returns naive datetimes; history timestamps are written in UTC
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def window_stats(gift_id: str, points: Sequence[tuple], start: datetime, end: datetime) -> Optional[PriceStats]:
+    """
+    Stats of one product over [start, end] from its change-only points (ts, price) in time
+    order; a point before `start` sets the price at `start`. None if there are no points.
+    """
+    segments = []
+    for i, (ts, price) in enumerate(points):
+        seg_start = max(_utc(ts), start)
+        seg_end = min(_utc(points[i + 1][0]), end) if i + 1 < len(points) else end
+        if seg_start > end or (seg_end <= seg_start and i + 1 < len(points)):
+            continue
+        segments.append((float(price), max((seg_end - seg_start).total_seconds(), 0.0)))
+    if not segments:
+        return None
+    prices = [price for price, _ in segments]
+    total = sum(duration for _, duration in segments)
+    avg = sum(price * duration for price, duration in segments) / total if total else prices[-1]
+    return PriceStats(
+        gift_id=gift_id,
+        current=prices[-1],
+        min=min(prices),
+        max=max(prices),
+        avg=avg,
+        changes=len(segments) - 1,
+    )
+
+
+class PriceHistory:
+    """
+    Read side of product_price_history for ranking and budget filtering:
+    min / max / time-weighted average price over a window and the "price dropped" signal.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    async def stats(
+        self,
+        gift_ids: list[str],
+        days: float = DEFAULT_WINDOW_DAYS,
+        now: Optional[datetime] = None,
+    ) -> dict[str, PriceStats]:
+        """Stats of the last `days` per product; products without history are left out."""
+        end = now or datetime.now(timezone.utc)
+        start = end - timedelta(days=days)
+        by_gift: dict[str, list[tuple]] = {}
+        for gift_id, ts, price in await self.repo.get_price_points(list(dict.fromkeys(gift_ids)), start):
+            by_gift.setdefault(gift_id, []).append((ts, price))
+        result = {}
+        for gift_id, points in by_gift.items():
+            stats = window_stats(gift_id, points, start, end)
+            if stats is not None:
+                result[gift_id] = stats
+        return result
+
+    async def price_drops(
+        self,
+        gift_ids: list[str],
+        days: float = DEFAULT_WINDOW_DAYS,
+        min_drop: float = DEFAULT_MIN_DROP,
+        now: Optional[datetime] = None,
+    ) -> dict[str, float]:
+        """gift_id -> drop fraction for products now at least `min_drop` below their window average."""
+        stats = await self.stats(gift_ids, days=days, now=now)
+        return {gift_id: s.drop for gift_id, s in stats.items() if s.drop >= min_drop}
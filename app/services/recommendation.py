@@ -10,6 +10,7 @@ from app.repositories.catalog import PostgresCatalogRepository
 from app.services.embeddings import EmbeddingService
 from app.services.intelligence import IntelligenceAPIClient, get_intelligence_client
 from app.services.notifications import get_notification_service
+from app.utils.near_duplicates import cluster_key, collapse_duplicates
 
 from app.models import SearchLog, HypothesisProductLink
 import uuid
@@ -100,7 +101,8 @@ class RecommendationService:
             limit=50,
             is_active_only=True
         )
-        return candidates
+        # The same item from several merchants only takes one slot
+        return collapse_duplicates(candidates)
 
     async def _rank_candidates(self, request: RecommendationRequest, candidates: list[Any]) -> list[Any]:
         """Stage B: CPU Ranker (Logic from SoT Section 5)"""
@@ -175,6 +177,7 @@ class RecommendationService:
         for res in search_results:
             if isinstance(res, tuple):
                 query, candidates = res
+                candidates = collapse_duplicates(candidates)
                 query_to_results[query] = candidates
                 
                 # Calculate simple metrics for logging
@@ -242,7 +245,7 @@ class RecommendationService:
             scored = sorted(candidates, key=lambda x: id_to_score.get(x.gift_id, 0.0), reverse=True)
             per_query_final.append(scored[:final_limit_per_query])
 
-        # 5. Interleave with Deduplication
+        # 5. Interleave with Deduplication (near-duplicate clusters count as one product)
         final_list = []
         seen_ids = set()
         
@@ -250,8 +253,8 @@ class RecommendationService:
             for q_list in per_query_final:
                 if i < len(q_list):
                     p = q_list[i]
-                    if p.gift_id not in seen_ids:
-                        seen_ids.add(p.gift_id)
+                    if cluster_key(p) not in seen_ids:
+                        seen_ids.add(cluster_key(p))
                         final_list.append(GiftDTO(
                             id=p.gift_id,
                             title=p.title,
@@ -328,8 +331,8 @@ class RecommendationService:
         all_candidates = {}
         for results in search_results:
             for c in results:
-                if c.gift_id not in all_candidates:
-                    all_candidates[c.gift_id] = c
+                if cluster_key(c) not in all_candidates:
+                    all_candidates[cluster_key(c)] = c
         
         candidates_list = list(all_candidates.values())
         if not candidates_list:
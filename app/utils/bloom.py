@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+
+class BloomFilter:
+    """
+    Compact set-membership filter: no false negatives, false positives at ~`fp_rate`.
+    Positions come from double hashing of one blake2b digest, so the scraper-side
+    reader (gifty_scraper.bloom) computes exactly the same bits.
+    """
+
+    def __init__(self, size_bits: int, hash_count: int, bits: Optional[bytearray] = None, count: int = 0):
+        self.size_bits = max(8, size_bits)
+        self.hash_count = max(1, hash_count)
+        self.bits = bits if bits is not None else bytearray((self.size_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float = 0.01) -> "BloomFilter":
+        capacity = max(1, capacity)
+        size_bits = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        hash_count = int(round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hash_count)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_dict(self) -> dict:
+        return {
+            "size_bits": self.size_bits,
+            "hash_count": self.hash_count,
+            "count": self.count,
+            "bits": base64.b64encode(zlib.compress(bytes(self.bits))).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BloomFilter":
+        bits = bytearray(zlib.decompress(base64.b64decode(data["bits"])))
+        return cls(data["size_bits"], data["hash_count"], bits=bits, count=data.get("count", 0))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import hashlib
+from typing import Optional
 
 def build_content_text(item: dict) -> str:
     """
@@ -20,3 +21,14 @@ def build_content_hash(text: str, image_url: Optional[str] = None) -> str:
     """sha256(content_text + (image_url or ""))"""
     combined = f"{text}|{image_url or ''}"
     return hashlib.sha256(combined.encode("utf-8")).hexdigest()
+
+def build_offer_hash(price, currency: Optional[str] = None, is_active: bool = True) -> str:
+    """Hash of the volatile offer fields (price + availability), tracked apart from content_hash."""
+    price_part = f"{float(price):.2f}" if price is not None else ""
+    combined = f"{price_part}|{currency or ''}|{int(bool(is_active))}"
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()
+
+def build_known_offer_key(gift_id: str, price) -> str:
+    """Element of the known-products filter: a product at its current price (see IngestionService)."""
+    price_part = f"{float(price):.2f}" if price is not None else ""
+    return f"{gift_id}|{price_part}"
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Durable queue the scrapers publish ingest batches to (same payload as POST /internal/ingest-batch)
+INGEST_QUEUE = "ingest_batches"
+
+
+class IngestMessage(ABC):
+    """A delivered ingest batch. Must be acked (after commit) or nacked exactly once."""
+
+    def __init__(self, body: bytes, published_at: Optional[float] = None):
+        self.body = body
+        self.published_at = published_at
+
+    @abstractmethod
+    async def ack(self) -> None:
+        pass
+
+    @abstractmethod
+    async def nack(self, requeue: bool = True) -> None:
+        pass
+
+
+class AioPikaIngestBroker:
+    """
+    RabbitMQ consumer side of the ingest queue.
+    `prefetch` bounds the number of unacked deliveries, which is the backpressure:
+    while the consumer is busy committing, RabbitMQ keeps the rest in the queue.
+    """
+
+    def __init__(self, url: str, prefetch: int = 64, queue_name: str = INGEST_QUEUE):
+        self.url = url
+        self.prefetch = prefetch
+        self.queue_name = queue_name
+        self._connection = None
+        self._channel = None
+        self._queue = None
+        self._deliveries: asyncio.Queue = asyncio.Queue()
+
+    async def connect(self) -> None:
+        import aio_pika
+
+        self._connection = await aio_pika.connect_robust(self.url)
+        self._channel = await self._connection.channel()
+        await self._channel.set_qos(prefetch_count=self.prefetch)
+        self._queue = await self._channel.declare_queue(self.queue_name, durable=True)
+        await self._queue.consume(self._on_message)
+        logger.info(f"Ingest consumer connected to '{self.queue_name}' (prefetch={self.prefetch})")
+
+    async def _on_message(self, message) -> None:
+        published_at = message.timestamp.timestamp() if message.timestamp else None
+        await self._deliveries.put(_AioPikaMessage(message, published_at))
+
+    async def get(self, timeout: float) -> Optional[IngestMessage]:
+        try:
+            return await asyncio.wait_for(self._deliveries.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def queue_depth(self) -> Optional[int]:
+        """Ready messages in RabbitMQ (not counting the ones prefetched by us)."""
+        if self._channel is None:
+            return None
+        try:
+            declared = await self._channel.declare_queue(self.queue_name, passive=True)
+            return declared.declaration_result.message_count
+        except Exception as e:
+            logger.warning(f"Failed to read ingest queue depth: {e}")
+            return None
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+
+
+class _AioPikaMessage(IngestMessage):
+    def __init__(self, message, published_at: Optional[float]):
+        super().__init__(message.body, published_at)
+        self._message = message
+
+    async def ack(self) -> None:
+        await self._message.ack()
+
+    async def nack(self, requeue: bool = True) -> None:
+        await self._message.nack(requeue=requeue)
+
+
+class InMemoryIngestBroker:
+    """
+    Local stand-in for the RabbitMQ queue (tests, single-process dev runs).
+    Mirrors the semantics the consumer relies on: at most `prefetch` unacked
+    deliveries, nack(requeue=True) puts the message back at the head, and
+    nack(requeue=False) moves it to `dead_letters`.
+    """
+
+    def __init__(self, prefetch: int = 64):
+        self.prefetch = prefetch
+        self._ready: deque = deque()
+        self._unacked = 0
+        self._changed = asyncio.Condition()
+        self.acked: list[bytes] = []
+        self.dead_letters: list[bytes] = []
+
+    async def publish(self, body: bytes, published_at: Optional[float] = None) -> None:
+        async with self._changed:
+            self._ready.append((body, published_at if published_at is not None else time.time()))
+            self._changed.notify_all()
+
+    async def get(self, timeout: float) -> Optional[IngestMessage]:
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._ready and self._unacked < self.prefetch),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                return None
+            body, published_at = self._ready.popleft()
+            self._unacked += 1
+            return _InMemoryMessage(self, body, published_at)
+
+    async def _settle(self, message: "_InMemoryMessage", ack: bool, requeue: bool) -> None:
+        async with self._changed:
+            self._unacked -= 1
+            if ack:
+                self.acked.append(message.body)
+            elif requeue:
+                self._ready.appendleft((message.body, message.published_at))
+            else:
+                self.dead_letters.append(message.body)
+            self._changed.notify_all()
+
+    @property
+    def unacked(self) -> int:
+        return self._unacked
+
+    async def queue_depth(self) -> Optional[int]:
+        return len(self._ready)
+
+    async def close(self) -> None:
+        pass
+
+
+class _InMemoryMessage(IngestMessage):
+    def __init__(self, broker: InMemoryIngestBroker, body: bytes, published_at: Optional[float]):
+        super().__init__(body, published_at)
+        self._broker = broker
+        self._settled = False
+
+    async def _settle(self, ack: bool, requeue: bool) -> None:
+        if self._settled:
+            raise RuntimeError("Message already acked/nacked")
+        self._settled = True
+        await self._broker._settle(self, ack, requeue)
+
+    async def ack(self) -> None:
+        await self._settle(ack=True, requeue=False)
+
+    async def nack(self, requeue: bool = True) -> None:
+        await self._settle(ack=False, requeue=requeue)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from typing import Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+SIMHASH_BITS = 64
+# The 64-bit signature is split into 4 bands of 16 bits: by pigeonhole, two titles
+# within MAX_HAMMING_DISTANCE bits of each other share at least one band exactly.
+LSH_BANDS = 4
+MAX_HAMMING_DISTANCE = 3
+# Log-scale price bands, ~25% wide; neighbouring bands are also checked on lookup
+PRICE_BAND_RATIO = 1.25
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+(?:[-.][0-9a-zа-я]+)*")
+# Words that differ between merchants' copies of the same item without changing the item
+_STOPWORDS = {
+    "и", "в", "на", "с", "для", "из", "по", "от", "к", "а", "the", "for", "and", "with",
+    "подарок", "подарочный", "новинка", "new", "шт", "pcs",
+}
+
+
+def normalize_title(title: str) -> list[str]:
+    """Lowercased word tokens of a title without punctuation and filler words (order is kept)."""
+    text = (title or "").lower().replace("ё", "е")
+    return [t for t in _TOKEN_RE.findall(text) if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def _token_hash(token: str) -> int:
+    # Stable across processes (unlike the salted builtin hash)
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def title_simhash(title: str) -> Optional[int]:
+    """
+    64-bit SimHash of the title's token set. Word order and duplicated words don't
+    matter, one extra/missing word moves only a few bits. Returned as a signed
+    int64 so it fits a BIGINT column; None for titles without usable tokens.
+    """
+    tokens = set(normalize_title(title))
+    if not tokens:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for token in tokens:
+        h = _token_hash(token)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    mask = (1 << SIMHASH_BITS) - 1
+    return bin((a ^ b) & mask).count("1")
+
+
+def price_band(price) -> Optional[int]:
+    if price is None:
+        return None
+    price = float(price)
+    if price <= 0:
+        return 0
+    return int(math.floor(math.log(price, PRICE_BAND_RATIO)))
+
+
+def lsh_buckets(simhash: int, band: Optional[int], neighbours: bool = False) -> list[str]:
+    """
+    Bucket keys of a signature: one per simhash band, scoped by price band.
+    With `neighbours=True` the keys of the adjacent price bands are included too
+    (used for lookups, so prices near a band edge still meet).
+    """
+    unsigned = simhash & ((1 << SIMHASH_BITS) - 1)
+    width = SIMHASH_BITS // LSH_BANDS
+    if band is None:
+        price_keys = ["na"]
+    elif neighbours:
+        price_keys = [str(band - 1), str(band), str(band + 1)]
+    else:
+        price_keys = [str(band)]
+    keys = []
+    for i in range(LSH_BANDS):
+        bits = unsigned >> (i * width) & ((1 << width) - 1)
+        keys.extend(f"{i}:{bits:04x}:{p}" for p in price_keys)
+    return keys
+
+
+def is_near_duplicate(simhash_a: int, band_a: Optional[int], simhash_b: int, band_b: Optional[int]) -> bool:
+    if (band_a is None) != (band_b is None):
+        return False
+    if band_a is not None and abs(band_a - band_b) > 1:
+        return False
+    return hamming_distance(simhash_a, simhash_b) <= MAX_HAMMING_DISTANCE
+
+
+def cluster_key(product) -> str:
+    return getattr(product, "duplicate_cluster_id", None) or product.gift_id
+
+
+def collapse_duplicates(products: Iterable[T]) -> list[T]:
+    """Keeps the first (best ranked) product of every near-duplicate cluster, order preserved."""
+    seen: set[str] = set()
+    result = []
+    for product in products:
+        key = cluster_key(product)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(product)
+    return result
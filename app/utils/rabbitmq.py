@@ -1,29 +1,277 @@
-import pika
+import asyncio
 import json
 import logging
+from collections import defaultdict, deque
+from typing import Iterable, Optional
+
+from prometheus_client import Counter, Gauge
+from yarl import URL
+
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
-def publish_parsing_task(task_data: dict):
-    settings = get_settings()
-    try:
-        params = pika.URLParameters(settings.rabbitmq_url)
-        connection = pika.BlockingConnection(params)
-        channel = connection.channel()
-
-        channel.queue_declare(queue='parsing_tasks', durable=True)
-        
-        channel.basic_publish(
-            exchange='',
-            routing_key='parsing_tasks',
-            body=json.dumps(task_data),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # make message persistent
-            ))
-        connection.close()
-        logger.info(f"Published parsing task: {task_data}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to publish parsing task: {e}")
-        return False
+# Durable queue the scraper workers consume (services/run_worker.py)
+PARSING_TASKS_QUEUE = "parsing_tasks"
+
+PUBLISHED_MESSAGES = Counter(
+    "rabbitmq_published_messages_total",
+    "Messages handed to the RabbitMQ publisher by outcome",
+    ["queue", "status"],  # confirmed, buffered, dropped
+)
+PUBLISH_BUFFER_SIZE = Gauge(
+    "rabbitmq_publish_buffer_size",
+    "Messages buffered locally while the broker is unavailable",
+)
+
+
+class AioPikaBroker:
+    """
+    RabbitMQ side of the publisher: one robust connection and one channel with
+    publisher confirms, opened once and reused for every publish.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._connection = None
+        self._channel = None
+        self._declared: set[str] = set()
+
+    async def connect(self) -> None:
+        import aio_pika
+
+        # A robust connection restores itself (and the channel) after a broker restart;
+        # only the first connect, or one that was closed for good, needs a new one
+        if self._connection is not None and not self._connection.is_closed:
+            return
+        connection = aio_pika.RobustConnection(URL(self.url))
+        try:
+            await connection.connect()
+        except Exception:
+            # Otherwise the half-made robust connection keeps reconnecting on its own
+            await connection.close()
+            raise
+        self._connection = connection
+        self._channel = await self._connection.channel(publisher_confirms=True)
+        self._declared.clear()
+        logger.info("RabbitMQ publisher connected")
+
+    async def send(self, routing_key: str, bodies: list[bytes]) -> None:
+        """Publishes the batch and waits for all broker confirms; raises if any is missing."""
+        import aio_pika
+
+        if self._channel is None:
+            raise ConnectionError("RabbitMQ publisher is not connected")
+        if routing_key not in self._declared:
+            await self._channel.declare_queue(routing_key, durable=True)
+            self._declared.add(routing_key)
+        exchange = self._channel.default_exchange
+        # Confirms are awaited together, so a batch costs one round trip, not one per message
+        await asyncio.gather(*(
+            exchange.publish(
+                aio_pika.Message(
+                    body,
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=routing_key,
+            )
+            for body in bodies
+        ))
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+            self._channel = None
+
+
+class InMemoryBroker:
+    """
+    Local stand-in for RabbitMQ (tests, single-process dev runs).
+    `available = False` simulates an outage: connect and send raise ConnectionError.
+    """
+
+    def __init__(self):
+        self.available = True
+        self.queues: dict[str, list[bytes]] = defaultdict(list)
+        self.connects = 0
+
+    async def connect(self) -> None:
+        if not self.available:
+            raise ConnectionError("broker unavailable")
+        self.connects += 1
+
+    async def send(self, routing_key: str, bodies: list[bytes]) -> None:
+        if not self.available:
+            raise ConnectionError("broker unavailable")
+        self.queues[routing_key].extend(bodies)
+
+    def messages(self, routing_key: str) -> list[dict]:
+        return [json.loads(body) for body in self.queues[routing_key]]
+
+    async def close(self) -> None:
+        pass
+
+
+class RabbitPublisher:
+    """
+    Async publisher over one long-lived broker connection.
+    `publish_many` sends a batch with publisher confirms. While the broker is down,
+    messages go to a local buffer of `buffer_size` messages (oldest first), a background
+    task reconnects with exponential backoff and flushes the buffer in order; what does
+    not fit is dropped and not counted as accepted. Delivery is at-least-once: a batch
+    that failed half-way is re-sent whole.
+    """
+
+    def __init__(
+        self,
+        broker,
+        buffer_size: int = 1000,
+        reconnect_delay_s: float = 1.0,
+        max_reconnect_delay_s: float = 30.0,
+    ):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.reconnect_delay_s = reconnect_delay_s
+        self.max_reconnect_delay_s = max_reconnect_delay_s
+        self.connected = False
+        self._buffer: deque[tuple[str, bytes]] = deque()
+        self._lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    async def start(self) -> None:
+        """Connects now if the broker is up, otherwise keeps trying in the background."""
+        try:
+            await self.broker.connect()
+            self.connected = True
+        except Exception as e:
+            logger.warning(f"RabbitMQ unavailable at startup, will retry: {e}")
+            self._schedule_reconnect()
+
+    async def publish(self, routing_key: str, payload: dict) -> bool:
+        return await self.publish_many(routing_key, [payload]) == 1
+
+    async def publish_many(self, routing_key: str, payloads: Iterable[dict]) -> int:
+        """
+        Returns how many of `payloads` were accepted (confirmed by the broker or buffered).
+        Accepted messages are always a prefix of `payloads`.
+        """
+        bodies = [json.dumps(p, default=str).encode() for p in payloads]
+        if not bodies:
+            return 0
+        async with self._lock:
+            if not self.connected and self._reconnect_task is None:
+                # No background reconnect yet (publisher never started): connect on demand
+                await self.start()
+            if self.connected and self._buffer:
+                await self._flush()
+            if self.connected and not self._buffer:
+                try:
+                    await self.broker.send(routing_key, bodies)
+                    PUBLISHED_MESSAGES.labels(queue=routing_key, status="confirmed").inc(len(bodies))
+                    return len(bodies)
+                except Exception as e:
+                    self._on_failure(e)
+            return self._buffer_bodies(routing_key, bodies)
+
+    def _buffer_bodies(self, routing_key: str, bodies: list[bytes]) -> int:
+        accepted = bodies[: max(0, self.buffer_size - len(self._buffer))]
+        self._buffer.extend((routing_key, body) for body in accepted)
+        PUBLISH_BUFFER_SIZE.set(len(self._buffer))
+        if accepted:
+            PUBLISHED_MESSAGES.labels(queue=routing_key, status="buffered").inc(len(accepted))
+        if len(accepted) < len(bodies):
+            PUBLISHED_MESSAGES.labels(queue=routing_key, status="dropped").inc(len(bodies) - len(accepted))
+            logger.error(f"RabbitMQ publish buffer full, dropped {len(bodies) - len(accepted)} messages to {routing_key}")
+        return len(accepted)
+
+    async def _flush(self) -> None:
+        """Sends the buffer in order, one batch per run of the same queue. Caller holds the lock."""
+        flushed = 0
+        while self._buffer:
+            routing_key = self._buffer[0][0]
+            batch = []
+            for key, body in self._buffer:
+                if key != routing_key or len(batch) >= 500:
+                    break
+                batch.append(body)
+            try:
+                await self.broker.send(routing_key, batch)
+            except Exception as e:
+                self._on_failure(e)
+                return
+            for _ in batch:
+                self._buffer.popleft()
+            PUBLISHED_MESSAGES.labels(queue=routing_key, status="confirmed").inc(len(batch))
+            PUBLISH_BUFFER_SIZE.set(len(self._buffer))
+            flushed += len(batch)
+        if flushed:
+            logger.info(f"RabbitMQ publish buffer flushed ({flushed} messages)")
+
+    def _on_failure(self, error: Exception) -> None:
+        if self.connected:
+            logger.warning(f"RabbitMQ publish failed, buffering until the broker is back: {error}")
+        self.connected = False
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        delay = self.reconnect_delay_s
+        while True:
+            await asyncio.sleep(delay)
+            async with self._lock:
+                try:
+                    await self.broker.connect()
+                    self.connected = True
+                except Exception as e:
+                    logger.warning(f"RabbitMQ reconnect failed, next try in {delay:g}s: {e}")
+                if self.connected:
+                    await self._flush()
+                    if self.connected:
+                        self._reconnect_task = None
+                        return
+            delay = min(delay * 2, self.max_reconnect_delay_s)
+
+    async def close(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._buffer:
+            logger.warning(f"Closing RabbitMQ publisher with {len(self._buffer)} unsent messages")
+        await self.broker.close()
+        self.connected = False
+
+
+_publisher: Optional[RabbitPublisher] = None
+
+
+async def init_publisher(broker=None) -> RabbitPublisher:
+    """Opens the process-wide publisher (app startup, scheduler start)."""
+    global _publisher
+    if _publisher is None:
+        _publisher = RabbitPublisher(broker or AioPikaBroker(get_settings().rabbitmq_connection_url))
+        await _publisher.start()
+    return _publisher
+
+
+def get_task_publisher() -> RabbitPublisher:
+    """The process-wide publisher; FastAPI dependency. Connects on first publish if not started."""
+    global _publisher
+    if _publisher is None:
+        _publisher = RabbitPublisher(AioPikaBroker(get_settings().rabbitmq_connection_url))
+    return _publisher
+
+
+async def close_publisher() -> None:
+    global _publisher
+    if _publisher is not None:
+        await _publisher.close()
+        _publisher = None
@@ -1,8 +1,9 @@
 ﻿"""Takprodam integration package."""
 
 from .client import TakprodamClient
+from .local_index import TakprodamLocalIndex
 from .models import GiftCandidate
 from .normalizer import normalize_product
 from .search import search_gift_candidates
 
-__all__ = ["TakprodamClient", "GiftCandidate", "normalize_product", "search_gift_candidates"]
+__all__ = ["TakprodamClient", "TakprodamLocalIndex", "GiftCandidate", "normalize_product", "search_gift_candidates"]
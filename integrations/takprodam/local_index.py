@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Columns copied from the snapshot `products` table into the index.
+# They mirror the fields of a Takprodam `product/` API item, so rows can be
+# passed to `normalize_product` unchanged.
+SNAPSHOT_COLUMNS = (
+    "id",
+    "product_id",
+    "product_sku",
+    "title",
+    "image_url",
+    "price",
+    "commission",
+    "product_category",
+    "marketplace_title",
+    "store_title",
+    "external_link",
+    "tracking_link",
+    "payment_type",
+    "legal_text",
+    "updated_at",
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+DEFAULT_MAX_AGE_S = 24 * 3600
+
+
+class TakprodamLocalIndex:
+    """
+    Local full-text search over a Takprodam SQLite snapshot.
+
+    The snapshot (e.g. `gifty_takprodam.sqlite`) is never modified: products are
+    copied into a separate index file with an FTS5 table on top. The index is
+    rebuilt automatically when the snapshot file changes (newer sync).
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        index_path: Optional[str] = None,
+        max_age_s: Optional[int] = None,
+    ) -> None:
+        self.snapshot_path = (snapshot_path or os.getenv("TAKPRODAM_SNAPSHOT_PATH") or "").strip()
+        default_index = f"{self.snapshot_path}.fts" if self.snapshot_path else ""
+        self.index_path = (index_path or os.getenv("TAKPRODAM_INDEX_PATH") or default_index).strip()
+        self.max_age_s = max_age_s if max_age_s is not None else self._parse_int(
+            os.getenv("TAKPRODAM_SNAPSHOT_MAX_AGE_S"), DEFAULT_MAX_AGE_S
+        )
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._fingerprint: Optional[str] = None
+        self._snapshot_updated_at: Optional[int] = None
+
+    @staticmethod
+    def _parse_int(value: Optional[str], default: int) -> int:
+        if value is None:
+            return default
+        value = value.strip()
+        return int(value) if value.isdigit() else default
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.snapshot_path) and os.path.exists(self.snapshot_path)
+
+    def _snapshot_fingerprint(self) -> str:
+        stat = os.stat(self.snapshot_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _read_meta(self, conn: sqlite3.Connection) -> dict[str, str]:
+        try:
+            rows = conn.execute("SELECT key, value FROM index_meta").fetchall()
+        except sqlite3.OperationalError:
+            return {}
+        return {row["key"]: row["value"] for row in rows}
+
+    def ensure_index(self) -> bool:
+        """Builds or refreshes the FTS index. Returns False when no snapshot is configured."""
+        if not self.enabled:
+            return False
+
+        fingerprint = self._snapshot_fingerprint()
+        if fingerprint == self._fingerprint:
+            return True
+
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return True
+            conn = self._connect()
+            meta = self._read_meta(conn)
+            if meta.get("fingerprint") != fingerprint:
+                self._build(conn, fingerprint)
+                meta = self._read_meta(conn)
+            self._snapshot_updated_at = int(meta.get("snapshot_updated_at") or 0) or None
+            self._fingerprint = fingerprint
+        return True
+
+    def _build(self, conn: sqlite3.Connection, fingerprint: str) -> None:
+        started = time.perf_counter()
+        columns = ", ".join(SNAPSHOT_COLUMNS)
+
+        conn.executescript(
+            """
+            DROP TABLE IF EXISTS products_fts;
+            DROP TABLE IF EXISTS products;
+            DROP TABLE IF EXISTS index_meta;
+            """
+        )
+        conn.execute(
+            f"CREATE TABLE products (rowid INTEGER PRIMARY KEY, {', '.join(SNAPSHOT_COLUMNS)})"
+        )
+        conn.execute(
+            "CREATE VIRTUAL TABLE products_fts USING fts5("
+            "title, product_category, store_title, marketplace_title, "
+            "content='products', content_rowid='rowid', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        conn.execute("CREATE TABLE index_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        conn.execute("ATTACH DATABASE ? AS snapshot", (self.snapshot_path,))
+        try:
+            conn.execute(f"INSERT INTO products ({columns}) SELECT {columns} FROM snapshot.products")
+            snapshot_updated_at = conn.execute("SELECT MAX(updated_at) FROM snapshot.products").fetchone()[0]
+        finally:
+            conn.commit()
+            conn.execute("DETACH DATABASE snapshot")
+
+        conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        conn.executemany(
+            "INSERT INTO index_meta (key, value) VALUES (?, ?)",
+            [
+                ("fingerprint", fingerprint),
+                ("snapshot_updated_at", str(snapshot_updated_at or 0)),
+                ("built_at", str(int(time.time()))),
+            ],
+        )
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        logger.info(
+            "Takprodam local index built: %s products in %.1f ms (%s)",
+            count,
+            (time.perf_counter() - started) * 1000,
+            self.index_path,
+        )
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        """
+        A snapshot is stale when its newest product is older than `max_age_s`.
+        `max_age_s=0` disables the check (offline benchmarks on a frozen snapshot).
+        """
+        if not self.ensure_index():
+            return True
+        if not self._snapshot_updated_at:
+            return True
+        if self.max_age_s <= 0:
+            return False
+        now = now if now is not None else time.time()
+        return now - self._snapshot_updated_at > self.max_age_s
+
+    @staticmethod
+    def _build_match(query: str) -> Optional[str]:
+        tokens = _TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def search_products(self, query: str, limit: int = 50, offset: int = 0) -> list[dict[str, Any]]:
+        """Same contract as `TakprodamClient.search_products`, answered from the snapshot."""
+        if not self.ensure_index():
+            return []
+        match = self._build_match(query)
+        if match is None:
+            return []
+
+        columns = ", ".join(f"p.{name}" for name in SNAPSHOT_COLUMNS)
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT {columns} FROM products_fts "
+            "JOIN products p ON p.rowid = products_fts.rowid "
+            "WHERE products_fts MATCH ? "
+            "ORDER BY bm25(products_fts, 10.0, 2.0, 1.0, 1.0) "
+            "LIMIT ? OFFSET ?",
+            (match, limit, offset),
+        ).fetchall()
+        return [{key: row[key] for key in row.keys() if row[key] is not None} for row in rows]
+
+
+_default_index: Optional[TakprodamLocalIndex] = None
+
+
+def get_local_index() -> Optional[TakprodamLocalIndex]:
+    """Returns the process-wide local index, or None if no snapshot is configured."""
+    global _default_index
+    if _default_index is None:
+        _default_index = TakprodamLocalIndex()
+    return _default_index if _default_index.enabled else None
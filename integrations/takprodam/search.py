@@ -1,11 +1,26 @@
 ﻿from __future__ import annotations
 
-from typing import Optional
+import logging
+from typing import Any, Optional
 
 from .client import TakprodamClient
+from .local_index import get_local_index
 from .models import GiftCandidate
 from .normalizer import normalize_product
 
+logger = logging.getLogger(__name__)
+
+
+def _search_local(query: str, limit: int) -> list[dict[str, Any]]:
+    index = get_local_index()
+    if index is None or index.is_stale():
+        return []
+    try:
+        return index.search_products(query=query, limit=limit)
+    except Exception as exc:
+        logger.warning("Takprodam local search failed, falling back to API: %s", exc)
+        return []
+
 
 def search_gift_candidates(
     query: str,
@@ -13,7 +28,12 @@ def search_gift_candidates(
     source_id: Optional[int] = None,
 ) -> list[GiftCandidate]:
     client = TakprodamClient()
-    products = client.search_products(query=query, limit=limit, source_id=source_id)
+    # The snapshot is synced for the configured source only.
+    products: list[dict[str, Any]] = []
+    if source_id is None or source_id == client.source_id:
+        products = _search_local(query, limit)
+    if not products:
+        products = client.search_products(query=query, limit=limit, source_id=source_id)
 
     candidates: list[GiftCandidate] = []
     for product in products:
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
 from collections.abc import Generator
 from typing import Any
 
+import httpx
+
 from integrations.takprodam.client import TakprodamClient
 
 logger = logging.getLogger(__name__)
@@ -28,7 +32,10 @@ class TakprodamSyncClient(TakprodamClient):
         # Client._request prepends base url.
         # Ensure 'product/' is correct path. Existing client uses 'product/'
         data = self._request("product/", params=params)
-        
+        return self._extract_items(data)
+
+    @staticmethod
+    def _extract_items(data: Any) -> list[dict[str, Any]]:
         if not data:
             return []
 
@@ -42,6 +49,57 @@ class TakprodamSyncClient(TakprodamClient):
         
         return [item for item in items if isinstance(item, dict)]
 
+    async def aget_products_page(
+        self,
+        http: httpx.AsyncClient,
+        page: int = 1,
+        limit: int = 1000,
+        source_id: int | None = None,
+        backoff_s: float = 0.5,
+    ) -> list[dict[str, Any]]:
+        """
+        Async variant of `get_products_page` for the overlapped sync pipeline.
+        Retries transport errors, 429 and 5xx with exponential backoff + jitter.
+        Unlike the sync client, a page that still fails raises instead of
+        looking like the end of the catalog (which would trigger a soft-delete).
+        """
+        if not self.api_base or not self.api_token:
+            raise RuntimeError("Takprodam config missing: base or token is empty")
+
+        url = f"{self.api_base.rstrip('/')}/product/"
+        params = {
+            "page": page,
+            "limit": limit,
+            "source_id": source_id or self.source_id,
+        }
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = await http.get(url, headers=self._headers(), params=params)
+            except httpx.RequestError as exc:
+                error: str = str(exc)
+            else:
+                if response.status_code == 404:
+                    # Past the last page
+                    return []
+                if response.status_code < 400:
+                    return self._extract_items(response.json())
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                error = f"HTTP {response.status_code}"
+
+            if attempt >= self.max_retries:
+                raise RuntimeError(f"Takprodam page {page} failed after {attempt} attempts: {error}")
+            delay = backoff_s * (2 ** (attempt - 1))
+            delay += random.uniform(0, delay)
+            logger.warning(
+                "Takprodam page %s failed (attempt %s/%s): %s. Retrying in %.1fs",
+                page, attempt, self.max_retries, error, delay,
+            )
+            await asyncio.sleep(delay)
+
+        return []
+
     def iter_all_products(
         self,
         batch_size: int = 1000,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Body, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 from typing import List, Optional
@@ -57,6 +57,7 @@ async def submit_scoring_results(
 
 from app.schemas.parsing import IngestBatchRequest, ParsingSourceSchema, ParsingSourceCreate
 from app.services.ingestion import IngestionService
+from app.services.ingestion_stream import UnsupportedEncodingError, ingest_ndjson_stream
 
 @router.get("/monitoring", summary="Агрегированный мониторинг по сайтам")
 async def get_sites_monitoring(
@@ -103,33 +104,65 @@ async def ingest_batch(
     _ = Depends(verify_internal_token)
 ):
     service = IngestionService(db, redis=redis)
-    
-    p_count = 0
-    if request.items:
-        p_count = await service.ingest_products(request.items, request.source_id)
-    
-    c_count = 0
-    if request.categories:
-        c_count = await service.ingest_categories(request.categories)
-        
-    # If it was a discovery task with NO products, we still need to record that it finished
-    if not request.items and request.source_id:
-        repo = ParsingRepository(db)
-        await repo.update_source_stats(request.source_id, {"status": "discovery_completed", "categories_found": c_count})
-        await repo.log_parsing_run(
-            source_id=request.source_id,
-            status="completed",
-            items_scraped=0,
-            items_new=0
-        )
-        await db.commit()
+    # One transaction per batch; source stats are buffered until the crawl reports its end
+    products, discovery = await service.ingest_batch(
+        request.items, request.categories, request.source_id, run_id=request.run_id
+    )
 
     return {
         "status": "ok", 
-        "items_ingested": p_count, 
-        "categories_ingested": c_count
+        "items_ingested": products["ingested"],
+        "items_new": products["new"],
+        "categories_ingested": discovery["inserted"],
+        "categories_skipped": discovery["skipped"],
+        "categories_backlogged": discovery["backlogged"],
     }
 
+@router.post("/ingest-stream", summary="Потоковый прием товаров (NDJSON, gzip/zstd)")
+async def ingest_stream(
+    request: Request,
+    source_id: int = Query(..., description="Идентификатор источника задачи"),
+    run_id: Optional[str] = Query(None, description="Идентификатор запуска краулинга"),
+    chunk_size: int = Query(500, ge=1, le=5000, description="Сколько строк валидировать и сохранять за раз"),
+    content_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+    _ = Depends(verify_internal_token)
+):
+    """
+    Body: one ScrapedProduct / ScrapedCategory JSON object per line, optionally
+    compressed (Content-Encoding: gzip | zstd). Lines are parsed and upserted
+    chunk by chunk while the body is still being received; invalid lines are
+    listed in `errors` and skipped.
+    """
+    service = IngestionService(db, redis=redis)
+    try:
+        result = await ingest_ndjson_stream(
+            service,
+            request.stream(),
+            source_id,
+            content_encoding=content_encoding,
+            chunk_size=chunk_size,
+            run_id=run_id,
+        )
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    return result.as_dict()
+
+@router.get("/sources/{source_id}/known-products", summary="Bloom-фильтр известных товаров источника")
+async def get_known_products_filter(
+    source_id: int,
+    fp_rate: float = Query(0.01, gt=0, lt=0.5, description="Допустимая доля ложноположительных ответов"),
+    db: AsyncSession = Depends(get_db),
+    _ = Depends(verify_internal_token)
+):
+    """Used by incremental crawls to skip products already stored at the same price."""
+    service = IngestionService(db)
+    result = await service.known_products_filter(source_id, fp_rate=fp_rate)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return result
+
 @router.get("/workers", summary="Получить список активных воркеров")
 async def get_active_workers(
     db: AsyncSession = Depends(get_db),
@@ -141,18 +174,23 @@ async def get_active_workers(
 
 from app.schemas.parsing import ParsingErrorReport
 from app.services.notifications import get_notification_service
+from app.utils.rabbitmq import PARSING_TASKS_QUEUE, RabbitPublisher, get_task_publisher
 
 @router.post("/sources/{source_id}/report-error", summary="Сообщить об ошибке парсера")
 async def report_parsing_error(
     source_id: int,
     report: ParsingErrorReport,
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     _ = Depends(verify_internal_token)
 ):
     repo = ParsingRepository(db)
     source = await repo.report_source_error(source_id, report.error, report.is_broken)
     if not source:
         raise HTTPException(status_code=404, detail="Source not found")
+    await IngestionService(db, redis=redis).finish_crawl(
+        source_id, status="error", error_message=report.error, run_id=report.run_id
+    )
     
     # Send notification via RabbitMQ
     notifier = get_notification_service()
@@ -176,6 +214,7 @@ async def force_run_parser(
     source_id: int,
     strategy: Optional[str] = None, # Allow override strategy (discovery vs deep)
     db: AsyncSession = Depends(get_db),
+    publisher: RabbitPublisher = Depends(get_task_publisher),
     _ = Depends(verify_internal_token)
 ):
     repo = ParsingRepository(db)
@@ -184,7 +223,6 @@ async def force_run_parser(
         raise HTTPException(status_code=404, detail="Source not found")
         
     # Queue the task manually
-    from app.utils.rabbitmq import publish_parsing_task
     from datetime import datetime, timedelta
     
     task = {
@@ -196,7 +234,7 @@ async def force_run_parser(
         "config": source.config
     }
     
-    success = publish_parsing_task(task)
+    success = await publisher.publish(PARSING_TASKS_QUEUE, task)
     if success:
         source.status = "running"
         source.next_sync_at = datetime.now() + timedelta(minutes=30)
@@ -238,11 +276,17 @@ async def toggle_parser(
 async def report_parsing_status(
     source_id: int,
     status: str = Body(..., embed=True),
+    run_id: Optional[str] = Body(None, embed=True),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     _ = Depends(verify_internal_token)
 ):
-    repo = ParsingRepository(db)
-    await repo.set_source_status(source_id, status)
+    if status == "waiting":
+        # Worker finished the crawl: flush buffered ingest stats (also sets status/next_sync_at)
+        await IngestionService(db, redis=redis).finish_crawl(source_id, run_id=run_id)
+    else:
+        repo = ParsingRepository(db)
+        await repo.set_source_status(source_id, status)
     return {"status": "ok"}
 
 @router.post("/sources/{source_id}/report-logs", summary="Обновить логи источника")
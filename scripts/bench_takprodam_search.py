@@ -0,0 +1,47 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add project root to python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from integrations.takprodam.local_index import TakprodamLocalIndex
+
+DEFAULT_QUERIES = ["плед", "кружка", "наушники", "кофе", "серебряные подвески", "лего", "книга"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the local Takprodam search index")
+    parser.add_argument("--snapshot", default=str(project_root / "gifty_takprodam.sqlite"))
+    parser.add_argument("--index", default=None, help="Index file path (default: <snapshot>.fts)")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("queries", nargs="*")
+    args = parser.parse_args()
+
+    index = TakprodamLocalIndex(snapshot_path=args.snapshot, index_path=args.index, max_age_s=0)
+
+    started = time.perf_counter()
+    index.ensure_index()
+    print(f"Index ready in {(time.perf_counter() - started) * 1000:.1f} ms ({index.index_path})")
+
+    queries = args.queries or DEFAULT_QUERIES
+    for query in queries:
+        timings = []
+        results = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            results = index.search_products(query, limit=args.limit)
+            timings.append((time.perf_counter() - t0) * 1000)
+        top = results[0]["title"] if results else "-"
+        print(
+            f"{query!r}: {len(results)} hits, "
+            f"p50={statistics.median(timings):.2f} ms, max={max(timings):.2f} ms, top={top!r}"
+        )
+
+
+if __name__ == "__main__":
+    main()
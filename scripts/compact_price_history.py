@@ -0,0 +1,28 @@
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add project root to pythonpath
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from app.jobs.price_history import DOWNSAMPLE_AFTER_DAYS, RETENTION_DAYS, compact_price_history
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsample and prune product_price_history")
+    parser.add_argument("--downsample-after-days", type=int, default=DOWNSAMPLE_AFTER_DAYS,
+                        help="Points older than this keep one per product and day")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    counts = asyncio.run(compact_price_history(args.downsample_after_days, args.retention_days))
+    print(f"Downsampled {counts['downsampled']} points, pruned {counts['pruned']}.")
+
+
+if __name__ == "__main__":
+    main()
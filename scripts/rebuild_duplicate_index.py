@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add project root to pythonpath
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from app.jobs.near_duplicates import rebuild_duplicate_index
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill near-duplicate clusters (products.duplicate_cluster_id)")
+    parser.add_argument("--all", action="store_true", help="Re-cluster every active product, not only unindexed ones")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    total = asyncio.run(rebuild_duplicate_index(batch_size=args.batch_size, only_missing=not args.all))
+    print(f"Processed {total} products.")
+
+
+if __name__ == "__main__":
+    main()
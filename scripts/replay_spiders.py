@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Offline parse benchmarks for the spiders in services/gifty_scraper/spiders.
+
+Record a crawl once (goes to the network, pipelines off):
+
+    python scripts/replay_spiders.py record vseigrushki https://vseigrushki.com/konstruktory/ --pages 20
+
+Replay the recorded pages through the spider callbacks (no network) and report
+items/sec, CPU time per page and peak allocation per page; the output is checked
+against the golden file of each spider:
+
+    python scripts/replay_spiders.py bench                      # every recorded spider
+    python scripts/replay_spiders.py bench vseigrushki --repeat 20
+    python scripts/replay_spiders.py bench vseigrushki --update-golden
+
+Exits with 1 when a replayed output differs from its golden file.
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Scrapy project lives in services/ (see scrapy.cfg)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "gifty_scraper.settings")
+
+from scrapy.crawler import Crawler, CrawlerProcess
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.project import get_project_settings
+
+from gifty_scraper.replay import ReplayStore, diff_golden, replay_spider
+
+DEFAULT_STORE = os.path.join("services", "replay_fixtures")
+
+
+def offline_settings():
+    settings = get_project_settings()
+    # Replay must not talk to the Core API, Redis or the ingestion queue
+    settings.set("ITEM_PIPELINES", {})
+    settings.set("CONDITIONAL_CACHE_ENABLED", False)
+    settings.set("LOG_LEVEL", "WARNING")
+    return settings
+
+
+def record(args):
+    settings = offline_settings()
+    settings.set("LOG_LEVEL", "INFO")
+    settings.set("REPLAY_RECORD_DIR", args.store)
+    middlewares = dict(settings.getdict("DOWNLOADER_MIDDLEWARES"))
+    middlewares["gifty_scraper.replay.ResponseRecorderMiddleware"] = 580
+    settings.set("DOWNLOADER_MIDDLEWARES", middlewares)
+    if args.pages:
+        settings.set("CLOSESPIDER_PAGECOUNT", args.pages)
+
+    process = CrawlerProcess(settings)
+    process.crawl(args.spider, url=args.url, strategy=args.strategy)
+    process.start()
+    print(f"\n--- Recorded into {os.path.join(args.store, args.spider)} ---")
+
+
+def build_spider(name: str, store: ReplayStore, settings):
+    spidercls = SpiderLoader.from_settings(settings).load(name)
+    crawler = Crawler(spidercls, settings)
+    spider_args = store.spider_args(name)
+    start_urls = spider_args.pop("start_urls", [])
+    spider = spidercls.from_crawler(crawler, url=start_urls[0] if start_urls else None, **spider_args)
+    spider.logger.logger.setLevel(logging.WARNING)
+    return spider
+
+
+def bench(args) -> int:
+    store = ReplayStore(args.store)
+    names = args.spiders or store.spiders()
+    if not names:
+        print(f"No recordings in {args.store}, record a crawl first (see --help)")
+        return 1
+    settings = offline_settings()
+
+    print(f"{'spider':>14} {'pages':>6} {'items':>7} {'items/s':>9} {'cpu ms/page':>12} {'alloc KB/page':>14}  golden")
+    failed = False
+    for name in names:
+        result = replay_spider(build_spider(name, store, settings), store, repeat=args.repeat,
+                               measure_alloc=not args.no_alloc)
+        golden = store.golden(name)
+        if args.update_golden:
+            store.save_golden(name, result.output)
+            status, problems = "updated", []
+        elif golden is None:
+            status, problems = "missing (run with --update-golden)", []
+        else:
+            problems = diff_golden(golden, result.output)
+            status = "ok" if not problems else f"{len(problems)} differences"
+        failed = failed or bool(problems) or bool(result.errors)
+        print(
+            f"{name:>14} {result.pages:>6} {result.items:>7} {result.items_per_s:>9.0f} "
+            f"{result.cpu_ms_per_page:>12.2f} {result.alloc_kb_per_page:>14.0f}  {status}"
+        )
+        for problem in problems[:args.max_diffs]:
+            print(f"    {problem}")
+        for url, error in result.errors.items():
+            print(f"    {url}: {error}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record spider responses and benchmark parsing offline")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Fixture store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="Crawl a site and save its responses")
+    rec.add_argument("spider")
+    rec.add_argument("url")
+    rec.add_argument("--strategy", default="deep", choices=["deep", "discovery"])
+    rec.add_argument("--pages", type=int, default=10, help="Stop after this many responses (0: no limit)")
+
+    run = commands.add_parser("bench", help="Replay recorded responses through the spider callbacks")
+    run.add_argument("spiders", nargs="*", help="Spider names (default: every recorded spider)")
+    run.add_argument("--repeat", type=int, default=5, help="Timed passes over the recorded pages")
+    run.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc pass")
+    run.add_argument("--update-golden", action="store_true", help="Accept the current output as golden")
+    run.add_argument("--max-diffs", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args)
+        return 0
+    return bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 import sys
@@ -7,7 +8,8 @@ from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 
-from app.jobs.embeddings import process_embeddings_job
+from app.jobs.embeddings import process_embedding_queue, process_embeddings_job
+from app.redis_client import init_redis
 from app.config import get_settings
 
 # Configure logging
@@ -16,11 +18,20 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
-async def main():
+async def main(queue: bool):
+    if queue:
+        print("Embedding products from the ingestion queue (Ctrl+C to stop)...")
+        redis = await init_redis()
+        await process_embedding_queue(redis=redis, batch_size=32)
+        return
+
     print("Starting manual embedding generation...")
     # Process in batches, maybe limited count for testing or run until exhaustion
     await process_embeddings_job(batch_size=32, limit_total=None)
     print("Done.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Generate product embeddings")
+    parser.add_argument("--queue", action="store_true", help="Continuously embed products changed by ingestion")
+    args = parser.parse_args()
+    asyncio.run(main(queue=args.queue))
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+
+# Add project root to pythonpath
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from prometheus_client import start_http_server
+
+from app.config import get_settings
+from app.jobs.ingestion_consumer import IngestionConsumer
+from app.redis_client import init_redis
+from app.utils.ingest_queue import AioPikaIngestBroker
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("IngestionConsumer")
+
+
+async def main():
+    settings = get_settings()
+    start_http_server(int(os.getenv("INGEST_METRICS_PORT", "9420")))
+
+    broker = AioPikaIngestBroker(
+        settings.rabbitmq_connection_url,
+        prefetch=int(os.getenv("INGEST_PREFETCH", "64")),
+    )
+    await broker.connect()
+    redis = await init_redis()
+
+    consumer = IngestionConsumer(
+        broker,
+        redis=redis,
+        max_batch_items=int(os.getenv("INGEST_MAX_BATCH_ITEMS", "2000")),
+        max_wait_s=float(os.getenv("INGEST_MAX_WAIT_S", "1.0")),
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, consumer.stop)
+
+    logger.info("Ingestion consumer started.")
+    try:
+        await consumer.run()
+    finally:
+        await broker.close()
+        await redis.close()
+        logger.info("Ingestion consumer stopped.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,6 +10,8 @@ sys.path.append(str(project_root))
 
 from app.jobs.parsing_scheduler import run_parsing_scheduler
 from app.jobs.weeek_reminders import run_weeek_reminders
+from app.redis_client import init_redis
+from app.utils.rabbitmq import init_publisher
 from datetime import datetime
 
 logging.basicConfig(
@@ -21,11 +23,15 @@ logger = logging.getLogger("Scheduler")
 async def main():
     logger.info("Scheduler service started (Parsing + Reminders).")
     last_reminder_run = None
+    # Site crawl budgets live in Redis so they survive scheduler restarts
+    redis = await init_redis()
+    # One RabbitMQ connection for the life of the scheduler
+    publisher = await init_publisher()
     
     while True:
         # 1. Parsing
         try:
-            await run_parsing_scheduler()
+            await run_parsing_scheduler(redis=redis, publisher=publisher)
         except Exception as e:
             logger.error(f"Error in parsing scheduler loop: {e}")
         
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 import sys
@@ -7,12 +8,40 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from app.jobs.catalog_sync import catalog_sync_full
+from app.jobs.catalog_sync import catalog_sync_full, get_catalog_sync_status
 from app.config import get_settings
 
 logging.basicConfig(level=logging.INFO)
 
-async def main():
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    minutes, sec = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {sec:02d}s" if hours else f"{minutes}m {sec:02d}s"
+
+
+def print_status(status):
+    if status is None:
+        print("No catalog sync runs yet.")
+        return
+    total = status["expected_pages"] or "?"
+    progress = f" ({status['progress'] * 100:.1f}%)" if status["progress"] is not None else ""
+    print(f"Sync {status['sync_id']}: {status['status']} (attempt {status['attempts']})")
+    print(f"  pages:  {status['pages_done']}/{total}{progress}, {status['pages_per_sec'] or '-'} pages/s")
+    print(
+        f"  rows:   {status['rows_written']} written "
+        f"(inserted {status['inserted_count']}, updated {status['updated_count']}, "
+        f"unchanged {status['unchanged_count']}), deactivated {status['deactivated_count']}"
+    )
+    if status["status"] == "running":
+        print(f"  ETA:    {_format_eta(status['eta_s'])}")
+    if status["error_message"]:
+        print(f"  error:  {status['error_message']}")
+
+
+async def run(resume: bool):
     print("Starting manual catalog sync...")
     settings = get_settings()
     # Ensure source_id is set
@@ -21,8 +50,32 @@ async def main():
         print("Error: TAKPRODAM_SOURCE_ID not set in env")
         return
 
-    result = await catalog_sync_full(source_id=source_id)
+    result = await catalog_sync_full(source_id=source_id, resume=resume)
     print("Sync finished:", result)
 
+
+async def status(watch: float):
+    while True:
+        print_status(await get_catalog_sync_status())
+        if not watch:
+            return
+        await asyncio.sleep(watch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Takprodam catalog sync")
+    sub = parser.add_subparsers(dest="command")
+    run_parser = sub.add_parser("run", help="Run (or resume) the full catalog sync")
+    run_parser.add_argument("--no-resume", action="store_true", help="Start a fresh run even if one is unfinished")
+    status_parser = sub.add_parser("status", help="Show progress and ETA of the latest sync run")
+    status_parser.add_argument("--watch", type=float, default=0, help="Refresh every N seconds")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        asyncio.run(status(args.watch))
+    else:
+        asyncio.run(run(resume=not getattr(args, "no_resume", False)))
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,208 @@
+"""
+Offline simulation of the parsing scheduler.
+
+Replays a synthetic source set (one huge site, a few mid-sized ones, a long tail of small
+shops) against a pool of workers on a simulated clock and reports throughput and fairness,
+for the current scheduler (queue cap, due window, site budgets, plan_window, jitter) and, with
+--compare, for the previous one (top 20 due sources by priority, no budgets, no jitter).
+As in run_worker.py, every delivery is crawled: a duplicate publish costs a whole crawl.
+
+    python scripts/simulate_parsing_scheduler.py --hours 48 --workers 4 --compare
+"""
+import argparse
+import asyncio
+import heapq
+import random
+import statistics
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+
+# Add project root to pythonpath
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from app.jobs.parsing_scheduler import SCHEDULING_WINDOW, WINDOW_PER_SITE, queue_capacity
+from app.repositories.parsing import QUEUED_LEASE, jittered
+from app.services import crawl_planner
+from app.services.crawl_planner import SiteBudgets, plan_window
+
+TICK_S = 60  # scripts/run_parsing_scheduler.py runs a pass every minute
+QUEUED_TIMEOUT_S = QUEUED_LEASE.total_seconds()  # set_queued: re-due if no worker picked the task up
+LEGACY_QUEUED_TIMEOUT_S = 15 * 60  # the lease the previous scheduler ran with
+
+
+@dataclass
+class SimSource:
+    id: int
+    site_key: str
+    priority: int
+    refresh_interval_hours: int
+    crawl_minutes: float
+    config: dict = field(default_factory=dict)
+    next_sync_at: float = 0.0
+    status: str = "waiting"
+
+
+def synthetic_sources(seed: int) -> list[SimSource]:
+    rng = random.Random(seed)
+    sites = [("bigshop", 400, 50, 24, 3.0), ("mrgeek", 40, 70, 12, 5.0), ("ozon_gifts", 60, 60, 24, 8.0)]
+    sites += [(f"shop{i:02d}", rng.randint(3, 12), rng.choice([30, 50, 80]), 24, rng.uniform(1, 6)) for i in range(15)]
+    sources = []
+    for site_key, count, priority, refresh, crawl_minutes in sites:
+        for _ in range(count):
+            sources.append(SimSource(
+                id=len(sources) + 1,
+                site_key=site_key,
+                priority=priority,
+                refresh_interval_hours=refresh,
+                crawl_minutes=crawl_minutes * rng.uniform(0.5, 1.5),
+            ))
+    return sources
+
+
+def due_window(sources, now, limit, per_site):
+    """In-memory equivalent of ParsingRepository.get_due_window."""
+    due = sorted((s for s in sources if s.next_sync_at <= now), key=lambda s: (-s.priority, s.next_sync_at))
+    taken = Counter()
+    window = []
+    for s in due:
+        if taken[s.site_key] < per_site:
+            taken[s.site_key] += 1
+            window.append(s)
+    return window[:limit]
+
+
+def legacy_plan(sources, now):
+    due = sorted((s for s in sources if s.next_sync_at <= now), key=lambda s: (-s.priority, s.next_sync_at))
+    return due[:20]
+
+
+async def simulate(sources, hours: float, workers: int, legacy: bool, seed: int, max_queued: int | None = None) -> dict:
+    random.seed(seed)
+    crawl_planner._memory_budgets.clear()
+    budgets = SiteBudgets()
+    by_id = {s.id: s for s in sources}
+    # --workers counts crawl slots across the fleet
+    max_queued = max_queued or queue_capacity(1, workers)
+    became_due = {s.id: s.next_sync_at for s in sources}
+
+    queue: list[int] = []  # FIFO of published source ids, as in RabbitMQ
+    running: list[tuple[float, int]] = []  # (finish time, source id)
+    published = Counter()
+    started = Counter()
+    duplicates = 0
+    duplicate_crawls = 0
+    lateness = defaultdict(list)
+    publishes_per_tick = []
+
+    end = hours * 3600
+    now = 0.0
+    while now < end:
+        # Finished crawls reschedule themselves (finish_crawl)
+        while running and running[0][0] <= now:
+            finished_at, sid = heapq.heappop(running)
+            if sid < 0:
+                continue  # duplicate crawl, the source itself was rescheduled by its first one
+            s = by_id[sid]
+            delay = timedelta(hours=s.refresh_interval_hours)
+            s.next_sync_at = finished_at + (delay if legacy else jittered(delay)).total_seconds()
+            s.status = "waiting"
+            became_due[sid] = s.next_sync_at
+
+        # Scheduler pass
+        if legacy:
+            plan = legacy_plan(sources, now)
+        else:
+            window = due_window(sources, now, SCHEDULING_WINDOW, WINDOW_PER_SITE)
+            tokens = await budgets.available(window, now=now)
+            in_queue = sum(1 for s in sources if s.status == "queued" and s.next_sync_at > now)
+            plan = plan_window(window, tokens, limit=max(0, max_queued - in_queue))
+            await budgets.consume(Counter(s.site_key for s in plan), now=now)
+        for s in plan:
+            if s.status == "queued":
+                duplicates += 1
+            s.status = "queued"
+            s.next_sync_at = now + (LEGACY_QUEUED_TIMEOUT_S if legacy else QUEUED_TIMEOUT_S)
+            queue.append(s.id)
+            published[s.site_key] += 1
+        publishes_per_tick.append(len(plan))
+
+        # Workers take tasks in publish order. A stale copy of a task (the source was
+        # crawled or is running already) still takes a slot for a whole crawl.
+        while queue and len(running) < workers:
+            sid = queue.pop(0)
+            s = by_id[sid]
+            if s.status != "queued":
+                duplicate_crawls += 1
+                heapq.heappush(running, (now + s.crawl_minutes * 60, -sid))
+                continue
+            s.status = "running"
+            s.next_sync_at = float("inf")
+            started[s.site_key] += 1
+            lateness[s.site_key].append((now - became_due[sid]) / 60)
+            heapq.heappush(running, (now + s.crawl_minutes * 60, sid))
+
+        now += TICK_S
+
+    demand = Counter(s.site_key for s in sources)
+    # Crawls per source of each site; Jain's index over sites (1.0 = every site equally served)
+    shares = [started[site] / demand[site] for site in demand]
+    jain = sum(shares) ** 2 / (len(shares) * sum(x * x for x in shares)) if any(shares) else 0.0
+    site_waits = [statistics.mean(values) for values in lateness.values()]
+    all_lateness = [m for values in lateness.values() for m in values]
+    return {
+        "crawls": sum(started.values()),
+        "crawls_per_hour": sum(started.values()) / hours,
+        "duplicate_publishes": duplicates,
+        "duplicate_crawls": duplicate_crawls,
+        "queue_left": len(queue),
+        "peak_publishes_per_minute": max(publishes_per_tick or [0]),
+        "jain_fairness": jain,
+        "sites_never_crawled": sorted(site for site in demand if not started[site]),
+        "p50_wait_min": statistics.median(all_lateness) if all_lateness else 0.0,
+        "p95_wait_min": statistics.quantiles(all_lateness, n=20)[-1] if len(all_lateness) > 1 else 0.0,
+        "worst_site_avg_wait_min": max(site_waits or [0.0]),
+        "per_site": {
+            site: (demand[site], started[site], statistics.mean(lateness[site]) if lateness[site] else None)
+            for site in sorted(demand)
+        },
+    }
+
+
+def report(title: str, result: dict, verbose: bool):
+    print(f"\n== {title}")
+    for key in ("crawls", "crawls_per_hour", "duplicate_publishes", "duplicate_crawls", "queue_left",
+                "peak_publishes_per_minute",
+                "jain_fairness", "p50_wait_min", "p95_wait_min", "worst_site_avg_wait_min", "sites_never_crawled"):
+        value = result[key]
+        print(f"{key:>28}: {value:.2f}" if isinstance(value, float) else f"{key:>28}: {value}")
+    if verbose:
+        print(f"{'site':>14} {'sources':>8} {'crawls':>7} {'avg wait, min':>14}")
+        for site, (count, crawls, wait) in result["per_site"].items():
+            print(f"{site:>14} {count:>8} {crawls:>7} {wait if wait is None else round(wait, 1):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a synthetic source set through the parsing scheduler")
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent crawls across all scraper workers")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-queued", type=int, help="Queue cap (default: the prefetch of --workers crawl slots)")
+    parser.add_argument("--compare", action="store_true", help="Also run the previous top-20 scheduler")
+    parser.add_argument("--verbose", action="store_true", help="Per-site breakdown")
+    args = parser.parse_args()
+
+    result = asyncio.run(simulate(
+        synthetic_sources(args.seed), args.hours, args.workers, legacy=False, seed=args.seed, max_queued=args.max_queued
+    ))
+    report("fair scheduler (queue cap, site budgets, interleaving, jitter)", result, args.verbose)
+    if args.compare:
+        result = asyncio.run(simulate(synthetic_sources(args.seed), args.hours, args.workers, legacy=True, seed=args.seed))
+        report("previous scheduler (top 20 by priority)", result, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Admission control for the ScraperWorker: decides whether a parsing task may start now.
+
+A task is admitted when
+- the predicted memory of its spider fits the budget next to what running crawls reserved,
+- live RAM and CPU usage are below their thresholds,
+- fewer than the per-site limit of crawls for its site_key are running,
+- the worker has a free slot (MAX_CONCURRENT_TASKS).
+Otherwise the worker sends the task back to RabbitMQ through a delay queue.
+
+Predictions are an EWMA of the peak RSS of earlier crawls per spider, kept in Redis so
+every worker learns from every crawl and the history survives restarts.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import psutil
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("AdmissionController")
+
+MEMORY_PROFILE_KEY = "scraper:memory_profile"
+# Weight of the newest observation in the per-spider memory estimate
+EWMA_ALPHA = 0.3
+
+ADMITTED_MEMORY_MB = Gauge(
+    "scraper_admitted_memory_mb", "Memory reserved by running crawls (predicted)", multiprocess_mode="livesum"
+)
+ADMISSION_REJECTIONS = Counter(
+    "scraper_admission_rejections_total", "Tasks sent back to the queue instead of starting", ["site_key", "reason"]
+)
+MEMORY_ESTIMATE_MB = Gauge(
+    "scraper_spider_memory_estimate_mb", "Predicted peak memory of a crawl", ["site_key"], multiprocess_mode="mostrecent"
+)
+
+
+@dataclass
+class Admission:
+    task_id: str
+    site_key: str
+    reserved_mb: float
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        redis_client=None,
+        max_tasks: int = 4,
+        memory_budget_mb: Optional[float] = None,
+        memory_threshold_pct: float = 85.0,
+        cpu_threshold_pct: float = 90.0,
+        site_max_concurrent: int = 1,
+        default_memory_mb: float = 300.0,
+    ):
+        self.redis = redis_client
+        self.max_tasks = max_tasks
+        total_mb = psutil.virtual_memory().total / (1024 * 1024)
+        self.memory_budget_mb = memory_budget_mb or total_mb * memory_threshold_pct / 100
+        self.memory_threshold_pct = memory_threshold_pct
+        self.cpu_threshold_pct = cpu_threshold_pct
+        self.site_max_concurrent = site_max_concurrent
+        self.default_memory_mb = default_memory_mb
+        self.running: dict[str, Admission] = {}
+        self._estimates: dict[str, float] = {}
+
+    @property
+    def reserved_mb(self) -> float:
+        return sum(a.reserved_mb for a in self.running.values())
+
+    async def estimate_mb(self, site_key: str) -> float:
+        if self.redis is not None:
+            # Re-read every time: other workers keep refining the shared profile
+            try:
+                value = await self.redis.hget(MEMORY_PROFILE_KEY, site_key)
+                if value:
+                    self._estimates[site_key] = float(value)
+            except Exception as e:
+                logger.warning(f"Failed to load memory profile of {site_key}: {e}")
+        return self._estimates.get(site_key, self.default_memory_mb)
+
+    async def try_admit(self, task_id: str, task: dict) -> tuple[Optional[Admission], Optional[str]]:
+        """Returns (admission, None) or (None, rejection reason)."""
+        site_key = task.get("site_key") or "unknown"
+        predicted = await self.estimate_mb(site_key)
+        site_limit = (task.get("config") or {}).get("max_concurrent_crawls", self.site_max_concurrent)
+
+        reason = None
+        if len(self.running) >= self.max_tasks:
+            reason = "slots"
+        elif sum(1 for a in self.running.values() if a.site_key == site_key) >= site_limit:
+            reason = "site_limit"
+        elif self.running and self.reserved_mb + predicted > self.memory_budget_mb:
+            # An idle worker always admits one task, whatever the estimate says
+            reason = "memory_budget"
+        elif psutil.virtual_memory().percent > self.memory_threshold_pct:
+            reason = "memory"
+        elif psutil.cpu_percent(interval=None) > self.cpu_threshold_pct:
+            reason = "cpu"
+
+        if reason:
+            ADMISSION_REJECTIONS.labels(site_key=site_key, reason=reason).inc()
+            return None, reason
+
+        admission = Admission(task_id=task_id, site_key=site_key, reserved_mb=predicted)
+        self.running[task_id] = admission
+        ADMITTED_MEMORY_MB.set(self.reserved_mb)
+        MEMORY_ESTIMATE_MB.labels(site_key=site_key).set(predicted)
+        return admission, None
+
+    async def release(self, admission: Admission, peak_rss_mb: Optional[float] = None):
+        """Frees the reservation and folds the crawl's observed peak memory into the estimate."""
+        self.running.pop(admission.task_id, None)
+        ADMITTED_MEMORY_MB.set(self.reserved_mb)
+        if not peak_rss_mb:
+            return
+        previous = self._estimates.get(admission.site_key)
+        estimate = peak_rss_mb if previous is None else (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * peak_rss_mb
+        self._estimates[admission.site_key] = estimate
+        MEMORY_ESTIMATE_MB.labels(site_key=admission.site_key).set(estimate)
+        if self.redis is not None:
+            try:
+                await self.redis.hset(MEMORY_PROFILE_KEY, admission.site_key, round(estimate, 1))
+            except Exception as e:
+                logger.warning(f"Failed to save memory profile of {admission.site_key}: {e}")
+
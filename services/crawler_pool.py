@@ -0,0 +1,254 @@
+"""
+Pool of long-lived crawler processes for the ScraperWorker (CRAWLER_MODE=pool).
+
+Each process imports Scrapy, the project settings and every spider module once,
+runs a Twisted asyncio reactor and then takes crawl jobs over a pipe, one at a
+time, with a fresh Crawler (settings copy, stats, middlewares, pipelines) per job.
+The parent enforces the job timeout by killing the process, and a process retires
+itself after CRAWLER_POOL_MAX_JOBS jobs or when its RSS grows past
+CRAWLER_POOL_MAX_RSS_MB, so leaks in one spider don't accumulate.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from typing import Optional
+
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "gifty_scraper.settings")
+
+logger = logging.getLogger("CrawlerPool")
+
+# Seconds between the graceful CLOSESPIDER_TIMEOUT and killing the process
+KILL_GRACE_S = 60
+LOG_TAIL_LINES = 50
+
+
+def spider_registry() -> dict:
+    """Spider name -> class, straight from the project's spider modules."""
+    from scrapy.spiderloader import get_spider_loader
+    from scrapy.utils.project import get_project_settings
+
+    loader = get_spider_loader(get_project_settings())
+    return {name: loader.load(name) for name in loader.list()}
+
+
+def _rss_mb() -> float:
+    import psutil
+
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    """RSS of a process and its children (e.g. Playwright browsers), in MB."""
+    import psutil
+
+    try:
+        proc = psutil.Process(pid)
+        procs = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+class _TailHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.lines = deque(maxlen=LOG_TAIL_LINES)
+        self.setFormatter(logging.Formatter("%(asctime)s [%(name)s] %(levelname)s: %(message)s"))
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            pass
+
+
+async def _run_job(job: dict, settings, spiders: dict) -> dict:
+    from scrapy.crawler import AsyncCrawlerRunner
+
+    spidercls = spiders.get(job["site_key"])
+    if spidercls is None:
+        return {"status": "error", "error": f"Unknown spider: {job['site_key']}", "logs": []}
+
+    job_settings = settings.copy()
+    if job.get("timeout"):
+        # Let the spider close (and flush its pipeline) before the parent kills us
+        job_settings.set("CLOSESPIDER_TIMEOUT", job["timeout"], priority="cmdline")
+
+    tail = _TailHandler()
+    root = logging.getLogger()
+    root.addHandler(tail)
+    try:
+        runner = AsyncCrawlerRunner(job_settings)
+        crawler = runner.create_crawler(spidercls)
+        await runner.crawl(crawler, **job.get("spider_kwargs", {}))
+        stats = crawler.stats.get_stats() if crawler.stats else {}
+        return {
+            "status": "success",
+            "logs": list(tail.lines),
+            "stats": {
+                "finish_reason": stats.get("finish_reason"),
+                "item_scraped_count": stats.get("item_scraped_count", 0),
+                "log_count/ERROR": stats.get("log_count/ERROR", 0),
+            },
+        }
+    except Exception as e:
+        logger.exception(f"Crawl of {job['site_key']} failed")
+        return {"status": "error", "error": str(e), "logs": list(tail.lines)}
+    finally:
+        root.removeHandler(tail)
+
+
+async def _serve_jobs(conn, settings, spiders: dict, max_jobs: int, max_rss_mb: float):
+    loop = asyncio.get_running_loop()
+    jobs = 0
+    while True:
+        try:
+            job = await loop.run_in_executor(None, conn.recv)
+        except EOFError:
+            return  # parent went away
+        started = time.monotonic()
+        result = await _run_job(job, settings, spiders)
+        jobs += 1
+        result["duration_s"] = time.monotonic() - started
+        result["rss_mb"] = _rss_mb()
+        result["recycle"] = jobs >= max_jobs or result["rss_mb"] >= max_rss_mb
+        conn.send(result)
+        if result["recycle"]:
+            return
+
+
+def _serve(conn, max_jobs: int, max_rss_mb: float):
+    """Entry point of a pool process."""
+    from scrapy.utils.defer import deferred_from_coro
+    from scrapy.utils.log import configure_logging
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.reactor import install_reactor
+
+    settings = get_project_settings()
+    install_reactor(settings["TWISTED_REACTOR"], settings["ASYNCIO_EVENT_LOOP"])
+    from twisted.internet import reactor
+
+    configure_logging(settings)
+    spiders = spider_registry()
+
+    def start():
+        d = deferred_from_coro(_serve_jobs(conn, settings, spiders, max_jobs, max_rss_mb))
+        d.addBoth(lambda _: reactor.stop())
+
+    reactor.callWhenRunning(start)
+    reactor.run(installSignalHandlers=False)
+
+
+class _CrawlerProcess:
+    def __init__(self, ctx, max_jobs: int, max_rss_mb: float):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child_conn, max_jobs, max_rss_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR") and self.pid is not None:
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(self.pid)
+
+
+class CrawlerPool:
+    """
+    `run(job, timeout)` executes one crawl on an idle pool process and returns its
+    result: {"status": "success" | "error" | "timeout", "error", "logs", "stats", ...}.
+    A job is {"site_key", "spider_kwargs"}; spider kwargs are what `scrapy crawl -a` gets.
+    """
+
+    def __init__(self, size: int, max_jobs: int = 50, max_rss_mb: float = 1536):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        self._busy: dict = {}
+
+    def _spawn(self) -> _CrawlerProcess:
+        proc = _CrawlerProcess(self._ctx, self.max_jobs, self.max_rss_mb)
+        logger.info(f"Started crawler process {proc.pid}")
+        return proc
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+
+    async def run(self, job: dict, timeout: float) -> dict:
+        proc = await self._idle.get()
+        if not proc.is_alive():
+            proc.kill()
+            proc = self._spawn()
+        self._busy[proc.pid] = proc
+        keep = False
+        try:
+            proc.conn.send({**job, "timeout": timeout})
+            result = await self._wait(proc, timeout + KILL_GRACE_S)
+            keep = not result.get("recycle")
+            if not keep:
+                logger.info(f"Recycling crawler process {proc.pid} (rss {result.get('rss_mb', 0):.0f} MB)")
+            return result
+        except asyncio.TimeoutError:
+            logger.error(f"Crawl {job.get('site_key')} timed out on process {proc.pid}, killing it")
+            return {"status": "timeout", "error": "Subprocess timeout", "logs": []}
+        except (EOFError, OSError) as e:
+            return {"status": "error", "error": f"Crawler process {proc.pid} died: {e!r}", "logs": []}
+        finally:
+            self._busy.pop(proc.pid, None)
+            if keep:
+                self._idle.put_nowait(proc)
+            else:
+                proc.kill()
+                self._idle.put_nowait(self._spawn())
+
+    async def _wait(self, proc: _CrawlerProcess, timeout: float) -> dict:
+        deadline = time.monotonic() + timeout
+        peak_mb = 0.0
+        polls = 0
+        # Polling keeps the wait cancellable and notices a crashed process
+        while not proc.conn.poll():
+            if not proc.is_alive():
+                raise EOFError(f"exit code {proc.process.exitcode}")
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError()
+            if polls % 10 == 0:
+                peak_mb = max(peak_mb, process_tree_rss_mb(proc.pid))
+            polls += 1
+            await asyncio.sleep(0.5)
+        result = proc.conn.recv()
+        result["peak_rss_mb"] = max(peak_mb, result.get("rss_mb", 0))
+        return result
+
+    def terminate_all(self):
+        procs = list(self._busy.values())
+        if self._idle is not None:
+            while not self._idle.empty():
+                procs.append(self._idle.get_nowait())
+        for proc in procs:
+            proc.kill()
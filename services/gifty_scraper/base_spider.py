@@ -1,4 +1,8 @@
+import json
+import os
+
 import scrapy
+from gifty_scraper import extraction
 from gifty_scraper.items import ProductItem, CategoryItem
 
 class GiftyBaseSpider(scrapy.Spider):
@@ -8,11 +12,15 @@ class GiftyBaseSpider(scrapy.Spider):
     """
     site_key = None  # Должен быть переопределен в потомке
 
-    def __init__(self, url=None, strategy="deep", source_id=None, *args, **kwargs):
+    def __init__(self, url=None, strategy="deep", source_id=None, throttle=None, run_id=None, *args, **kwargs):
         super(GiftyBaseSpider, self).__init__(*args, **kwargs)
         self.start_urls = [url] if url else []
         self.strategy = strategy
         self.source_id = source_id
+        # Crawl run id from the worker; ingest batches carry it so the API keeps this run's stats apart
+        self.run_id = run_id
+        # ParsingSource.config["throttle"] (JSON when passed with -a), see AdaptiveThrottleMiddleware
+        self.throttle_config = json.loads(throttle) if isinstance(throttle, str) else (throttle or {})
 
     def parse(self, response):
         if self.strategy == "discovery":
@@ -28,6 +36,41 @@ class GiftyBaseSpider(scrapy.Spider):
         """Парсинг структуры категорий (Hub)"""
         raise NotImplementedError
 
+    # --- Extraction helpers (gifty_scraper.extraction) ---
+
+    def response_json(self, response):
+        """Body of a JSON API response, parsed with orjson."""
+        return extraction.loads(response.body)
+
+    def embedded_json(self, response, script_id="__NEXT_DATA__"):
+        """JSON of `<script id=...>` (Next.js state etc.) without decoding the page to text; None if absent."""
+        return extraction.script_json(response.body, script_id)
+
+    def embedded_js_json(self, response, marker):
+        """JSON passed as a JS string after `marker`, e.g. b'window.appData = JSON.parse("'; None if absent."""
+        return extraction.js_string_json(response.body, marker)
+
+    def fast_css(self, node, selector):
+        """
+        lxml elements matching `selector` under a response or an element: the fast path
+        for product card loops (no Selector objects, no ::text / ::attr pseudo-elements).
+        """
+        root = node.selector.root if isinstance(node, scrapy.http.TextResponse) else node
+        return extraction.css_nodes(root, selector)
+
+    def dump_response(self, response, name=None):
+        """Saves the page for debugging when DEBUG_DUMP_RESPONSES is on (off in production)."""
+        settings = getattr(self, "settings", None)
+        if settings is None or not settings.getbool("DEBUG_DUMP_RESPONSES"):
+            return None
+        directory = settings.get("DEBUG_DUMP_DIR", "debug_dumps")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}_{name or 'last_response'}.html")
+        with open(path, "wb") as f:
+            f.write(response.body)
+        self.logger.debug(f"Saved {response.url} to {path}")
+        return path
+
     def create_product(self, **kwargs):
         """Helper для создания ProductItem с общими полями"""
         product = ProductItem()
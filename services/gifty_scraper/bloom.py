@@ -0,0 +1,51 @@
+"""
+Scraper-side reader of the known-products filter served by the Core API
+(GET /api/v1/internal/sources/{id}/known-products). Hashing, URL normalization and
+key format mirror app.utils.bloom, app.services.ingestion.normalize_url and
+app.utils.catalog.build_known_offer_key; the three must change together.
+"""
+import base64
+import hashlib
+import zlib
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+class KnownProducts:
+    def __init__(self, data: dict):
+        self.site_key = data["site_key"]
+        self.strip_params = set(data.get("strip_params") or [])
+        self.size_bits = data["size_bits"]
+        self.hash_count = data["hash_count"]
+        self.count = data.get("count", 0)
+        self.bits = zlib.decompress(base64.b64decode(data["bits"]))
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def offer_key(self, product_url: str, price) -> Optional[str]:
+        """Filter key of a scraped product, None if its price can't be compared."""
+        try:
+            price_part = f"{float(price):.2f}" if price is not None else ""
+        except (TypeError, ValueError):
+            return None
+        return f"{self.site_key}:{self._normalize_url(product_url)}|{price_part}"
+
+    def is_known(self, product_url: str, price) -> bool:
+        key = self.offer_key(product_url, price)
+        return key is not None and key in self
+
+    def _normalize_url(self, url: str) -> str:
+        try:
+            parsed = urlparse(url)
+            params = [(k, v) for k, v in parse_qsl(parsed.query) if k.lower() not in self.strip_params]
+            return urlunparse(parsed._replace(query=urlencode(params), fragment=""))
+        except Exception:
+            return url
@@ -0,0 +1,100 @@
+"""
+Extraction helpers shared by the spiders (exposed as GiftyBaseSpider methods).
+
+They work on `response.body` bytes: finding an embedded JSON blob doesn't need the
+page decoded to text (`response.text` of a 1-2 MB page is a copy and a decode), and
+orjson parses bytes directly. The CSS helpers run compiled lxml selectors on the tree
+Scrapy already parsed for `response.css`, without wrapping every match in a Selector.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+import orjson
+from lxml.cssselect import CSSSelector
+
+_SCRIPT_END = b"</script"
+
+
+def loads(data) -> Any:
+    """orjson.loads, falling back to json for what orjson rejects (NaN, Infinity)."""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+def script_json(body: bytes, script_id: str) -> Optional[Any]:
+    """JSON content of `<script id="script_id">` (e.g. __NEXT_DATA__), or None."""
+    match = re.search(rb"<script[^>]*\sid=[\"']?" + re.escape(script_id.encode()) + rb"[\"'\s>]", body)
+    if not match:
+        return None
+    start = body.find(b">", match.end() - 1) + 1
+    end = body.find(_SCRIPT_END, start)
+    if start <= 0 or end < 0:
+        return None
+    try:
+        return loads(body[start:end])
+    except ValueError:
+        return None
+
+
+def js_string_json(body: bytes, marker: bytes) -> Optional[Any]:
+    """
+    JSON encoded as a JS string literal right after `marker`, as in
+    `window.appData = JSON.parse("{\\"catalog\\": ...}")` with marker b'JSON.parse("'.
+    """
+    start = body.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = start
+    # Closing quote: the first one not escaped by an odd run of backslashes
+    while True:
+        end = body.find(b'"', end)
+        if end < 0:
+            return None
+        backslashes = 0
+        while body[end - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            break
+        end += 1
+    try:
+        # The literal uses JSON string escapes, so decoding it as a JSON string unescapes it
+        return loads(loads(b'"' + body[start:end] + b'"'))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=256)
+def compiled_css(selector: str) -> CSSSelector:
+    return CSSSelector(selector, translator="html")
+
+
+def css_nodes(root, selector: str) -> list:
+    """lxml elements under `root` matching a CSS selector (no pseudo-elements like ::text)."""
+    return compiled_css(selector)(root)
+
+
+def css_first(root, selector: str):
+    nodes = css_nodes(root, selector)
+    return nodes[0] if nodes else None
+
+
+def node_text(node) -> Optional[str]:
+    """Stripped text content of an element, None when empty or missing."""
+    if node is None:
+        return None
+    text = node.text_content().strip()
+    return text or None
+
+
+def node_attr(root, selector: str, attr: str) -> Optional[str]:
+    """Attribute of the first element matching `selector` that has it."""
+    for node in css_nodes(root, selector):
+        value = node.get(attr)
+        if value is not None:
+            return value
+    return None
@@ -1,4 +1,8 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
+
+# Spiders run in child processes of the worker (subprocess or crawler pool). When the worker
+# sets PROMETHEUS_MULTIPROC_DIR these metrics are shared through it and served on the
+# worker's metrics port; `multiprocess_mode` says how gauges of several processes combine.
 
 # Metrics for items scraped
 scraped_items_total = Counter(
@@ -19,3 +23,119 @@ ingestion_items_total = Counter(
     "Total number of items successfully ingested",
     ["spider"]
 )
+
+ingestion_batch_latency_seconds = Histogram(
+    "ingestion_batch_latency_seconds",
+    "Time to deliver one batch to the Core API (successful attempt)",
+    ["spider"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+
+ingestion_retries_total = Counter(
+    "ingestion_retries_total",
+    "Batch delivery attempts that failed and were retried",
+    ["spider"]
+)
+
+ingestion_queue_depth = Gauge(
+    "ingestion_queue_depth",
+    "Batches waiting to be sent to the Core API",
+    ["spider"],
+    multiprocess_mode="livesum"
+)
+
+ingestion_spool_batches = Gauge(
+    "ingestion_spool_batches",
+    "Undeliverable batches spooled to disk, waiting for replay",
+    multiprocess_mode="livemax"
+)
+
+# Conditional HTTP cache (gifty_scraper.middlewares.ConditionalCacheMiddleware)
+http_cache_requests_total = Counter(
+    "http_cache_requests_total",
+    "Cacheable page fetches by outcome",
+    ["spider", "outcome"] # outcome: not_modified, same_body, miss, new
+)
+
+http_cache_hit_ratio = Gauge(
+    "http_cache_hit_ratio",
+    "Share of pages found unchanged in the last crawl",
+    ["spider"],
+    multiprocess_mode="mostrecent"
+)
+
+# Adaptive per-domain throttle (gifty_scraper.middlewares.AdaptiveThrottleMiddleware)
+throttle_request_rate = Gauge(
+    "scraper_domain_request_rate",
+    "Responses per second received from the domain (10s window)",
+    ["spider", "domain"],
+    multiprocess_mode="livesum"
+)
+
+throttle_delay_seconds = Gauge(
+    "scraper_domain_delay_seconds",
+    "Current download delay for the domain",
+    ["spider", "domain"],
+    multiprocess_mode="livemax"
+)
+
+throttle_concurrency = Gauge(
+    "scraper_domain_concurrency",
+    "Current concurrent request limit for the domain",
+    ["spider", "domain"],
+    multiprocess_mode="livesum"
+)
+
+throttle_events_total = Counter(
+    "scraper_throttle_events_total",
+    "Responses that made the throttle back off",
+    ["spider", "domain", "status"]
+)
+
+# Downloader / parsing instrumentation (gifty_scraper.middlewares.DownloaderMetricsMiddleware,
+# SpiderMetricsMiddleware)
+request_latency_seconds = Histogram(
+    "scraper_request_latency_seconds",
+    "Time from sending a request to receiving the response",
+    ["spider", "site_key"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+
+response_size_bytes = Histogram(
+    "scraper_response_size_bytes",
+    "Downloaded response body size",
+    ["spider", "site_key"],
+    buckets=(1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+)
+
+responses_total = Counter(
+    "scraper_responses_total",
+    "Responses by HTTP status (before retries)",
+    ["spider", "site_key", "status"]
+)
+
+download_errors_total = Counter(
+    "scraper_download_errors_total",
+    "Requests that failed without a response",
+    ["spider", "site_key", "error"]
+)
+
+request_retries_total = Counter(
+    "scraper_request_retries_total",
+    "Retried requests (each retry attempt counts once)",
+    ["spider", "site_key"]
+)
+
+parse_duration_seconds = Histogram(
+    "scraper_parse_duration_seconds",
+    "Time spent in a spider callback for one response",
+    ["spider", "site_key", "callback"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+items_per_second = Gauge(
+    "scraper_items_per_second",
+    "Items scraped per second (10s window)",
+    ["spider", "site_key"],
+    multiprocess_mode="livesum"
+)
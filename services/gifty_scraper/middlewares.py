@@ -3,11 +3,41 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import hashlib
+import json
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from scrapy import Request, signals
+from scrapy.exceptions import DownloadTimeoutError, NotConfigured
+from twisted.internet.error import TimeoutError as TxTimeoutError
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from gifty_scraper.bloom import KnownProducts
+from gifty_scraper.items import ProductItem
+from gifty_scraper.metrics import (
+    download_errors_total,
+    http_cache_hit_ratio,
+    http_cache_requests_total,
+    items_per_second,
+    parse_duration_seconds,
+    request_latency_seconds,
+    request_retries_total,
+    response_size_bytes,
+    responses_total,
+    throttle_concurrency,
+    throttle_delay_seconds,
+    throttle_events_total,
+    throttle_request_rate,
+)
+
+logger = logging.getLogger(__name__)
+
 
 class GiftyScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -98,3 +128,653 @@ class GiftyScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+def _skip_unchanged_page(response, **kwargs):
+    """Callback swapped in for an unchanged page; its follow-ups are replayed instead."""
+    return []
+
+
+class ConditionalCacheStore:
+    """
+    Persistent per-source cache of page validators, shared by all workers via Redis.
+    Entry: {"etag", "last_modified", "body_hash", "followups", "replayable", "checked_at"}.
+    Without Redis the cache is disabled (every request is a plain miss).
+    """
+
+    def __init__(self, redis_url: str, ttl_days: float):
+        self.redis_url = redis_url
+        self.ttl_s = int(ttl_days * 86400)
+        self._redis = None
+        self._disabled = not redis_url
+
+    @staticmethod
+    def key(spider, url: str) -> str:
+        source = getattr(spider, "source_id", None) or spider.name
+        return f"condcache:{source}:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+
+    async def _client(self):
+        if self._redis is None and not self._disabled:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def get(self, key: str) -> Optional[dict]:
+        try:
+            client = await self._client()
+            raw = await client.get(key) if client is not None else None
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Conditional cache unavailable, disabling it for this crawl: {e}")
+            self._disabled = True
+            return None
+
+    async def set(self, key: str, entry: dict) -> None:
+        try:
+            client = await self._client()
+            if client is not None:
+                await client.set(key, json.dumps(entry), ex=self.ttl_s)
+        except Exception as e:
+            logger.warning(f"Conditional cache write failed: {e}")
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+class ConditionalCacheMiddleware:
+    """
+    Downloader middleware: conditional requests for catalog crawls.
+
+    For GET requests it looks up the stored ETag / Last-Modified of the URL (keyed by
+    source and URL) and sends If-None-Match / If-Modified-Since. A 304, or a 200 whose
+    body hash equals the stored one, marks the response `page_unchanged` and swaps the
+    request callback for a no-op; the companion `ConditionalCacheSpiderMiddleware` then
+    re-issues the follow-up requests recorded on the previous crawl, so pagination still
+    continues.
+    Validators are only sent for pages whose follow-ups could be recorded, otherwise a
+    304 would leave nothing to parse. Requests with `meta["dont_cache"]` are left alone.
+    Hit rates are kept in the crawl stats and exported per spider to Prometheus.
+    """
+
+    def __init__(self, store: ConditionalCacheStore, stats):
+        self.store = store
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CONDITIONAL_CACHE_ENABLED"):
+            raise NotConfigured
+        store = ConditionalCacheStore(
+            crawler.settings.get("CONDITIONAL_CACHE_REDIS_URL") or os.getenv("REDIS_URL", ""),
+            crawler.settings.getfloat("CONDITIONAL_CACHE_TTL_DAYS", 30),
+        )
+        crawler.conditional_cache_store = store
+        s = cls(store, crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _count(self, spider, outcome: str) -> None:
+        self.stats.inc_value(f"conditional_cache/{outcome}")
+        http_cache_requests_total.labels(spider=spider.name, outcome=outcome).inc()
+
+    async def process_request(self, request, spider):
+        if request.method != "GET" or request.meta.get("dont_cache") or request.meta.get("conditional_cache_bypass"):
+            return None
+        key = ConditionalCacheStore.key(spider, request.url)
+        entry = await self.store.get(key)
+        request.meta["conditional_cache"] = {"key": key, "entry": entry}
+        if entry and entry.get("replayable") and not request.meta.get("playwright"):
+            if entry.get("etag"):
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+        return None
+
+    async def process_response(self, request, response, spider):
+        cache = request.meta.get("conditional_cache")
+        if cache is None:
+            return response
+        entry = cache["entry"] or {}
+        now = time.time()
+
+        if response.status == 304 and entry:
+            self._count(spider, "not_modified")
+            if not entry.get("replayable"):
+                # Nothing to replay and no body to parse: fetch the page for real
+                meta = {**request.meta, "conditional_cache_bypass": True}
+                return request.replace(dont_filter=True, meta=meta)
+            request.meta["page_unchanged"] = True
+            await self.store.set(cache["key"], {**entry, "checked_at": now})
+            # Let it through HttpErrorMiddleware; the callback is not run for it
+            return self._unchanged(request, response.replace(status=200, flags=response.flags + ["not_modified"]))
+
+        if response.status != 200:
+            return response
+
+        body_hash = hashlib.sha1(response.body).hexdigest()
+        if entry.get("body_hash") == body_hash:
+            self._count(spider, "same_body")
+            # Without recorded follow-ups the page still has to be parsed to continue the crawl
+            request.meta["page_unchanged"] = bool(entry.get("replayable"))
+        else:
+            self._count(spider, "miss" if entry else "new")
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cache["entry"] = {
+            **entry,
+            "etag": etag.decode("latin-1") if etag else None,
+            "last_modified": last_modified.decode("latin-1") if last_modified else None,
+            "body_hash": body_hash,
+            "checked_at": now,
+        }
+        await self.store.set(cache["key"], cache["entry"])
+        if request.meta.get("page_unchanged"):
+            return self._unchanged(request, response)
+        return response
+
+    @staticmethod
+    def _unchanged(request, response):
+        # The engine keeps a response's own request, so the page never reaches its callback
+        # (nor, unlike an exception raised in the spider middleware, its errback)
+        return response.replace(request=request.replace(callback=_skip_unchanged_page, cb_kwargs={}))
+
+    async def spider_closed(self, spider):
+        hits = sum(self.stats.get_value(f"conditional_cache/{o}", 0) for o in ("not_modified", "same_body"))
+        total = hits + sum(self.stats.get_value(f"conditional_cache/{o}", 0) for o in ("miss", "new"))
+        if total:
+            ratio = hits / total
+            self.stats.set_value("conditional_cache/hit_ratio", round(ratio, 4))
+            http_cache_hit_ratio.labels(spider=spider.name).set(ratio)
+            spider.logger.info(f"Conditional cache: {hits}/{total} pages unchanged ({ratio:.1%})")
+        await self.store.close()
+
+
+class ConditionalCacheSpiderMiddleware:
+    """
+    Spider-side half of the conditional cache (see ConditionalCacheMiddleware).
+    Records the GET requests a page's callback yields as the page's follow-ups
+    (URL, callback, errback, headers, cb_kwargs, meta, priority, dont_filter), and for
+    an unchanged page yields those follow-ups in place of the skipped callback's output.
+    Pages whose follow-ups can't be replayed (POST, non-JSON meta or cb_kwargs, foreign
+    callback or errback) are always parsed; should one still come back as a bodyless 304
+    the downloader middleware refetches it.
+    """
+
+    MAX_FOLLOWUPS = 200
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CONDITIONAL_CACHE_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    @property
+    def store(self) -> Optional[ConditionalCacheStore]:
+        return getattr(self.crawler, "conditional_cache_store", None)
+
+    async def process_spider_output(self, response, result, spider):
+        cache = response.meta.get("conditional_cache")
+        if response.meta.get("page_unchanged"):
+            async for obj in _aiter(result):
+                yield obj
+            entry = (cache or {}).get("entry") or {}
+            for followup in entry.get("followups", []):
+                yield self._restore(spider, followup)
+            return
+        record = cache is not None and self.store is not None and not response.meta.get("page_unchanged")
+        followups = []
+        replayable = True
+        async for obj in _aiter(result):
+            if record and isinstance(obj, Request):
+                followup = self._describe(spider, obj)
+                if followup is None or len(followups) >= self.MAX_FOLLOWUPS:
+                    replayable = False
+                else:
+                    followups.append(followup)
+            yield obj
+        if record and not response.meta.get("followups_truncated"):
+            entry = {**(cache["entry"] or {}), "followups": followups if replayable else [], "replayable": replayable}
+            await self.store.set(cache["key"], entry)
+
+    @staticmethod
+    def _describe(spider, request) -> Optional[dict]:
+        if request.method != "GET" or request.body:
+            return None
+        callback, errback = request.callback, request.errback
+        for method in (callback, errback):
+            if method is not None and getattr(method, "__self__", None) is not spider:
+                return None
+        meta = {k: v for k, v in request.meta.items() if not k.startswith("_") and k not in _TRANSIENT_META}
+        followup = {
+            "url": request.url,
+            "callback": callback.__name__ if callback else None,
+            "errback": errback.__name__ if errback else None,
+            "headers": {
+                k.decode("latin-1"): [v.decode("latin-1") for v in values]
+                for k, values in request.headers.items()
+            },
+            "cb_kwargs": request.cb_kwargs,
+            "meta": meta,
+            "priority": request.priority,
+            "dont_filter": request.dont_filter,
+        }
+        try:
+            json.dumps(followup)
+        except (TypeError, ValueError):
+            return None
+        return followup
+
+    @staticmethod
+    def _restore(spider, followup: dict):
+        callback = getattr(spider, followup["callback"]) if followup.get("callback") else None
+        errback = getattr(spider, followup["errback"]) if followup.get("errback") else None
+        return Request(
+            followup["url"],
+            callback=callback,
+            errback=errback,
+            headers=followup.get("headers"),
+            cb_kwargs=followup.get("cb_kwargs") or {},
+            meta=followup.get("meta") or {},
+            priority=followup.get("priority", 0),
+            dont_filter=followup.get("dont_filter", False),
+        )
+
+
+# Meta set by Scrapy / our middlewares, never part of a recorded follow-up
+_TRANSIENT_META = {
+    "conditional_cache", "page_unchanged", "conditional_cache_bypass", "download_timeout",
+    "download_slot", "download_latency", "depth", "retry_times", "redirect_times",
+    "redirect_urls", "redirect_reasons", "playwright_page",
+}
+
+
+async def _aiter(result):
+    if hasattr(result, "__aiter__"):
+        async for obj in result:
+            yield obj
+    else:
+        for obj in result:
+            yield obj
+
+
+class _DomainThrottle:
+    """Throttle state of one downloader slot (normally one domain)."""
+
+    def __init__(self, delay: float, concurrency: int):
+        self.delay = delay
+        self.concurrency = concurrency
+        self.blocked_until = 0.0      # Retry-After / cooldown: no speed-ups before this
+        self.successes = 0            # fast responses since the last concurrency change
+        self.window_started = time.monotonic()
+        self.window_responses = 0
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Adjusts download delay and concurrency per domain from what the site tells us.
+
+    - Latency: the delay moves towards `latency / target_concurrency` (as AutoThrottle
+      does); after `increase_every` responses faster than `target_latency_s` in a row
+      one more concurrent request is allowed, up to `max_concurrency`. Responses
+      slower than twice the target take one away.
+    - 429 / 503 / 403 (`throttle_statuses`): concurrency is halved, the delay is
+      multiplied by `backoff_factor` and raised to `Retry-After` when the site sends
+      one; no speed-ups happen for `cooldown_s` (or until Retry-After passes).
+
+    Limits come from `ParsingSource.config["throttle"]` (passed to the spider as the
+    `throttle` argument), falling back to the ADAPTIVE_THROTTLE_* settings. The start
+    values are the usual DOWNLOAD_DELAY / CONCURRENT_REQUESTS_PER_DOMAIN.
+    """
+
+    DEFAULTS = {
+        "start_delay": None,          # None: DOWNLOAD_DELAY
+        "min_delay": 0.25,
+        "max_delay": 60.0,
+        "max_concurrency": 8,
+        "target_concurrency": 2.0,
+        "target_latency_s": 2.0,
+        "increase_every": 20,
+        "backoff_factor": 2.0,
+        "cooldown_s": 60.0,
+        "throttle_statuses": [429, 503, 403],
+    }
+    RATE_WINDOW_S = 10.0
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        settings = crawler.settings
+        self.defaults = {
+            key: settings.get(f"ADAPTIVE_THROTTLE_{key.upper()}", default)
+            for key, default in self.DEFAULTS.items()
+        }
+        self.start_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.start_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self.config = dict(self.defaults)
+        self.domains: dict[str, _DomainThrottle] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        return s
+
+    def spider_opened(self, spider):
+        overrides = getattr(spider, "throttle_config", None) or {}
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            spider.logger.warning(f"Ignoring unknown throttle options: {sorted(unknown)}")
+        self.config.update({k: v for k, v in overrides.items() if k in self.DEFAULTS})
+        if self.config["start_delay"] is not None:
+            self.start_delay = float(self.config["start_delay"])
+        spider.logger.info(f"Adaptive throttle: {self.config}")
+
+    def _slot(self, request):
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        return key, downloader.slots.get(key)
+
+    def _state(self, key: str, slot) -> _DomainThrottle:
+        state = self.domains.get(key)
+        if state is None:
+            delay = min(max(self.start_delay, self.config["min_delay"]), self.config["max_delay"])
+            state = self.domains[key] = _DomainThrottle(delay, max(1, self.start_concurrency))
+        return state
+
+    def process_response(self, request, response, spider):
+        key, slot = self._slot(request)
+        if slot is None:
+            return response
+        state = self._state(key, slot)
+        now = time.monotonic()
+        cfg = self.config
+
+        if response.status in cfg["throttle_statuses"]:
+            retry_after = _retry_after_seconds(response)
+            state.concurrency = max(1, state.concurrency // 2)
+            state.delay = min(cfg["max_delay"], max(state.delay * cfg["backoff_factor"], cfg["min_delay"], retry_after or 0))
+            state.blocked_until = now + max(cfg["cooldown_s"], retry_after or 0)
+            state.successes = 0
+            throttle_events_total.labels(spider=spider.name, domain=key, status=str(response.status)).inc()
+            spider.logger.info(
+                f"Throttled by {key} ({response.status}, Retry-After={retry_after}): "
+                f"delay={state.delay:.2f}s concurrency={state.concurrency}"
+            )
+        elif response.status < 400:
+            latency = request.meta.get("download_latency")
+            if latency is not None:
+                self._on_latency(state, latency, now)
+
+        slot.delay = state.delay
+        slot.concurrency = state.concurrency
+        self._record_rate(spider, key, state, now)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # A timeout is the slowest possible response
+        if isinstance(exception, (DownloadTimeoutError, TxTimeoutError)):
+            key, slot = self._slot(request)
+            if slot is not None:
+                state = self._state(key, slot)
+                self._on_latency(state, request.meta.get("download_timeout", 180), time.monotonic())
+                slot.delay = state.delay
+                slot.concurrency = state.concurrency
+        return None
+
+    def _on_latency(self, state: _DomainThrottle, latency: float, now: float) -> None:
+        cfg = self.config
+        target_delay = latency / cfg["target_concurrency"]
+        new_delay = (state.delay + target_delay) / 2.0
+        if now < state.blocked_until:
+            # Still backing off: only allow the delay to grow
+            new_delay = max(new_delay, state.delay)
+        state.delay = min(max(new_delay, cfg["min_delay"]), cfg["max_delay"])
+
+        if latency > cfg["target_latency_s"] * 2:
+            state.concurrency = max(1, state.concurrency - 1)
+            state.successes = 0
+        elif latency <= cfg["target_latency_s"] and now >= state.blocked_until:
+            state.successes += 1
+            if state.successes >= cfg["increase_every"] and state.concurrency < cfg["max_concurrency"]:
+                state.concurrency += 1
+                state.successes = 0
+
+    def _record_rate(self, spider, key: str, state: _DomainThrottle, now: float) -> None:
+        state.window_responses += 1
+        elapsed = now - state.window_started
+        if elapsed >= self.RATE_WINDOW_S:
+            throttle_request_rate.labels(spider=spider.name, domain=key).set(state.window_responses / elapsed)
+            state.window_started = now
+            state.window_responses = 0
+        throttle_delay_seconds.labels(spider=spider.name, domain=key).set(state.delay)
+        throttle_concurrency.labels(spider=spider.name, domain=key).set(state.concurrency)
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    """Retry-After as seconds; both delta-seconds and HTTP-date forms are accepted."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.decode("latin-1").strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class IncrementalCrawlSpiderMiddleware:
+    """
+    `incremental` strategy: crawl like `deep`, but only emit new or changed products
+    and stop paginating once the listing is known territory.
+
+    On open the spider fetches the source's known-products filter from the Core API
+    (a Bloom filter of gift_id + current price). Products found in it are dropped
+    before the pipeline. A response that yielded products, all of them known, counts
+    as a known page; after INCREMENTAL_STOP_AFTER_PAGES such pages in a row, further
+    pagination requests (ones that go to the same callback as the page they came
+    from) are dropped. If the filter can't be fetched the crawl runs as `deep`.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stop_after = crawler.settings.getint("INCREMENTAL_STOP_AFTER_PAGES", 3)
+        self.api_base = (
+            crawler.settings.get("CORE_API_BASE_URL")
+            or os.getenv("CORE_API_URL", "http://api:8000/api/v1/internal/ingest-batch").rsplit("/", 1)[0]
+        )
+        self.token = os.getenv("INTERNAL_API_TOKEN", "default_internal_token")
+        self.known: Optional[KnownProducts] = None
+        self.known_pages_in_row = 0
+        self.stopped = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def spider_opened(self, spider):
+        if getattr(spider, "strategy", None) != "incremental" or not getattr(spider, "source_id", None):
+            return
+        import httpx
+
+        url = f"{self.api_base}/sources/{spider.source_id}/known-products"
+        try:
+            async with httpx.AsyncClient(timeout=30.0, headers={"X-Internal-Token": self.token}) as client:
+                resp = await client.get(url)
+                resp.raise_for_status()
+                self.known = KnownProducts(resp.json())
+            spider.logger.info(f"Incremental crawl: {self.known.count} known products loaded")
+        except Exception as e:
+            spider.logger.warning(f"Known-products filter unavailable, falling back to a full crawl: {e}")
+
+    def spider_closed(self, spider):
+        if self.known is not None:
+            stats = self.crawler.stats
+            spider.logger.info(
+                f"Incremental crawl: {stats.get_value('incremental/new_or_changed', 0)} new/changed, "
+                f"{stats.get_value('incremental/known', 0)} known, "
+                f"stopped early: {self.stopped}"
+            )
+
+    async def process_spider_output(self, response, result, spider):
+        if self.known is None:
+            async for obj in _aiter(result):
+                yield obj
+            return
+
+        stats = self.crawler.stats
+        callback = _callback(spider, response.request)
+        products = known = 0
+        pagination = []
+        async for obj in _aiter(result):
+            if isinstance(obj, ProductItem):
+                products += 1
+                if self.known.is_known(obj.get("product_url"), obj.get("price")):
+                    known += 1
+                    stats.inc_value("incremental/known")
+                    continue
+                stats.inc_value("incremental/new_or_changed")
+            elif isinstance(obj, Request) and _callback(spider, obj) == callback:
+                # Held back until we know whether this page was all known
+                pagination.append(obj)
+                continue
+            yield obj
+
+        if products:
+            self.known_pages_in_row = self.known_pages_in_row + 1 if known == products else 0
+            if self.known_pages_in_row >= self.stop_after and not self.stopped:
+                self.stopped = True
+                stats.set_value("incremental/stopped_at", response.url)
+                spider.logger.info(f"Incremental crawl: {self.known_pages_in_row} known pages in a row, stopping pagination")
+        if self.stopped:
+            if pagination:
+                stats.inc_value("incremental/pages_skipped", len(pagination))
+                # Don't let the conditional cache remember this page without its next page
+                response.meta["followups_truncated"] = True
+            return
+        for request in pagination:
+            yield request
+
+
+def _callback(spider, request):
+    # Requests without a callback go to spider.parse; bound methods of the same spider compare equal
+    return (request.callback if request is not None else None) or spider.parse
+
+
+def _site_key(spider) -> str:
+    return getattr(spider, "site_key", None) or spider.name
+
+
+class DownloaderMetricsMiddleware:
+    """
+    Per-spider download metrics: latency, response size, status codes (as the
+    server sent them, before retries), download errors and retry attempts.
+    Sits next to the downloader so it sees every attempt.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls()
+
+    def process_request(self, request, spider):
+        if request.meta.get("retry_times"):
+            request_retries_total.labels(spider=spider.name, site_key=_site_key(spider)).inc()
+        return None
+
+    def process_response(self, request, response, spider):
+        labels = {"spider": spider.name, "site_key": _site_key(spider)}
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            request_latency_seconds.labels(**labels).observe(latency)
+        response_size_bytes.labels(**labels).observe(len(response.body))
+        responses_total.labels(**labels, status=str(response.status)).inc()
+        return response
+
+    def process_exception(self, request, exception, spider):
+        download_errors_total.labels(
+            spider=spider.name, site_key=_site_key(spider), error=type(exception).__name__
+        ).inc()
+        return None
+
+
+class SpiderMetricsMiddleware:
+    """
+    Time spent inside spider callbacks (only the callback's own work: time the
+    consumer spends on yielded objects is excluded) and items/sec per spider.
+    Per-callback totals also go to the crawl stats (parse_time_s/<callback>,
+    parse_calls/<callback>) and are logged when the spider closes.
+    """
+
+    RATE_WINDOW_S = 10.0
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.window_started = time.monotonic()
+        self.window_items = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler.stats)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_spider_output(self, response, result, spider):
+        callback = response.request.callback if response.request is not None else None
+        callback_name = getattr(callback, "__name__", None) or "parse"
+        histogram = parse_duration_seconds.labels(
+            spider=spider.name,
+            site_key=_site_key(spider),
+            callback=callback_name,
+        )
+        spent = 0.0
+        iterator = _aiter(result).__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                obj = await iterator.__anext__()
+            except StopAsyncIteration:
+                spent += time.perf_counter() - started
+                break
+            spent += time.perf_counter() - started
+            yield obj
+        histogram.observe(spent)
+        if self.stats is not None:
+            self.stats.inc_value(f"parse_time_s/{callback_name}", spent)
+            self.stats.inc_value(f"parse_calls/{callback_name}")
+
+    def item_scraped(self, item, response, spider):
+        self.window_items += 1
+        now = time.monotonic()
+        elapsed = now - self.window_started
+        if elapsed >= self.RATE_WINDOW_S:
+            items_per_second.labels(spider=spider.name, site_key=_site_key(spider)).set(self.window_items / elapsed)
+            self.window_started = now
+            self.window_items = 0
+
+    def spider_closed(self, spider):
+        items_per_second.labels(spider=spider.name, site_key=_site_key(spider)).set(0)
+        if self.stats is None:
+            return
+        stats = self.stats.get_stats()
+        for key, calls in sorted(stats.items()):
+            if key.startswith("parse_calls/"):
+                callback = key.split("/", 1)[1]
+                total = stats.get(f"parse_time_s/{callback}", 0.0)
+                spider.logger.info(
+                    f"Parse time of {callback}: {total:.2f}s over {calls} responses ({total / calls * 1000:.1f} ms avg)"
+                )
@@ -0,0 +1,294 @@
+"""
+Record/replay of spider responses for offline parser benchmarks (scripts/replay_spiders.py).
+
+Store layout, one directory per spider:
+
+    <store>/<spider>/spider.json     spider arguments of the recorded crawl (strategy, url)
+    <store>/<spider>/pages.jsonl     one recorded response per line: url, status,
+                                     content type, callback, JSON-safe request meta, body file
+    <store>/<spider>/bodies/*.gz     response bodies (gzip, as decoded by Scrapy)
+    <store>/<spider>/golden.json     expected output per page: items and follow-up requests
+
+Replay builds the responses from the store (the fake downloader) and calls the recorded
+callback of each page directly: no engine, no network, no pipelines. Follow-up requests
+are recorded in the output, not followed.
+"""
+import gc
+import gzip
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Optional
+
+from itemadapter import ItemAdapter, is_item
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+PAGES_FILE = "pages.jsonl"
+SPIDER_FILE = "spider.json"
+GOLDEN_FILE = "golden.json"
+BODIES_DIR = "bodies"
+
+# Spider arguments worth replaying; the rest (source_id, throttle) does not change parsing
+SPIDER_ARGS = ("strategy", "max_products")
+# Meta set by Scrapy and its middlewares, not by the spider
+_INTERNAL_META_PREFIXES = ("download_", "redirect_", "retry_", "_", "depth", "proxy", "handle_httpstatus")
+
+
+def _json_safe_meta(meta: dict) -> dict:
+    safe = {}
+    for key, value in meta.items():
+        if key.startswith(_INTERNAL_META_PREFIXES):
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        safe[key] = value
+    return safe
+
+
+class ReplayStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def spider_dir(self, spider_name: str) -> str:
+        return os.path.join(self.root, spider_name)
+
+    def spiders(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, PAGES_FILE))
+        )
+
+    def save_spider_args(self, spider_name: str, args: dict):
+        os.makedirs(self.spider_dir(spider_name), exist_ok=True)
+        with open(os.path.join(self.spider_dir(spider_name), SPIDER_FILE), "w", encoding="utf-8") as f:
+            json.dump(args, f, ensure_ascii=False, indent=2)
+
+    def spider_args(self, spider_name: str) -> dict:
+        path = os.path.join(self.spider_dir(spider_name), SPIDER_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def add_page(self, spider_name: str, url: str, status: int, content_type: Optional[str],
+                 callback: str, meta: dict, body: bytes) -> dict:
+        directory = self.spider_dir(spider_name)
+        os.makedirs(os.path.join(directory, BODIES_DIR), exist_ok=True)
+        body_file = f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.gz"
+        # mtime=0: re-recording the same page gives the same file
+        with open(os.path.join(directory, BODIES_DIR, body_file), "wb") as f:
+            f.write(gzip.compress(body, mtime=0))
+        page = {
+            "url": url,
+            "status": status,
+            "content_type": content_type,
+            "callback": callback,
+            "meta": meta,
+            "body": body_file,
+        }
+        with open(os.path.join(directory, PAGES_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        return page
+
+    def pages(self, spider_name: str) -> list[dict]:
+        with open(os.path.join(self.spider_dir(spider_name), PAGES_FILE), encoding="utf-8") as f:
+            pages = [json.loads(line) for line in f if line.strip()]
+        # A URL recorded twice (re-recording into the same store) replays its latest response once
+        return list({page["url"]: page for page in pages}.values())
+
+    def load_response(self, spider_name: str, page: dict, callback):
+        with open(os.path.join(self.spider_dir(spider_name), BODIES_DIR, page["body"]), "rb") as f:
+            body = gzip.decompress(f.read())
+        headers = Headers({"Content-Type": page["content_type"]} if page.get("content_type") else {})
+        request = Request(page["url"], callback=callback, meta=dict(page.get("meta") or {}), dont_filter=True)
+        cls = responsetypes.from_args(headers=headers, url=page["url"], body=body)
+        return cls(url=page["url"], status=page["status"], headers=headers, body=body, request=request)
+
+    def golden(self, spider_name: str) -> Optional[dict]:
+        path = os.path.join(self.spider_dir(spider_name), GOLDEN_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_golden(self, spider_name: str, output: dict):
+        with open(os.path.join(self.spider_dir(spider_name), GOLDEN_FILE), "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+class ResponseRecorderMiddleware:
+    """
+    Saves every 2xx response of the crawl into a ReplayStore (REPLAY_RECORD_DIR).
+    Sits after HttpCompressionMiddleware (590) and RedirectMiddleware (600) on the
+    way back, so it stores the decoded body of the final page.
+    """
+
+    def __init__(self, store: ReplayStore):
+        self.store = store
+        self.recorded = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        record_dir = crawler.settings.get("REPLAY_RECORD_DIR")
+        if not record_dir:
+            raise NotConfigured
+        s = cls(ReplayStore(record_dir))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        args = {key: getattr(spider, key) for key in SPIDER_ARGS if getattr(spider, key, None) is not None}
+        args["start_urls"] = list(getattr(spider, "start_urls", []))
+        self.store.save_spider_args(spider.name, args)
+
+    def process_response(self, request, response, spider):
+        if not 200 <= response.status < 300:
+            return response
+        callback = request.callback or spider.parse
+        content_type = response.headers.get("Content-Type")
+        self.store.add_page(
+            spider.name,
+            url=response.url,
+            status=response.status,
+            content_type=content_type.decode("latin-1") if content_type else None,
+            callback=getattr(callback, "__name__", "parse"),
+            meta=_json_safe_meta(request.meta),
+            body=response.body,
+        )
+        self.recorded += 1
+        return response
+
+    def spider_closed(self, spider):
+        spider.logger.info(f"Recorded {self.recorded} responses to {self.store.spider_dir(spider.name)}")
+
+
+def _plain(obj):
+    return ItemAdapter(obj).asdict() if is_item(obj) else str(obj)
+
+
+def page_output(objects) -> dict:
+    """Golden-file form of one callback's output: items as dicts, requests as (url, callback)."""
+    items, requests = [], []
+    for obj in objects:
+        if isinstance(obj, Request):
+            requests.append({"url": obj.url, "callback": getattr(obj.callback, "__name__", None) or "parse"})
+        elif obj is not None:
+            # Round trip through JSON so Decimal, datetime etc. compare the way they are stored
+            items.append(json.loads(json.dumps(_plain(obj), ensure_ascii=False, sort_keys=True, default=str)))
+    return {"items": items, "requests": requests}
+
+
+@dataclass
+class ReplayResult:
+    spider: str
+    pages: int = 0
+    items: int = 0
+    requests: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    alloc_peak_bytes: list[int] = field(default_factory=list)
+    output: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def items_per_s(self) -> float:
+        return self.items / self.wall_s if self.wall_s else 0.0
+
+    @property
+    def cpu_ms_per_page(self) -> float:
+        return self.cpu_s * 1000 / self.pages if self.pages else 0.0
+
+    @property
+    def alloc_kb_per_page(self) -> float:
+        return sum(self.alloc_peak_bytes) / 1024 / len(self.alloc_peak_bytes) if self.alloc_peak_bytes else 0.0
+
+
+def _run_callback(spider, response):
+    callback = response.request.callback
+    return list(callback(response) or [])
+
+
+def replay_spider(spider, store: ReplayStore, repeat: int = 1, measure_alloc: bool = True) -> ReplayResult:
+    """
+    Feeds every recorded page of `spider.name` to its recorded callback `repeat` times.
+    Timings cover the callbacks only (responses are built beforehand); allocations are
+    measured in a separate pass under tracemalloc, which would skew the timings.
+    """
+    result = ReplayResult(spider=spider.name)
+    responses = []
+    for page in store.pages(spider.name):
+        callback = getattr(spider, page["callback"], None)
+        if callback is None:
+            result.errors[page["url"]] = f"spider has no callback {page['callback']}"
+            continue
+        responses.append(store.load_response(spider.name, page, callback))
+
+    for response in responses:
+        try:
+            result.output[response.url] = page_output(_run_callback(spider, response))
+        except Exception as e:
+            result.errors[response.url] = f"{type(e).__name__}: {e}"
+    ok = [r for r in responses if r.url in result.output]
+
+    gc.collect()
+    for _ in range(repeat):
+        for response in ok:
+            # The parsed tree is cached on the response; a fresh copy parses the page again
+            fresh = response.replace()
+            wall, cpu = time.perf_counter(), time.process_time()
+            objects = _run_callback(spider, fresh)
+            result.wall_s += time.perf_counter() - wall
+            result.cpu_s += time.process_time() - cpu
+            result.pages += 1
+            result.items += sum(1 for obj in objects if not isinstance(obj, Request))
+            result.requests += sum(1 for obj in objects if isinstance(obj, Request))
+
+    if measure_alloc and ok:
+        tracemalloc.start()
+        try:
+            for response in ok:
+                fresh = response.replace()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                objects = _run_callback(spider, fresh)
+                # Peak Python memory above the baseline while the page was parsed
+                result.alloc_peak_bytes.append(tracemalloc.get_traced_memory()[1] - baseline)
+                del objects, fresh
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def diff_golden(expected: dict, actual: dict) -> list[str]:
+    """Human-readable differences between a golden output and a replay output (by page URL)."""
+    problems = []
+    for url in sorted(set(expected) | set(actual)):
+        if url not in actual:
+            problems.append(f"{url}: in golden file, not replayed")
+            continue
+        if url not in expected:
+            problems.append(f"{url}: not in golden file (run with --update-golden)")
+            continue
+        want, got = expected[url], actual[url]
+        for kind in ("items", "requests"):
+            if len(want[kind]) != len(got[kind]):
+                problems.append(f"{url}: {len(got[kind])} {kind}, golden has {len(want[kind])}")
+                continue
+            for index, (w, g) in enumerate(zip(want[kind], got[kind])):
+                if w != g:
+                    fields = sorted(k for k in set(w) | set(g) if w.get(k) != g.get(k))
+                    problems.append(f"{url}: {kind}[{index}] differs in {', '.join(fields)}")
+                    break
+    return problems
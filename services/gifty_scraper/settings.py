@@ -23,10 +23,19 @@ ROBOTSTXT_OBEY = False # Often better to disable for aggressive Russian sites
 
 # Concurrency and throttling settings
 #CONCURRENT_REQUESTS = 16
+# Start values only: AdaptiveThrottleMiddleware tunes delay and concurrency per domain
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
 DOWNLOAD_DELAY = 1.5
 RANDOMIZE_DOWNLOAD_DELAY = True
 
+# Defaults of the adaptive throttle; per-source overrides come from ParsingSource.config["throttle"]
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_MIN_DELAY = 0.25
+ADAPTIVE_THROTTLE_MAX_DELAY = 60.0
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 8
+ADAPTIVE_THROTTLE_TARGET_CONCURRENCY = 2.0
+ADAPTIVE_THROTTLE_TARGET_LATENCY_S = 2.0
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = True
 
@@ -45,15 +54,36 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "gifty_scraper.middlewares.GiftyScraperSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "gifty_scraper.middlewares.ConditionalCacheSpiderMiddleware": 543,
+    # Closer to the spider than the cache, so replayed follow-ups are never held back
+    "gifty_scraper.middlewares.IncrementalCrawlSpiderMiddleware": 600,
+    # Innermost, so parse timings cover the callback only
+    "gifty_scraper.middlewares.SpiderMetricsMiddleware": 990,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "gifty_scraper.middlewares.GiftyScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # Sees 429/403 before RetryMiddleware (550) turns them into retries
+    "gifty_scraper.middlewares.AdaptiveThrottleMiddleware": 560,
+    # ETag / Last-Modified / body-hash cache, see CONDITIONAL_CACHE_* below. Below
+    # HttpCompressionMiddleware (590), so it sees responses decompressed and hashes the decoded body
+    "gifty_scraper.middlewares.ConditionalCacheMiddleware": 580,
+    # Next to the downloader: latency, size and status of every attempt
+    "gifty_scraper.middlewares.DownloaderMetricsMiddleware": 950,
+}
+
+# Conditional requests (ETag / Last-Modified / body hash) for repeated crawls, stored in Redis
+CONDITIONAL_CACHE_ENABLED = True
+CONDITIONAL_CACHE_TTL_DAYS = 30
+
+# GiftyBaseSpider.dump_response: save fetched pages for debugging (never in production)
+DEBUG_DUMP_RESPONSES = False
+DEBUG_DUMP_DIR = "debug_dumps"
+
+# "incremental" strategy: stop paginating after this many pages of only known, unchanged products
+INCREMENTAL_STOP_AFTER_PAGES = 3
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
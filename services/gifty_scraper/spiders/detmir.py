@@ -1,5 +1,4 @@
 import re
-import json
 from gifty_scraper.base_spider import GiftyBaseSpider
 from gifty_scraper.items import CategoryItem
 
@@ -56,12 +55,9 @@ class DetmirSpider(GiftyBaseSpider):
         image_lookup = {}
         try:
             # Look for window.appData = JSON.parse("...") which contains the full product list for the page
-            match = re.search(r'window\.appData = JSON\.parse\("(.*?)"\)', response.text)
-            if match:
-                # The content is a JSON string escaped for JS (e.g. \" instead of ")
-                json_raw = match.group(1)
-                json_str = json_raw.encode('utf-8').decode('unicode_escape')
-                app_data = json.loads(json_str)
+            # (a JSON string escaped for JS, e.g. \" instead of ")
+            app_data = self.embedded_js_json(response, b'window.appData = JSON.parse("')
+            if app_data:
                 
                 # Path to products varies but catalog.data.items is common for listing pages
                 items = app_data.get('catalog', {}).get('data', {}).get('items', [])
@@ -1,3 +1,4 @@
+import logging
 import scrapy
 import json
 import re
@@ -58,32 +59,21 @@ class MVideoSpider(GiftyBaseSpider):
         """
         Parses the catalog page. Use __NEXT_DATA__ for initial products and POST API for pagination.
         """
-        category_id = None
-        
-        # DEBUG: Save full response to inspect
-        with open("last_response.html", "w", encoding="utf-8") as f:
-            f.write(response.text)
-            
+        self.dump_response(response, "catalog")
+
+        # Category id: from the URL, else from the page state (searched in the raw bytes, no decode)
         match = re.search(r'-(\d+)$', response.url.rstrip('/'))
-        if not match:
-             match = re.search(r'"categoryId":"(\d+)"', response.text)
-        
-        # Debug: Check what page we actually landed on
-        page_title = response.css('title::text').get()
-        self.logger.info(f"Page Title: {page_title}")
-        self.logger.info(f"Body snippet: {response.text[:500]}")
-        
-        if match:
-            category_id = match.group(1)
-            self.logger.info(f"Found category ID: {category_id}. Using BFF v2 API (GET)...")
-            
-            # API v2 endpoint found in source: products/v2/search
-            # Analysis of 'd' function in JS suggests GET with query params
-            
-        if match:
-             category_id = match.group(1)
+        category_id = match.group(1) if match else None
+        if not category_id:
+            body_match = re.search(rb'"categoryId":"(\d+)"', response.body)
+            category_id = body_match.group(1).decode() if body_match else None
+
+        # response.css would build the DOM of the whole page just for this line
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Page Title: {response.css('title::text').get()}")
+
+        if category_id:
              self.logger.info(f"Found category ID: {category_id}. Using BFF v2 API (GET)...")
-             # ... (API logic remains the same)
              # Verified working params: categoryIds (plural), GET method
              params = {
                  "categoryIds": category_id,
@@ -151,7 +141,7 @@ class MVideoSpider(GiftyBaseSpider):
                  self.logger.warning(f"API Error {response.status}: {response.url}")
                  return
 
-            data = json.loads(response.text)
+            data = self.response_json(response)
             body = data.get('body', {})
             products_ids = body.get('products', [])
             
@@ -218,7 +208,7 @@ class MVideoSpider(GiftyBaseSpider):
         """
         parsed_products = {} # id -> partial item
         try:
-            data = json.loads(response.text)
+            data = self.response_json(response)
             items = data.get('body', {}).get('products', [])
             
             for item in items:
@@ -261,7 +251,7 @@ class MVideoSpider(GiftyBaseSpider):
     def parse_prices(self, response):
         parsed_products = response.meta.get('parsed_products', {})
         try:
-            data = json.loads(response.text)
+            data = self.response_json(response)
             # Structure usually: body -> materialPrices -> [ { productId, price: { salePrice } } ]
             prices_list = data.get('body', {}).get('materialPrices', [])
             
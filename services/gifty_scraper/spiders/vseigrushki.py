@@ -1,6 +1,7 @@
 import scrapy
 import re
 from gifty_scraper.base_spider import GiftyBaseSpider
+from gifty_scraper.extraction import css_first, node_attr, node_text
 
 
 class VseIgrushkiSpider(GiftyBaseSpider):
@@ -20,8 +21,8 @@ class VseIgrushkiSpider(GiftyBaseSpider):
         """
         self.logger.info(f"Parsing catalog: {response.url}")
         
-        # Product cards
-        cards = response.css('div.products__item')
+        # Product cards (fast lxml path, see GiftyBaseSpider.fast_css)
+        cards = self.fast_css(response, 'div.products__item')
         
         if not cards:
             self.logger.warning(f"No product cards found on {response.url}")
@@ -29,15 +30,15 @@ class VseIgrushkiSpider(GiftyBaseSpider):
 
         for card in cards:
             # Title
-            title = card.css('span.products__item-info-name::text').get()
+            title = node_text(css_first(card, 'span.products__item-info-name'))
             if not title:
-                title = card.css('meta[itemprop="name"]::attr(content)').get()
+                title = node_attr(card, 'meta[itemprop="name"]', 'content')
             
             # URL
-            url = card.css('a::attr(href)').get()
+            url = node_attr(card, 'a', 'href')
             
             # Price
-            price_text = card.css('div.products__price-new::text').get()
+            price_text = node_text(css_first(card, 'div.products__price-new'))
             current_price = None
             if price_text:
                 price_match = re.search(r'([\d\s]+)', price_text)
@@ -45,11 +46,11 @@ class VseIgrushkiSpider(GiftyBaseSpider):
                     current_price = price_match.group(1).replace(" ", "").strip()
             
             if not current_price:
-                current_price = card.css('meta[itemprop="price"]::attr(content)').get()
+                current_price = node_attr(card, 'meta[itemprop="price"]', 'content')
             
             # Image
             image = None
-            srcset = card.css('img.lazy-img::attr(data-srcset)').get()
+            srcset = node_attr(card, 'img.lazy-img', 'data-srcset')
             if srcset:
                 # Try to get the 2x version if it exists
                 parts = [p.strip() for p in srcset.split(',')]
@@ -61,10 +62,10 @@ class VseIgrushkiSpider(GiftyBaseSpider):
                     image = parts[0].split()[0]
             
             if not image:
-                image = card.css('img.lazy-img::attr(data-src)').get()
+                image = node_attr(card, 'img.lazy-img', 'data-src')
             
             if not image:
-                image = card.css('meta[itemprop="image"]::attr(content)').get()
+                image = node_attr(card, 'meta[itemprop="image"]', 'content')
             
             if not title or not url:
                 continue
@@ -77,7 +78,7 @@ class VseIgrushkiSpider(GiftyBaseSpider):
                 merchant="VseIgrushki",
                 raw_data={
                     "source": "scrapy_v1",
-                    "product_id": card.css('input[name="product_id"]::attr(value)').get()
+                    "product_id": node_attr(card, 'input[name="product_id"]', 'value')
                 }
             )
 
@@ -0,0 +1,99 @@
+"""
+Compaction of prometheus_client multiprocess files.
+
+In multiprocess mode every process writes its own `<type>_<pid>.db` files into
+PROMETHEUS_MULTIPROC_DIR, and `mark_process_dead` only removes the files of live gauges.
+With one `scrapy crawl` subprocess per task (and, more slowly, with recycled pool
+processes) the counter/histogram files of finished crawls pile up, and every scrape
+reads all of them. `CompactingMultiProcessCollector.compact_dead()` folds the files of
+dead processes into one `<type>_archive.db` per type and deletes them, under the same
+lock the collector holds while reading, so a scrape never counts a value twice or
+misses it.
+"""
+import glob
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+import psutil
+from prometheus_client import multiprocess
+from prometheus_client.mmap_dict import MmapedDict
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE = "archive"
+
+
+# Merge functions take two (value, timestamp) samples of the same key
+def _add(a, b):
+    return a[0] + b[0], max(a[1], b[1])
+
+
+def _min(a, b):
+    return min(a, b)
+
+
+def _max(a, b):
+    return max(a, b)
+
+
+def _latest(a, b):
+    return max(a, b, key=lambda sample: sample[1])
+
+
+# How the values of several processes combine, per file type (as MultiProcessCollector
+# merges them). `gauge_all` keeps a pid label per process and is never compacted; `live*`
+# gauge files are removed by mark_process_dead.
+_MERGE: dict[str, Callable] = {
+    "counter": _add,
+    "histogram": _add,
+    "summary": _add,
+    "gauge_sum": _add,
+    "gauge_min": _min,
+    "gauge_max": _max,
+    "gauge_mostrecent": _latest,
+}
+
+
+class CompactingMultiProcessCollector(multiprocess.MultiProcessCollector):
+    """MultiProcessCollector that can fold the files of dead processes into archive files."""
+
+    def __init__(self, registry, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        super().__init__(registry, path)
+
+    def collect(self):
+        # merge() reads all files eagerly, so holding the lock for the call is enough
+        with self._lock:
+            return super().collect()
+
+    def compact_dead(self) -> int:
+        """Folds the files of processes that are gone into the archive files. Returns the number of files removed."""
+        dead: dict[str, list[str]] = {}
+        for path in glob.glob(os.path.join(self._path, "*.db")):
+            kind, _, pid = os.path.basename(path)[:-3].rpartition("_")
+            if kind not in _MERGE or not pid.isdigit() or psutil.pid_exists(int(pid)):
+                continue
+            dead.setdefault(kind, []).append(path)
+        if not dead:
+            return 0
+
+        with self._lock:
+            for kind, paths in dead.items():
+                archive = MmapedDict(os.path.join(self._path, f"{kind}_{ARCHIVE}.db"))
+                try:
+                    merge = _MERGE[kind]
+                    merged = {key: (value, ts) for key, value, ts in archive.read_all_values()}
+                    for path in paths:
+                        for key, value, ts, _ in MmapedDict.read_all_values_from_file(path):
+                            merged[key] = merge(merged[key], (value, ts)) if key in merged else (value, ts)
+                    for key, (value, ts) in merged.items():
+                        archive.write_value(key, value, ts)
+                finally:
+                    archive.close()
+                for path in paths:
+                    os.remove(path)
+        removed = sum(len(paths) for paths in dead.values())
+        logger.info(f"Compacted metric files of dead processes: {removed} files")
+        return removed
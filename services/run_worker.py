@@ -2,15 +2,30 @@ import asyncio
 import json
 import logging
 import os
-import subprocess
 import httpx
 import aio_pika
 import redis.asyncio as redis
 import psutil
 import socket
+import shutil
 import signal
+import uuid
 from datetime import datetime
-from prometheus_client import start_http_server, Counter, Gauge
+
+# Spider processes write their metrics (gifty_scraper.metrics) here and the worker serves
+# them on METRICS_PORT; must be set before prometheus_client is imported anywhere.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/gifty_scraper_metrics")
+if __name__ == "__main__":
+    # Files of a previous run belong to processes that are gone. Only in the real main
+    # process: spawned crawler pool processes re-import this module as __mp_main__.
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import start_http_server, CollectorRegistry, Counter, Gauge, multiprocess
+
+from admission import AdmissionController
+from crawler_pool import CrawlerPool, process_tree_rss_mb, spider_registry
+from multiproc_metrics import CompactingMultiProcessCollector
 
 # Configure logging
 logging.basicConfig(
@@ -27,33 +42,58 @@ INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "default_internal_token")
 MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", "4"))
 METRICS_PORT = int(os.getenv("METRICS_PORT", "9410"))
 SUBPROCESS_TIMEOUT = int(os.getenv("SUBPROCESS_TIMEOUT", "3600")) # 1 hour default
-MEMORY_THRESHOLD_PCT = 85.0
+# subprocess: one `scrapy crawl` per task; pool: long-lived crawler processes (see crawler_pool.py)
+CRAWLER_MODE = os.getenv("CRAWLER_MODE", "subprocess").lower()
+CRAWLER_POOL_MAX_JOBS = int(os.getenv("CRAWLER_POOL_MAX_JOBS", "50"))
+CRAWLER_POOL_MAX_RSS_MB = float(os.getenv("CRAWLER_POOL_MAX_RSS_MB", "1536"))
+MEMORY_THRESHOLD_PCT = float(os.getenv("MEMORY_THRESHOLD_PCT", "85"))
+CPU_THRESHOLD_PCT = float(os.getenv("CPU_THRESHOLD_PCT", "90"))
+# Memory crawls may reserve in total (predicted); default: MEMORY_THRESHOLD_PCT of RAM
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "0")) or None
+DEFAULT_SPIDER_MEMORY_MB = float(os.getenv("DEFAULT_SPIDER_MEMORY_MB", "300"))
+# Concurrent crawls per site_key (ParsingSource.config["max_concurrent_crawls"] overrides)
+SITE_MAX_CONCURRENT = int(os.getenv("SITE_MAX_CONCURRENT", "1"))
+# Tasks that can't be admitted wait this long in the delay queue, then return to parsing_tasks
+ADMISSION_RETRY_DELAY_S = int(os.getenv("ADMISSION_RETRY_DELAY_S", "30"))
+# Metric files of finished crawl processes are folded into archive files this often
+METRICS_COMPACT_INTERVAL_S = int(os.getenv("METRICS_COMPACT_INTERVAL_S", "300"))
+TASK_QUEUE = "parsing_tasks"
+DELAY_QUEUE = "parsing_tasks.delayed"
 
 # Metrics
 TASKS_PROCESSED = Counter('scraper_tasks_total', 'Total tasks processed', ['site_key', 'status'])
-CONCURRENT_TASKS = Gauge('scraper_concurrent_tasks', 'Number of tasks currently running')
+CONCURRENT_TASKS = Gauge('scraper_concurrent_tasks', 'Number of tasks currently running', multiprocess_mode='livesum')
 
 class ScraperWorker:
     def __init__(self):
         self.available_spiders = []
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
         self.hostname = socket.gethostname()
         self.redis_client = None
         self.is_running = True
+        self.metrics_collector = None
         self.active_processes = {} # {source_id: process}
+        self.pool = None
+        self.channel = None
+        self.admission = None
+
+    def spider_kwargs(self, task):
+        """Spider arguments of a task (what `scrapy crawl -a` gets in subprocess mode)."""
+        kwargs = {
+            "url": task.get("url"),
+            "strategy": task.get("strategy", "deep"),
+            "source_id": task.get("source_id"),
+        }
+        if task.get("run_id"):
+            kwargs["run_id"] = task["run_id"]
+        throttle = (task.get("config") or {}).get("throttle")
+        if throttle:
+            kwargs["throttle"] = json.dumps(throttle)
+        return kwargs
 
     def get_available_spiders(self):
-        """Discovers available Scrapy spiders."""
-        cwd = "/app" if os.path.exists("/app/scrapy.cfg") else "services" if os.path.exists("services/scrapy.cfg") else "."
+        """Discovers available Scrapy spiders from the in-process spider registry."""
         try:
-            result = subprocess.run(
-                ["scrapy", "list"],
-                cwd=cwd,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode == 0:
-                return [s.strip() for s in result.stdout.split('\n') if s.strip()]
+            return sorted(spider_registry())
         except Exception as e:
             logger.error(f"Error listing spiders: {e}")
         return []
@@ -82,6 +122,7 @@ class ScraperWorker:
                     "last_seen": datetime.utcnow().isoformat(),
                     "status": "online",
                     "concurrent_tasks": CONCURRENT_TASKS._value.get(),
+                    "reserved_memory_mb": round(self.admission.reserved_mb) if self.admission else 0,
                     "ram_usage_pct": mem.percent,
                     "pid": os.getpid()
                 }
@@ -94,6 +135,18 @@ class ScraperWorker:
                 logger.error(f"Heartbeat error: {e}")
             await asyncio.sleep(30)
 
+    async def metrics_compaction_loop(self):
+        """
+        Keeps PROMETHEUS_MULTIPROC_DIR from growing by one set of counter/histogram files per
+        crawl (subprocess mode starts a new process for every task).
+        """
+        while self.is_running:
+            await asyncio.sleep(METRICS_COMPACT_INTERVAL_S)
+            try:
+                self.metrics_collector.compact_dead()
+            except Exception as e:
+                logger.error(f"Metrics compaction error: {e}")
+
     async def sync_spiders(self):
         """Registers available spiders with the Core API."""
         self.available_spiders = self.get_available_spiders()
@@ -101,98 +154,190 @@ class ScraperWorker:
         if self.available_spiders:
             await self.report_api("sources/sync-spiders", {"available_spiders": self.available_spiders})
 
-    async def run_spider(self, task):
-        """Executes a single Scrapy crawl in a subprocess with streaming logs."""
-        async with self.semaphore:
-            # Check resource constraints before starting
-            mem = psutil.virtual_memory()
-            if mem.percent > MEMORY_THRESHOLD_PCT:
-                logger.warning(f"Memory usage high ({mem.percent}%). Delaying task {task.get('source_id')}")
-                # We return the task to the queue (nack) or wait? 
-                # Let's wait a bit and retry check
-                while mem.percent > MEMORY_THRESHOLD_PCT:
-                    await asyncio.sleep(30)
-                    mem = psutil.virtual_memory()
-
-            CONCURRENT_TASKS.inc()
-            source_id = task.get("source_id")
-            site_key = task.get("site_key")
-            url = task.get("url")
-            strategy = task.get("strategy", "deep")
-
-            logger.info(f"Starting spider: {site_key} for {url} (ID: {source_id})")
-            await self.report_api(f"sources/{source_id}/report-status", {"status": "running"})
-
-            cwd = "/app" if os.path.exists("/app/scrapy.cfg") else "services" if os.path.exists("services/scrapy.cfg") else "."
-            cmd = [
-                "scrapy", "crawl", site_key,
-                "-a", f"url={url}",
-                "-a", f"strategy={strategy}",
-                "-a", f"source_id={source_id}"
-            ]
+    async def run_spider(self, task, message=None, admission=None):
+        """
+        Executes a single Scrapy crawl (subprocess or crawler pool) and reports the outcome.
+        The task message is acked only now, so a crash mid-crawl gets the task redelivered;
+        a crawl killed by a worker shutdown is requeued without reporting an error.
+        """
+        CONCURRENT_TASKS.inc()
+        # Ingest batches and the final report carry it, so the API buffers this crawl's stats apart
+        task = {**task, "run_id": uuid.uuid4().hex}
+        run_id = task["run_id"]
+        source_id = task.get("source_id")
+        site_key = task.get("site_key")
+        url = task.get("url")
+        peak_rss_mb = None
+        interrupted = False
 
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd
+        logger.info(f"Starting spider: {site_key} for {url} (ID: {source_id})")
+        await self.report_api(f"sources/{source_id}/report-status", {"status": "running", "run_id": run_id})
+
+        try:
+            if self.pool is not None:
+                ok, error_msg, log_buffer, peak_rss_mb = await self.crawl_in_pool(task)
+            else:
+                ok, error_msg, log_buffer, peak_rss_mb = await self.crawl_subprocess(task)
+
+            last_logs = "\n".join(log_buffer)
+            await self.report_api(f"sources/{source_id}/report-logs", {"logs": last_logs})
+
+            if ok:
+                logger.info(f"Spider {site_key} completed successfully.")
+                await self.report_api(f"sources/{source_id}/report-status", {"status": "waiting", "run_id": run_id})
+                TASKS_PROCESSED.labels(site_key=site_key, status='success').inc()
+            elif not self.is_running:
+                logger.info(f"Spider {site_key} stopped by worker shutdown, requeueing the task")
+                interrupted = True
+            else:
+                logger.error(f"Spider {site_key} failed: {error_msg}")
+                await self.report_api(
+                    f"sources/{source_id}/report-error", {"error": error_msg, "is_broken": False, "run_id": run_id}
                 )
-                self.active_processes[source_id] = process
-
-                # Real-time log capture (last N lines)
-                log_buffer = []
-                async def read_stream(stream, is_stderr=False):
-                    while True:
-                        line = await stream.readline()
-                        if line:
-                            decoded = line.decode().strip()
-                            if decoded:
-                                log_buffer.append(decoded)
-                                if len(log_buffer) > 50: log_buffer.pop(0)
-                        else:
-                            break
-
-                log_task = asyncio.create_task(read_stream(process.stderr, True))
-                
+                TASKS_PROCESSED.labels(site_key=site_key, status='error').inc()
+
+        except Exception as e:
+            if not self.is_running:
+                logger.info(f"Crawl for {site_key} stopped by worker shutdown, requeueing the task: {e}")
+                interrupted = True
+            else:
+                logger.error(f"Error running crawl for {site_key}: {e}")
+                await self.report_api(
+                    f"sources/{source_id}/report-error", {"error": str(e), "is_broken": False, "run_id": run_id}
+                )
+        finally:
+            CONCURRENT_TASKS.dec()
+            if admission is not None:
+                await self.admission.release(admission, peak_rss_mb)
+            if message is not None:
                 try:
-                    await asyncio.wait_for(process.wait(), timeout=SUBPROCESS_TIMEOUT)
-                except asyncio.TimeoutError:
-                    logger.error(f"Spider {site_key} timed out after {SUBPROCESS_TIMEOUT}s. Killing...")
-                    process.kill()
-                    await self.report_api(f"sources/{source_id}/report-error", {"error": "Subprocess timeout", "is_broken": False})
-                
-                await log_task
-                
-                last_logs = "\n".join(log_buffer)
-                await self.report_api(f"sources/{source_id}/report-logs", {"logs": last_logs})
-
-                if process.returncode == 0:
-                    logger.info(f"Spider {site_key} completed successfully.")
-                    await self.report_api(f"sources/{source_id}/report-status", {"status": "waiting"})
-                    TASKS_PROCESSED.labels(site_key=site_key, status='success').inc()
-                else:
-                    err_hint = log_buffer[-1] if log_buffer else "Unknown error"
-                    error_msg = f"Scrapy exit code {process.returncode}. Last line: {err_hint}"
-                    logger.error(f"Spider {site_key} failed: {error_msg}")
-                    await self.report_api(f"sources/{source_id}/report-error", {"error": error_msg, "is_broken": False})
-                    TASKS_PROCESSED.labels(site_key=site_key, status='error').inc()
+                    if interrupted:
+                        await message.nack(requeue=True)
+                    else:
+                        await message.ack()
+                except Exception as e:
+                    # Channel lost mid-crawl: the broker redelivers the task
+                    logger.warning(f"Failed to settle task of source {source_id}: {e}")
 
-            except Exception as e:
-                logger.error(f"Error running subprocess for {site_key}: {e}")
-                await self.report_api(f"sources/{source_id}/report-error", {"error": str(e), "is_broken": False})
-            finally:
-                self.active_processes.pop(source_id, None)
-                CONCURRENT_TASKS.dec()
+    async def crawl_subprocess(self, task):
+        """
+        Runs `scrapy crawl` in a fresh subprocess with streaming logs.
+        Returns (ok, error, last log lines, peak RSS in MB).
+        """
+        source_id = task.get("source_id")
+        site_key = task.get("site_key")
+        cwd = "/app" if os.path.exists("/app/scrapy.cfg") else "services" if os.path.exists("services/scrapy.cfg") else "."
+        cmd = ["scrapy", "crawl", site_key]
+        for key, value in self.spider_kwargs(task).items():
+            cmd += ["-a", f"{key}={value}"]
 
-    async def process_message(self, message: aio_pika.IncomingMessage):
-        """Callback for incoming RabbitMQ messages."""
-        async with message.process():
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        self.active_processes[source_id] = process
+        try:
+            # Real-time log capture (last N lines)
+            log_buffer = []
+            async def read_stream(stream, is_stderr=False):
+                while True:
+                    line = await stream.readline()
+                    if line:
+                        decoded = line.decode().strip()
+                        if decoded:
+                            log_buffer.append(decoded)
+                            if len(log_buffer) > 50: log_buffer.pop(0)
+                    else:
+                        break
+
+            log_task = asyncio.create_task(read_stream(process.stderr, True))
+
+            peak_rss_mb = 0.0
+            async def sample_memory():
+                nonlocal peak_rss_mb
+                while True:
+                    peak_rss_mb = max(peak_rss_mb, process_tree_rss_mb(process.pid))
+                    await asyncio.sleep(5)
+
+            sampler = asyncio.create_task(sample_memory())
+            timed_out = False
             try:
-                task = json.loads(message.body.decode())
-                asyncio.create_task(self.run_spider(task))
-            except Exception as e:
-                logger.error(f"Error decoding task message: {e}")
+                await asyncio.wait_for(process.wait(), timeout=SUBPROCESS_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Reported once by run_spider, like a pool timeout
+                logger.error(f"Spider {site_key} timed out after {SUBPROCESS_TIMEOUT}s. Killing...")
+                timed_out = True
+                process.kill()
+                await process.wait()
+
+            sampler.cancel()
+            await log_task
+        finally:
+            self.active_processes.pop(source_id, None)
+            multiprocess.mark_process_dead(process.pid)
+
+        err_hint = log_buffer[-1] if log_buffer else "Unknown error"
+        if timed_out:
+            return False, f"Subprocess timeout. Last line: {err_hint}", log_buffer, peak_rss_mb
+        if process.returncode == 0:
+            return True, None, log_buffer, peak_rss_mb
+        return False, f"Scrapy exit code {process.returncode}. Last line: {err_hint}", log_buffer, peak_rss_mb
+
+    async def crawl_in_pool(self, task):
+        """Runs the crawl on a long-lived pool process. Returns (ok, error, last log lines, peak RSS in MB)."""
+        result = await self.pool.run(
+            {"site_key": task.get("site_key"), "spider_kwargs": self.spider_kwargs(task)},
+            timeout=SUBPROCESS_TIMEOUT,
+        )
+        logs = result.get("logs") or []
+        peak = result.get("peak_rss_mb")
+        if result["status"] == "success":
+            return True, None, logs, peak
+        err_hint = logs[-1] if logs else "Unknown error"
+        return False, f"{result.get('error') or result['status']}. Last line: {err_hint}", logs, peak
+
+    async def process_message(self, message: aio_pika.IncomingMessage):
+        """
+        Callback for incoming RabbitMQ messages. Admitted tasks start right away and are
+        acked when the crawl ends; the rest go back to the queue through the delay queue.
+        """
+        try:
+            task = json.loads(message.body.decode())
+        except Exception as e:
+            logger.error(f"Error decoding task message: {e}")
+            await message.reject(requeue=False)
+            return
+
+        task_id = f"{task.get('source_id')}:{message.delivery_tag}"
+        admission, reason = await self.admission.try_admit(task_id, task)
+        if admission is None:
+            await self.defer_task(message, task, reason)
+            return
+        asyncio.create_task(self.run_spider(task, message, admission))
+
+    async def defer_task(self, message: aio_pika.IncomingMessage, task, reason):
+        """Parks a task in the delay queue; after ADMISSION_RETRY_DELAY_S it returns to parsing_tasks."""
+        headers = dict(message.headers or {})
+        attempts = int(headers.get("x-admission-attempts", 0)) + 1
+        headers["x-admission-attempts"] = attempts
+        if attempts == 1 or attempts % 10 == 0:
+            logger.info(f"Deferring task of source {task.get('source_id')} ({task.get('site_key')}): {reason}, attempt {attempts}")
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    headers=headers,
+                    content_type=message.content_type,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=DELAY_QUEUE,
+            )
+            await message.ack()
+        except Exception as e:
+            logger.error(f"Failed to defer task, requeueing it: {e}")
+            await message.nack(requeue=True)
 
     async def shutdown(self, sig=None):
         """Cleanup on termination."""
@@ -200,6 +345,10 @@ class ScraperWorker:
             logger.info(f"Received exit signal {sig.name}...")
         self.is_running = False
         
+        if self.pool is not None:
+            logger.info("Stopping crawler pool...")
+            self.pool.terminate_all()
+
         if self.active_processes:
             logger.info(f"Killing {len(self.active_processes)} active spiders...")
             for pid, p in self.active_processes.items():
@@ -221,24 +370,54 @@ class ScraperWorker:
                 s, lambda s=s: asyncio.create_task(self.shutdown(s))
             )
 
-        # 1. Start metrics server
-        start_http_server(METRICS_PORT)
+        # 1. Start metrics server (worker + spider processes)
+        registry = CollectorRegistry()
+        self.metrics_collector = CompactingMultiProcessCollector(registry)
+        start_http_server(METRICS_PORT, registry=registry)
         logger.info(f"Metrics server started on port {METRICS_PORT}")
+        asyncio.create_task(self.metrics_compaction_loop())
 
         # 2. Setup Redis and initial spiders sync
         self.redis_client = redis.from_url(REDIS_URL, decode_responses=True)
         await self.sync_spiders()
 
+        if CRAWLER_MODE == "pool":
+            self.pool = CrawlerPool(MAX_CONCURRENT_TASKS, max_jobs=CRAWLER_POOL_MAX_JOBS, max_rss_mb=CRAWLER_POOL_MAX_RSS_MB)
+            await self.pool.start()
+            logger.info(f"Crawler pool started ({MAX_CONCURRENT_TASKS} processes)")
+
         # 3. Start heartbeat
         asyncio.create_task(self.heartbeat_loop())
 
+        self.admission = AdmissionController(
+            self.redis_client,
+            max_tasks=MAX_CONCURRENT_TASKS,
+            memory_budget_mb=MEMORY_BUDGET_MB,
+            memory_threshold_pct=MEMORY_THRESHOLD_PCT,
+            cpu_threshold_pct=CPU_THRESHOLD_PCT,
+            site_max_concurrent=SITE_MAX_CONCURRENT,
+            default_memory_mb=DEFAULT_SPIDER_MEMORY_MB,
+        )
+
         # 4. Connect to RabbitMQ
         connection = await aio_pika.connect_robust(RABBITMQ_URL)
         async with connection:
-            channel = await connection.channel()
+            channel = await connection.channel(publisher_confirms=True)
+            self.channel = channel
+            # Unacked (running) tasks count against the prefetch, leave room for deferring others
             await channel.set_qos(prefetch_count=MAX_CONCURRENT_TASKS * 2)
             
-            queue = await channel.declare_queue("parsing_tasks", durable=True)
+            queue = await channel.declare_queue(TASK_QUEUE, durable=True)
+            # Dead-letters expired messages back into parsing_tasks
+            await channel.declare_queue(
+                DELAY_QUEUE,
+                durable=True,
+                arguments={
+                    "x-message-ttl": ADMISSION_RETRY_DELAY_S * 1000,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": TASK_QUEUE,
+                },
+            )
             logger.info(f"Worker connected. Waiting for tasks (Concurrency: {MAX_CONCURRENT_TASKS})...")
             
             await queue.consume(self.process_message)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from collections import Counter
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import ComputeTask
+from app.repositories.compute import ComputeTaskRepository
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("DATABASE_URL", "").startswith("sqlite"),
+    reason="Compute task queue load test requires PostgreSQL (FOR UPDATE SKIP LOCKED)"
+)
+
+TASKS = 2000
+WORKERS = 64
+
+
+@pytest.mark.asyncio
+async def test_no_double_claims_under_concurrent_polling(postgres_engine):
+    session_factory = async_sessionmaker(postgres_engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        await session.execute(delete(ComputeTask))
+        session.add_all(
+            ComputeTask(
+                id=uuid.uuid4(),
+                task_type="embedding" if i % 3 else "rerank",
+                priority="high" if i % 7 == 0 else "low",
+                status="pending",
+                payload={"n": i},
+            )
+            for i in range(TASKS)
+        )
+        await session.commit()
+
+    async def worker(n: int) -> list:
+        claimed = []
+        while True:
+            # One connection per poll, as with the HTTP endpoint
+            async with session_factory() as session:
+                tasks = await ComputeTaskRepository(session).claim(f"worker-{n}", limit=10)
+                await session.commit()
+            if not tasks:
+                return claimed
+            claimed.extend(t.id for t in tasks)
+
+    results = await asyncio.gather(*(worker(n) for n in range(WORKERS)))
+
+    claims = Counter(task_id for claimed in results for task_id in claimed)
+    assert len(claims) == TASKS
+    assert max(claims.values()) == 1
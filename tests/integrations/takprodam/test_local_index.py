@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from integrations.takprodam import local_index, search
+from integrations.takprodam.client import TakprodamClient
+from integrations.takprodam.local_index import TakprodamLocalIndex
+
+
+def _make_snapshot(path: Path, rows: list[tuple[str, str, float, int]]) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY, product_id INTEGER, product_sku TEXT, title TEXT,
+            image_url TEXT, price REAL, commission REAL, product_category TEXT,
+            marketplace_title TEXT, store_title TEXT, external_link TEXT,
+            tracking_link TEXT, payment_type TEXT, favorite INTEGER,
+            legal_text TEXT, updated_at INTEGER
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO products (id, title, price, product_category, store_title, tracking_link, updated_at) "
+        "VALUES (?, ?, ?, 'Дом', 'Shop', 'https://t.example.com/' || ?, ?)",
+        [(pid, title, price, pid, updated_at) for pid, title, price, updated_at in rows],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_local_search_matches_prefix_and_case(tmp_path):
+    snapshot = tmp_path / "snapshot.sqlite"
+    now = int(time.time())
+    _make_snapshot(snapshot, [("1", "Плед клетчатый", 1999.0, now), ("2", "Кружка керамическая", 500.0, now)])
+
+    index = TakprodamLocalIndex(snapshot_path=str(snapshot))
+    results = index.search_products("ПЛЕД", limit=10)
+
+    assert [r["id"] for r in results] == ["1"]
+    assert results[0]["tracking_link"] == "https://t.example.com/1"
+    assert index.search_products("кер", limit=10)[0]["id"] == "2"
+    assert index.search_products("телевизор", limit=10) == []
+    assert not index.is_stale()
+
+
+def test_index_rebuilds_on_newer_snapshot(tmp_path):
+    snapshot = tmp_path / "snapshot.sqlite"
+    now = int(time.time())
+    _make_snapshot(snapshot, [("1", "Плед", 1999.0, now)])
+
+    index = TakprodamLocalIndex(snapshot_path=str(snapshot))
+    assert index.search_products("кружка") == []
+
+    _make_snapshot(snapshot, [("2", "Кружка", 500.0, now)])
+    stat = os.stat(snapshot)
+    os.utime(snapshot, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert [r["id"] for r in index.search_products("кружка")] == ["2"]
+    # A fresh instance reuses the persisted index file
+    assert TakprodamLocalIndex(snapshot_path=str(snapshot)).search_products("плед")[0]["id"] == "1"
+
+
+def test_search_gift_candidates_prefers_fresh_snapshot(tmp_path, monkeypatch):
+    snapshot = tmp_path / "snapshot.sqlite"
+    _make_snapshot(snapshot, [("1", "Плед", 1999.0, int(time.time()))])
+    monkeypatch.setattr(local_index, "_default_index", TakprodamLocalIndex(snapshot_path=str(snapshot)))
+
+    def _fail(self, *args, **kwargs):
+        raise AssertionError("API must not be called on a local hit")
+
+    monkeypatch.setattr(TakprodamClient, "search_products", _fail)
+
+    results = search.search_gift_candidates("плед")
+    assert [c.gift_id for c in results] == ["takprodam:1"]
+
+
+def test_search_gift_candidates_falls_back_on_stale_snapshot(tmp_path, monkeypatch):
+    snapshot = tmp_path / "snapshot.sqlite"
+    _make_snapshot(snapshot, [("1", "Плед", 1999.0, int(time.time()) - 10 * 86400)])
+    monkeypatch.setattr(
+        local_index, "_default_index", TakprodamLocalIndex(snapshot_path=str(snapshot), max_age_s=86400)
+    )
+    calls = []
+
+    def _api(self, query, limit=50, offset=0, source_id=None):
+        calls.append(query)
+        return [{"id": "api-1", "title": "Плед", "tracking_link": "https://api.example.com/1"}]
+
+    monkeypatch.setattr(TakprodamClient, "search_products", _api)
+
+    results = search.search_gift_candidates("плед")
+    assert calls == ["плед"]
+    assert [c.gift_id for c in results] == ["takprodam:api-1"]
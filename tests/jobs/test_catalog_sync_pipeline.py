@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.jobs.catalog_sync import normalize_batch
+from app.jobs.catalog_sync_pipeline import BatchNormalizer, CatalogSyncPipeline, PageFetcher, UpsertWriter
+
+
+class FakeSyncClient:
+    timeout_s = 5.0
+
+    def __init__(self, total_items: int, delay: float = 0.01, fail_page: int | None = None):
+        self.total_items = total_items
+        self.delay = delay
+        self.fail_page = fail_page
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requested_pages = []
+
+    async def aget_products_page(self, http, page=1, limit=1000, source_id=None):
+        self.requested_pages.append(page)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if page == self.fail_page:
+                raise RuntimeError("boom")
+            start = (page - 1) * limit
+            end = min(start + limit, self.total_items)
+            return [
+                {"id": str(i), "title": f"Item {i}", "price": "100", "tracking_link": f"https://t/{i}"}
+                for i in range(start, end)
+            ]
+        finally:
+            self.in_flight -= 1
+
+
+def _make_writer(write_batch_size: int = 25):
+    session = MagicMock()
+    session.commit = AsyncMock()
+    repo = MagicMock()
+    repo.upsert_changed_products = AsyncMock(
+        side_effect=lambda rows, sync_id=None, changed_ids=None: {"inserted": len(rows), "updated": 0, "unchanged": 0}
+    )
+    return UpsertWriter(session, repo, write_batch_size=write_batch_size), repo, session
+
+
+@pytest.mark.asyncio
+async def test_pipeline_prefetches_and_writes_all_rows():
+    client = FakeSyncClient(total_items=95)
+    writer, repo, session = _make_writer(write_batch_size=25)
+    pipeline = CatalogSyncPipeline(
+        fetcher=PageFetcher(client, batch_size=10, concurrency=4),
+        normalizer=BatchNormalizer(normalize_batch, process_pool_threshold=0),
+        writer=writer,
+    )
+
+    stats = await pipeline.run()
+
+    assert stats.pages == 10
+    assert stats.rows == 95
+    assert writer.inserted == 95
+    assert writer.rows_written == 95
+    assert client.max_in_flight == 4
+    # Rows are coalesced into write batches of 25 (+ remainder), one commit each
+    assert [len(call.args[0]) for call in repo.upsert_changed_products.call_args_list] == [25, 25, 25, 20]
+    assert session.commit.await_count == 4
+
+    summary = stats.as_dict()
+    assert summary["rows_per_sec"] > 0
+    assert set(summary["stages"]) == {"fetch", "normalize", "write"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_respects_max_pages():
+    client = FakeSyncClient(total_items=1000)
+    writer, _, _ = _make_writer()
+    pipeline = CatalogSyncPipeline(
+        fetcher=PageFetcher(client, batch_size=10, concurrency=3, max_pages=5),
+        normalizer=BatchNormalizer(normalize_batch, process_pool_threshold=0),
+        writer=writer,
+    )
+
+    stats = await pipeline.run()
+
+    assert stats.pages == 5
+    assert max(client.requested_pages) == 5
+
+
+@pytest.mark.asyncio
+async def test_pipeline_propagates_fetch_failure():
+    client = FakeSyncClient(total_items=100, fail_page=3)
+    writer, _, _ = _make_writer()
+    pipeline = CatalogSyncPipeline(
+        fetcher=PageFetcher(client, batch_size=10, concurrency=2),
+        normalizer=BatchNormalizer(normalize_batch, process_pool_threshold=0),
+        writer=writer,
+    )
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await pipeline.run()
+
+
+@pytest.mark.asyncio
+async def test_normalizer_uses_process_pool_for_large_pages():
+    normalizer = BatchNormalizer(normalize_batch, process_pool_threshold=5, max_workers=1)
+    items = [{"id": str(i), "title": f"Item {i}", "tracking_link": "https://t"} for i in range(10)]
+
+    rows = await normalizer(items)
+    normalizer.close()
+
+    assert [r["gift_id"] for r in rows] == [f"takprodam:{i}" for i in range(10)]
+    assert all(r["content_hash"] for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_writer_checkpoints_only_committed_pages():
+    writer, repo, session = _make_writer(write_batch_size=25)
+    writer.checkpoint = True
+    writer.sync_id = 7
+    repo.update_sync_run = AsyncMock()
+    rows = normalize_batch([{"id": str(i), "title": "x", "tracking_link": "https://t"} for i in range(30)])
+
+    await writer.add(rows[:10], page=1)
+    await writer.add(rows[10:20], page=2)
+    await writer.add(rows[20:30], page=3)  # flush after 5 rows of page 3
+
+    assert repo.update_sync_run.await_args.args == (7,)
+    assert repo.update_sync_run.await_args.kwargs["next_page"] == 3
+    assert repo.update_sync_run.await_args.kwargs["rows_written"] == 25
+
+    await writer.close()
+    assert repo.update_sync_run.await_args.kwargs["next_page"] == 4
+    assert repo.update_sync_run.await_args.kwargs["rows_written"] == 30
+    assert session.commit.await_count == 2
@@ -0,0 +1,169 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from unittest.mock import patch
+
+from app.db import Base
+from app.jobs import catalog_sync
+from app.models import CatalogSyncRun, Product, ProductDuplicateBucket, ProductPriceHistory
+from app.repositories.catalog import PostgresCatalogRepository
+from tests.jobs.test_catalog_sync_pipeline import FakeSyncClient
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sync.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Product.__table__, ProductDuplicateBucket.__table__, ProductPriceHistory.__table__, CatalogSyncRun.__table__])
+
+    factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    @asynccontextmanager
+    async def session_context():
+        async with factory() as session:
+            yield session
+
+    yield session_context
+    await engine.dispose()
+
+
+async def _run_sync(session_factory, client, **kwargs):
+    with patch.object(catalog_sync, "get_session_context", session_factory), \
+         patch.object(catalog_sync, "TakprodamSyncClient", return_value=client):
+        return await catalog_sync.catalog_sync_full(batch_size=10, concurrency=2, write_batch_size=10, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_sync_resumes_from_checkpoint(session_factory):
+    async with session_factory() as session:
+        session.add(Product(gift_id="takprodam:stale", title="Old", product_url="https://t/old", is_active=True))
+        await session.commit()
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await _run_sync(session_factory, FakeSyncClient(total_items=55, fail_page=4))
+
+    async with session_factory() as session:
+        run = (await session.execute(select(CatalogSyncRun))).scalar_one()
+        assert run.status == "failed"
+        assert run.next_page == 4
+        assert run.rows_written == 30
+        stale = await session.get(Product, "takprodam:stale")
+        assert stale.is_active  # no sweep after a failed attempt
+
+    client = FakeSyncClient(total_items=55)
+    result = await _run_sync(session_factory, client)
+
+    assert result["sync_id"] == run.id
+    assert result["resumed_from_page"] == 4
+    assert min(client.requested_pages) == 4
+    assert result["synced_count"] == 55
+    assert result["inserted_count"] == 55
+    assert result["pages_processed"] == 6
+    assert result["deactivated_count"] == 1
+
+    async with session_factory() as session:
+        run = (await session.execute(select(CatalogSyncRun))).scalar_one()
+        assert run.status == "completed"
+        assert run.attempts == 2
+        active = (await session.execute(select(Product.gift_id).where(Product.is_active.is_(True)))).scalars().all()
+        assert len(active) == 55
+
+    # The next run starts fresh and expects as many pages as the completed one had
+    await _run_sync(session_factory, FakeSyncClient(total_items=55))
+    status = await _status(session_factory)
+    assert status["expected_pages"] == 6
+    assert status["status"] == "completed"
+    assert status["unchanged_count"] == 55
+
+
+async def _add_run(session_factory, sync_id, status, next_page, updated_at=None):
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        await repo.create_sync_run(sync_id, catalog_sync.SOURCE_PREFIX, expected_pages=None)
+        await repo.update_sync_run(sync_id, status=status, next_page=next_page, rows_written=(next_page - 1) * 10)
+        if updated_at is not None:
+            await repo.update_sync_run(sync_id, updated_at=updated_at)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_older_failed_run_is_not_resumed_after_a_completed_one(session_factory):
+    await _add_run(session_factory, 1, "failed", next_page=3)
+    await _add_run(session_factory, 2, "completed", next_page=6)
+
+    client = FakeSyncClient(total_items=25)
+    result = await _run_sync(session_factory, client)
+
+    assert result["sync_id"] not in (1, 2)
+    assert result["resumed_from_page"] is None
+    assert min(client.requested_pages) == 1
+    async with session_factory() as session:
+        old = await session.get(CatalogSyncRun, 1)
+        assert old.status == "failed"
+        assert old.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_run_checkpointing_in_another_process_is_left_alone(session_factory):
+    await _add_run(session_factory, 1, "running", next_page=3)
+
+    client = FakeSyncClient(total_items=25)
+    result = await _run_sync(session_factory, client)
+
+    assert result == {"sync_id": 1, "status": "skipped", "reason": "sync already running"}
+    assert client.requested_pages == []
+    async with session_factory() as session:
+        run = (await session.execute(select(CatalogSyncRun))).scalar_one()
+        assert run.status == "running"
+        assert run.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_running_run_without_recent_checkpoint_is_resumed(session_factory):
+    stale = datetime.now(timezone.utc) - catalog_sync.RESUME_RUNNING_AFTER - timedelta(minutes=1)
+    await _add_run(session_factory, 1, "running", next_page=3, updated_at=stale)
+
+    client = FakeSyncClient(total_items=25)
+    result = await _run_sync(session_factory, client)
+
+    assert result["sync_id"] == 1
+    assert result["resumed_from_page"] == 3
+    assert min(client.requested_pages) == 3
+    async with session_factory() as session:
+        run = await session.get(CatalogSyncRun, 1)
+        assert run.status == "completed"
+        assert run.attempts == 2
+        assert run.attempt_start_page == 3
+
+    # A run that was claimed once can't be claimed again by a concurrent caller
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        await repo.update_sync_run(1, status="running", updated_at=stale)
+        assert await repo.claim_sync_run(1, stale_before=datetime.now(timezone.utc))
+        assert not await repo.claim_sync_run(1, stale_before=stale)
+
+
+async def _status(session_factory):
+    with patch.object(catalog_sync, "get_session_context", session_factory):
+        return await catalog_sync.get_catalog_sync_status()
+
+
+def test_describe_sync_run_eta():
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    run = SimpleNamespace(
+        id=1, status="running", next_page=51, expected_pages=100, attempt_start_page=11,
+        attempt_started_at=now - timedelta(seconds=20), rows_written=50_000, inserted_count=10,
+        updated_count=5, unchanged_count=49_985, deactivated_count=0, attempts=2, error_message=None,
+    )
+
+    status = catalog_sync.describe_sync_run(run, now=now)
+
+    assert status["pages_done"] == 50
+    assert status["progress"] == 0.5
+    assert status["pages_per_sec"] == 2.0
+    assert status["eta_s"] == 25
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.jobs.embeddings import _embed_products
+
+
+def _product(gift_id, cluster_id=None):
+    return SimpleNamespace(
+        gift_id=gift_id,
+        duplicate_cluster_id=cluster_id,
+        content_text=f"text {gift_id}",
+        content_hash=f"hash-{gift_id}",
+    )
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_reuse_cluster_vectors():
+    repo = AsyncMock()
+    repo.get_cluster_embeddings.return_value = {"mvideo:1": [0.5, 0.5]}
+    service = AsyncMock()
+    service.embed_batch_async.side_effect = lambda texts: [[float(len(t))] * 2 for t in texts]
+
+    products = [
+        _product("letu:5", "mvideo:1"),   # cluster already embedded
+        _product("detmir:9", "detmir:9"),  # new cluster, embedded once...
+        _product("ozon:3", "detmir:9"),   # ...and shared within the batch
+        _product("shop:1"),               # not clustered
+    ]
+    rows = await _embed_products(repo, service, products, "bge-m3", "1.0")
+
+    service.embed_batch_async.assert_awaited_once_with(["text detmir:9", "text shop:1"])
+    repo.get_cluster_embeddings.assert_awaited_once_with(
+        ["detmir:9", "mvideo:1"], "bge-m3", "1.0", exclude_ids=["letu:5", "detmir:9", "ozon:3", "shop:1"]
+    )
+    by_id = {r["gift_id"]: r for r in rows}
+    assert by_id["letu:5"]["embedding"] == [0.5, 0.5]
+    assert by_id["ozon:3"]["embedding"] == by_id["detmir:9"]["embedding"]
+    # Every product keeps its own content_hash so it is not picked up again
+    assert by_id["ozon:3"]["content_hash"] == "hash-ozon:3"
+    assert all(r["model_name"] == "bge-m3" and r["dim"] == 2 for r in rows)
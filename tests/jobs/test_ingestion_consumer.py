@@ -0,0 +1,178 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import orjson
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import app.jobs.ingestion_consumer as consumer_module
+from app.jobs.ingestion_consumer import IngestionConsumer
+from app.utils.ingest_queue import InMemoryIngestBroker
+
+
+def _batch(source_id, *urls, run_id=None):
+    return orjson.dumps({
+        "run_id": run_id,
+        "items": [
+            {"title": f"Item {u}", "product_url": u, "price": 100, "site_key": "shop"}
+            for u in urls
+        ],
+        "categories": [],
+        "source_id": source_id,
+    })
+
+
+@asynccontextmanager
+async def _session_factory():
+    yield object()
+
+
+class _FakeService:
+    calls = []
+    runs = []
+    fail_with = None
+    poison_url = None
+
+    def __init__(self, session, redis=None):
+        pass
+
+    async def ingest_batch(self, products, categories, source_id, run_id=None):
+        urls = [p.product_url for p in products]
+        if _FakeService.fail_with is not None:
+            raise _FakeService.fail_with
+        if _FakeService.poison_url in urls:
+            raise IntegrityError("insert", {}, Exception("bad row"))
+        _FakeService.calls.append((source_id, urls))
+        _FakeService.runs.append(run_id)
+        return len(products), {"inserted": 0, "skipped": 0, "backlogged": 0}
+
+
+@pytest.fixture(autouse=True)
+def fake_service(monkeypatch):
+    _FakeService.calls = []
+    _FakeService.runs = []
+    _FakeService.fail_with = None
+    _FakeService.poison_url = None
+    monkeypatch.setattr(consumer_module, "IngestionService", _FakeService)
+    return _FakeService
+
+
+async def _drain(consumer, broker, expected_settled, timeout=2.0):
+    task = asyncio.create_task(consumer.run())
+
+    async def settled():
+        while len(broker.acked) + len(broker.dead_letters) < expected_settled:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(settled(), timeout=timeout)
+    consumer.stop()
+    await asyncio.wait_for(task, timeout=timeout)
+
+
+@pytest.mark.asyncio
+async def test_coalesces_messages_per_source_into_one_upsert(fake_service):
+    broker = InMemoryIngestBroker(prefetch=10)
+    await broker.publish(_batch(1, "a1", "a2"))
+    await broker.publish(_batch(2, "b1"))
+    await broker.publish(_batch(1, "a3"))
+
+    consumer = IngestionConsumer(broker, session_factory=_session_factory, max_wait_s=0.05)
+    await _drain(consumer, broker, expected_settled=3)
+
+    assert sorted(fake_service.calls) == [(1, ["a1", "a2", "a3"]), (2, ["b1"])]
+    assert len(broker.acked) == 3
+    assert broker.unacked == 0
+
+
+@pytest.mark.asyncio
+async def test_batches_of_different_runs_are_not_coalesced(fake_service):
+    broker = InMemoryIngestBroker(prefetch=10)
+    await broker.publish(_batch(1, "old1", run_id="run-1"))
+    await broker.publish(_batch(1, "new1", run_id="run-2"))
+    await broker.publish(_batch(1, "old2", run_id="run-1"))
+
+    consumer = IngestionConsumer(broker, session_factory=_session_factory, max_wait_s=0.05)
+    await _drain(consumer, broker, expected_settled=3)
+
+    assert sorted(zip(fake_service.runs, fake_service.calls)) == [
+        ("run-1", (1, ["old1", "old2"])),
+        ("run-2", (1, ["new1"])),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_item_threshold_reached(fake_service):
+    broker = InMemoryIngestBroker(prefetch=10)
+    for i in range(4):
+        await broker.publish(_batch(1, f"u{i}"))
+
+    consumer = IngestionConsumer(broker, session_factory=_session_factory, max_batch_items=2, max_wait_s=5)
+    await _drain(consumer, broker, expected_settled=4)
+
+    assert fake_service.calls == [(1, ["u0", "u1"]), (1, ["u2", "u3"])]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_limits_unacked_deliveries():
+    broker = InMemoryIngestBroker(prefetch=2)
+    for i in range(3):
+        await broker.publish(_batch(1, f"u{i}"))
+
+    first = await broker.get(timeout=0.05)
+    second = await broker.get(timeout=0.05)
+    assert await broker.get(timeout=0.05) is None
+    assert broker.unacked == 2
+
+    await first.ack()
+    third = await broker.get(timeout=0.05)
+    assert third is not None
+    await second.ack()
+    await third.ack()
+    with pytest.raises(RuntimeError):
+        await third.ack()
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_requeues_without_ack(fake_service):
+    broker = InMemoryIngestBroker(prefetch=10)
+    await broker.publish(_batch(1, "a1"))
+    fake_service.fail_with = OperationalError("commit", {}, Exception("db down"))
+
+    consumer = IngestionConsumer(broker, session_factory=_session_factory, max_wait_s=0.01, retry_delay_s=0.01)
+    task = asyncio.create_task(consumer.run())
+    await asyncio.sleep(0.1)
+    assert broker.acked == []
+    assert broker.dead_letters == []
+
+    # Database is back: the requeued message gets committed and acked
+    fake_service.fail_with = None
+    await _drain_started(consumer, broker, task, expected_acked=1)
+    assert fake_service.calls[-1] == (1, ["a1"])
+
+
+async def _drain_started(consumer, broker, task, expected_acked):
+    async def acked():
+        while len(broker.acked) < expected_acked:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(acked(), timeout=2.0)
+    consumer.stop()
+    await asyncio.wait_for(task, timeout=2.0)
+
+
+@pytest.mark.asyncio
+async def test_bad_messages_are_dead_lettered_and_good_ones_kept(fake_service):
+    broker = InMemoryIngestBroker(prefetch=10)
+    await broker.publish(b"{not json")
+    await broker.publish(orjson.dumps({"items": "nope"}))
+    await broker.publish(_batch(1, "good"))
+    await broker.publish(_batch(1, "poison"))
+    fake_service.poison_url = "poison"
+
+    consumer = IngestionConsumer(broker, session_factory=_session_factory, max_wait_s=0.05)
+    await _drain(consumer, broker, expected_settled=4)
+
+    assert fake_service.calls == [(1, ["good"])]
+    assert broker.acked == [_batch(1, "good")]
+    assert len(broker.dead_letters) == 3
+    assert _batch(1, "poison") in broker.dead_letters
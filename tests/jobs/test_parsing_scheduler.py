@@ -1,7 +1,9 @@
 
 import pytest
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
-from app.jobs.parsing_scheduler import run_parsing_scheduler, activate_discovered_sources
+from app.jobs.parsing_scheduler import run_parsing_scheduler, activate_discovered_sources, default_max_queued
+from app.utils.rabbitmq import InMemoryBroker, RabbitPublisher
 
 @pytest.mark.asyncio
 async def test_run_parsing_scheduler_success():
@@ -15,36 +17,56 @@ async def test_run_parsing_scheduler_success():
     mock_source.config = {}
     
     # Mock repository
+    mock_source.priority = 50
+    
     mock_repo = MagicMock()
-    mock_repo.get_due_sources = AsyncMock(return_value=[mock_source])
-    mock_repo.set_queued = AsyncMock()
+    mock_repo.count_queued = AsyncMock(return_value=0)
+    mock_repo.get_due_window = AsyncMock(return_value=[mock_source])
+    mock_repo.set_queued_many = AsyncMock()
     
     # Mock context manager and other dependencies
     with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx:
         mock_ctx.return_value.__aenter__.return_value = AsyncMock()
         with patch("app.jobs.parsing_scheduler.ParsingRepository", return_value=mock_repo):
-            with patch("app.jobs.parsing_scheduler.publish_parsing_task", return_value=True) as mock_publish:
-                
-                await run_parsing_scheduler()
-                
-                mock_repo.get_due_sources.assert_called_once_with(limit=20)
-                mock_publish.assert_called_once()
-                mock_repo.set_queued.assert_called_once_with(1)
+            broker = InMemoryBroker()
+            
+            await run_parsing_scheduler(publisher=RabbitPublisher(broker))
+            
+            mock_repo.get_due_window.assert_called_once_with(limit=200, per_site=20)
+            assert [t["source_id"] for t in broker.messages("parsing_tasks")] == [1]
+            mock_repo.set_queued_many.assert_called_once_with([1])
 
 @pytest.mark.asyncio
 async def test_run_parsing_scheduler_empty():
     mock_repo = MagicMock()
-    mock_repo.get_due_sources = AsyncMock(return_value=[])
+    mock_repo.count_queued = AsyncMock(return_value=0)
+    mock_repo.get_due_window = AsyncMock(return_value=[])
     
     with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx:
         mock_ctx.return_value.__aenter__.return_value = AsyncMock()
         with patch("app.jobs.parsing_scheduler.ParsingRepository", return_value=mock_repo):
-            with patch("app.jobs.parsing_scheduler.publish_parsing_task") as mock_publish:
-                
-                await run_parsing_scheduler()
-                
-                mock_repo.get_due_sources.assert_called_once()
-                mock_publish.assert_not_called()
+            broker = InMemoryBroker()
+            
+            await run_parsing_scheduler(publisher=RabbitPublisher(broker))
+            
+            mock_repo.get_due_window.assert_called_once()
+            assert broker.queues == {}
+
+@pytest.mark.asyncio
+async def test_run_parsing_scheduler_queue_full():
+    mock_repo = MagicMock()
+    mock_repo.count_queued = AsyncMock(return_value=10)
+    mock_repo.get_due_window = AsyncMock()
+    
+    with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx:
+        mock_ctx.return_value.__aenter__.return_value = AsyncMock()
+        with patch("app.jobs.parsing_scheduler.ParsingRepository", return_value=mock_repo):
+            broker = InMemoryBroker()
+            
+            await run_parsing_scheduler(publisher=RabbitPublisher(broker), max_queued=10)
+            
+            mock_repo.get_due_window.assert_not_called()
+            assert broker.queues == {}
 
 @pytest.mark.asyncio
 async def test_activate_discovered_sources():
@@ -66,6 +88,43 @@ async def test_activate_discovered_sources():
             mock_repo.get_discovered_sources.assert_called_once_with(limit=190)
             mock_repo.activate_sources.assert_called_once_with([101])
 
+def test_default_max_queued_follows_worker_prefetch():
+    settings = SimpleNamespace(scraper_workers=3, scraper_concurrency=4, parsing_max_queued=None)
+    with patch("app.jobs.parsing_scheduler.get_settings", return_value=settings):
+        assert default_max_queued() == 24
+
+        settings.parsing_max_queued = 5
+        assert default_max_queued() == 5
+
+@pytest.mark.asyncio
+async def test_run_parsing_scheduler_fills_worker_prefetch_by_default():
+    sources = []
+    for i in range(20):
+        source = MagicMock()
+        source.id = i
+        source.site_key = f"shop{i}"
+        source.priority = 50
+        source.config = {}
+        sources.append(source)
+
+    mock_repo = MagicMock()
+    mock_repo.count_queued = AsyncMock(return_value=3)
+    mock_repo.get_due_window = AsyncMock(return_value=sources)
+    mock_repo.set_queued_many = AsyncMock()
+    settings = SimpleNamespace(scraper_workers=1, scraper_concurrency=4, parsing_max_queued=None)
+
+    with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx, \
+         patch("app.jobs.parsing_scheduler.get_settings", return_value=settings):
+        mock_ctx.return_value.__aenter__.return_value = AsyncMock()
+        with patch("app.jobs.parsing_scheduler.ParsingRepository", return_value=mock_repo):
+            broker = InMemoryBroker()
+
+            await run_parsing_scheduler(publisher=RabbitPublisher(broker))
+
+            # 8 prefetch slots, 3 of them still hold queued tasks
+            assert len(broker.messages("parsing_tasks")) == 5
+            assert len(mock_repo.set_queued_many.call_args.args[0]) == 5
+
 @pytest.mark.asyncio
 async def test_activate_discovered_sources_quota_full():
     mock_repo = MagicMock()
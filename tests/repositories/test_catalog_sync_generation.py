@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import Product, ProductPriceHistory
+from app.repositories.catalog import PostgresCatalogRepository
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'catalog.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Product.__table__, ProductPriceHistory.__table__])
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        yield session
+
+    await engine.dispose()
+
+
+def _product(gift_id: str):
+    return {
+        "gift_id": gift_id,
+        "title": f"Title {gift_id}",
+        "product_url": f"https://example.com/{gift_id}",
+        "is_active": True,
+    }
+
+
+async def _active_ids(session) -> set[str]:
+    result = await session.execute(select(Product.gift_id).where(Product.is_active.is_(True)))
+    return set(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_upsert_stamps_sync_generation(sqlite_session):
+    repo = PostgresCatalogRepository(sqlite_session)
+
+    await repo.upsert_products([_product("takprodam:1")], sync_id=100)
+    await sqlite_session.commit()
+
+    result = await sqlite_session.execute(select(Product.last_seen_sync_id))
+    assert result.scalar_one() == 100
+
+
+@pytest.mark.asyncio
+async def test_deactivate_unseen_sweeps_older_generations_in_batches(sqlite_session):
+    repo = PostgresCatalogRepository(sqlite_session)
+
+    await repo.upsert_products([_product(f"takprodam:{i:02d}") for i in range(12)], sync_id=1)
+    await repo.upsert_products([_product("mrgeek:1")])
+    await sqlite_session.commit()
+
+    # Second generation only sees three of the takprodam products
+    await repo.upsert_products([_product(f"takprodam:{i:02d}") for i in (0, 5, 11)], sync_id=2)
+    await sqlite_session.commit()
+
+    deactivated = await repo.deactivate_unseen("takprodam", sync_id=2, batch_size=4)
+
+    assert deactivated == 9
+    assert await _active_ids(sqlite_session) == {"takprodam:00", "takprodam:05", "takprodam:11", "mrgeek:1"}
+
+    # Re-running the sweep is a no-op
+    assert await repo.deactivate_unseen("takprodam", sync_id=2, batch_size=4) == 0
+
+
+async def _row(session, gift_id: str):
+    result = await session.execute(select(Product).where(Product.gift_id == gift_id))
+    product = result.scalar_one()
+    await session.refresh(product)
+    return product
+
+
+@pytest.mark.asyncio
+async def test_upsert_changed_products_skips_unchanged_rows(sqlite_session):
+    repo = PostgresCatalogRepository(sqlite_session)
+
+    def row(gift_id, title="Plaid", price=100.0):
+        return {**_product(gift_id), "title": title, "price": price, "content_hash": f"hash-{title}", "raw": {"t": title}}
+
+    counts = await repo.upsert_changed_products([row("takprodam:1"), row("takprodam:2"), row("takprodam:3")], sync_id=1)
+    await sqlite_session.commit()
+    assert counts == {"inserted": 3, "updated": 0, "unchanged": 0}
+
+    await sqlite_session.execute(
+        update(Product).where(Product.gift_id == "takprodam:3").values(llm_gift_score=7.0)
+    )
+    # Back-date the rows so a bumped updated_at is visible at second resolution
+    await sqlite_session.execute(update(Product).values(updated_at=datetime(2026, 1, 1)))
+    await sqlite_session.commit()
+    unchanged_before = await _row(sqlite_session, "takprodam:1")
+    stamp = unchanged_before.updated_at
+
+    counts = await repo.upsert_changed_products(
+        [row("takprodam:1"), row("takprodam:2", price=150.0), row("takprodam:3", title="Mug"), row("takprodam:4")],
+        sync_id=2,
+    )
+    await sqlite_session.commit()
+    assert counts == {"inserted": 1, "updated": 2, "unchanged": 1}
+
+    unchanged = await _row(sqlite_session, "takprodam:1")
+    assert unchanged.last_seen_sync_id == 2
+    assert unchanged.updated_at == stamp
+
+    repriced = await _row(sqlite_session, "takprodam:2")
+    assert float(repriced.price) == 150.0
+    assert repriced.last_seen_sync_id == 2
+    assert repriced.updated_at > stamp
+
+    retitled = await _row(sqlite_session, "takprodam:3")
+    assert retitled.title == "Mug"
+    assert retitled.raw == {"t": "Mug"}
+    assert retitled.updated_at > stamp
+    # Columns absent from the incoming rows are not wiped by the upsert
+    assert retitled.llm_gift_score == 7.0
+
+
+@pytest.mark.asyncio
+async def test_swept_product_is_reactivated_when_it_reappears_unchanged(sqlite_session):
+    repo = PostgresCatalogRepository(sqlite_session)
+
+    def row(gift_id):
+        return {**_product(gift_id), "price": 100.0, "content_hash": "hash"}
+
+    await repo.upsert_changed_products([row("takprodam:1"), row("takprodam:2")], sync_id=1)
+    await repo.upsert_changed_products([row("takprodam:1")], sync_id=2)
+    await sqlite_session.commit()
+    assert await repo.deactivate_unseen("takprodam", sync_id=2) == 1
+    await sqlite_session.commit()
+
+    # Same content and price as before the sweep
+    counts = await repo.upsert_changed_products([row("takprodam:1"), row("takprodam:2")], sync_id=3)
+    await sqlite_session.commit()
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 1}
+    assert await _active_ids(sqlite_session) == {"takprodam:1", "takprodam:2"}
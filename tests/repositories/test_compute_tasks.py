@@ -0,0 +1,123 @@
+import asyncio
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import ComputeTask
+from app.repositories.compute import MAX_ATTEMPTS, ComputeTaskRepository
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'compute.sqlite'}", future=True, connect_args={"timeout": 30}
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[ComputeTask.__table__])
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
+
+
+async def _add_tasks(session_factory, *specs):
+    """specs: (priority, minutes before NOW it was created)"""
+    ids = []
+    async with session_factory() as session:
+        for priority, age_min in specs:
+            task = ComputeTask(
+                id=uuid.uuid4(),
+                task_type="embedding",
+                priority=priority,
+                status="pending",
+                payload={"texts": ["x"]},
+                created_at=NOW - timedelta(minutes=age_min),
+            )
+            session.add(task)
+            ids.append(task.id)
+        await session.commit()
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_claim_takes_high_priority_first_then_oldest(session_factory):
+    low_old, high_new, low_new, high_old = await _add_tasks(
+        session_factory, ("low", 30), ("high", 1), ("low", 2), ("high", 10)
+    )
+    async with session_factory() as session:
+        tasks = await ComputeTaskRepository(session).claim("w1", limit=3, now=NOW)
+        await session.commit()
+
+    assert [t.id for t in tasks] == [high_old, high_new, low_old]
+    assert {(t.status, t.worker_id, t.attempts) for t in tasks} == {("processing", "w1", 1)}
+    assert all(t.lease_expires_at is not None for t in tasks)
+
+    async with session_factory() as session:
+        rest = await ComputeTaskRepository(session).claim("w2", limit=10, now=NOW)
+    assert [t.id for t in rest] == [low_new]
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed_and_heartbeat_keeps_it(session_factory):
+    kept, abandoned = await _add_tasks(session_factory, ("high", 2), ("high", 1))
+    async with session_factory() as session:
+        repo = ComputeTaskRepository(session)
+        await repo.claim("w1", limit=2, lease_s=60, now=NOW)
+        # w1 still works on `kept` only
+        assert await repo.heartbeat("w1", [kept], lease_s=60, now=NOW + timedelta(seconds=50)) == [kept]
+        await session.commit()
+
+        # Lease of `abandoned` is over; `kept` was extended
+        reclaimed = await repo.claim("w2", limit=10, lease_s=60, now=NOW + timedelta(seconds=70))
+        await session.commit()
+        assert [(t.id, t.worker_id, t.attempts) for t in reclaimed] == [(abandoned, "w2", 2)]
+
+        # w1 learns it lost the task; w2's heartbeat works
+        assert await repo.heartbeat("w1", [kept, abandoned], now=NOW + timedelta(seconds=80)) == [kept]
+        assert await repo.heartbeat("w2", [abandoned], now=NOW + timedelta(seconds=80)) == [abandoned]
+
+
+@pytest.mark.asyncio
+async def test_task_fails_after_max_expired_leases(session_factory):
+    (task_id,) = await _add_tasks(session_factory, ("low", 1))
+    async with session_factory() as session:
+        repo = ComputeTaskRepository(session)
+        now = NOW
+        for attempt in range(MAX_ATTEMPTS):
+            claimed = await repo.claim(f"w{attempt}", lease_s=60, now=now)
+            assert [t.id for t in claimed] == [task_id]
+            now += timedelta(seconds=61)
+        assert await repo.claim("late", now=now) == []
+        await session.commit()
+
+    async with session_factory() as session:
+        task = (await session.execute(select(ComputeTask).where(ComputeTask.id == task_id))).scalar_one()
+        assert task.status == "failed"
+        assert "Lease expired" in task.error
+
+
+@pytest.mark.asyncio
+async def test_concurrent_workers_never_claim_the_same_task(session_factory):
+    task_ids = await _add_tasks(session_factory, *[("high" if i % 5 == 0 else "low", i) for i in range(300)])
+
+    async def worker(n: int) -> list:
+        claimed = []
+        while True:
+            async with session_factory() as session:
+                tasks = await ComputeTaskRepository(session).claim(f"w{n}", limit=7, now=NOW)
+                await session.commit()
+            if not tasks:
+                return claimed
+            claimed.extend(t.id for t in tasks)
+            await asyncio.sleep(0)
+
+    results = await asyncio.gather(*(worker(n) for n in range(24)))
+    claims = Counter(task_id for claimed in results for task_id in claimed)
+    assert set(claims) == set(task_ids)
+    assert max(claims.values()) == 1
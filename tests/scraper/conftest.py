@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The scraper and the worker import their modules top-level (gifty_scraper, admission, crawler_pool)
+SERVICES = Path(__file__).resolve().parents[2] / "services"
+if str(SERVICES) not in sys.path:
+    sys.path.append(str(SERVICES))
@@ -0,0 +1,178 @@
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TimeoutError as TxTimeoutError
+
+from gifty_scraper import middlewares
+from gifty_scraper.middlewares import AdaptiveThrottleMiddleware
+
+SHOP = "https://shop.example.com"
+OTHER = "https://other.example.com"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeDownloader:
+    """Slots keyed by host, as the real downloader does without per-IP concurrency."""
+
+    def __init__(self):
+        self.slots = {}
+
+    def get_slot_key(self, request):
+        return urlparse(request.url).hostname
+
+    def slot(self, base):
+        key = urlparse(base).hostname
+        return self.slots.setdefault(key, SimpleNamespace(delay=0.0, concurrency=0))
+
+
+class ShopSpider(Spider):
+    name = "shop"
+    throttle_config = {"increase_every": 3, "cooldown_s": 30.0}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(middlewares, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def downloader():
+    return FakeDownloader()
+
+
+@pytest.fixture
+def spider():
+    return ShopSpider()
+
+
+@pytest.fixture
+def throttle(clock, downloader, spider):
+    settings = get_crawler(settings_dict={"DOWNLOAD_DELAY": 1.0, "CONCURRENT_REQUESTS_PER_DOMAIN": 4}).settings
+    mw = AdaptiveThrottleMiddleware(SimpleNamespace(settings=settings, engine=SimpleNamespace(downloader=downloader)))
+    mw.spider_opened(spider)
+    return mw
+
+
+def _respond(mw, spider, base=SHOP, status=200, latency=0.5, headers=None):
+    request = Request(f"{base}/catalog/", meta={"download_latency": latency})
+    response = Response(request.url, status=status, headers=headers, request=request)
+    assert mw.process_response(request, response, spider) is response
+    return mw.domains[urlparse(base).hostname]
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttle_status_halves_concurrency_and_backs_off(throttle, spider, downloader, clock, status):
+    slot = downloader.slot(SHOP)
+
+    state = _respond(throttle, spider, status=status)
+
+    assert state.concurrency == 2
+    assert state.delay == 2.0
+    assert state.blocked_until == clock.now + 30.0
+    assert (slot.delay, slot.concurrency) == (2.0, 2)
+
+
+def test_retry_after_raises_delay_and_cooldown(throttle, spider, downloader, clock):
+    downloader.slot(SHOP)
+
+    state = _respond(throttle, spider, status=429, headers={"Retry-After": "120"})
+
+    assert state.delay == 60.0  # capped by max_delay
+    assert state.blocked_until == clock.now + 120.0
+
+
+def test_other_errors_leave_the_throttle_alone(throttle, spider, downloader):
+    slot = downloader.slot(SHOP)
+
+    state = _respond(throttle, spider, status=500)
+
+    assert (state.delay, state.concurrency) == (1.0, 4)
+    assert (slot.delay, slot.concurrency) == (1.0, 4)
+
+
+def test_slow_responses_raise_delay_and_drop_concurrency(throttle, spider, downloader):
+    downloader.slot(SHOP)
+
+    state = _respond(throttle, spider, latency=10.0)
+    # Halfway between the current delay and latency / target_concurrency
+    assert state.delay == (1.0 + 10.0 / 2.0) / 2.0
+    assert state.concurrency == 3
+
+    _respond(throttle, spider, latency=10.0)
+    assert state.concurrency == 2
+
+
+def test_timeout_counts_as_slowest_response(throttle, spider, downloader):
+    slot = downloader.slot(SHOP)
+    request = Request(f"{SHOP}/catalog/", meta={"download_timeout": 20})
+
+    assert throttle.process_exception(request, TxTimeoutError(), spider) is None
+
+    state = throttle.domains["shop.example.com"]
+    assert state.delay == (1.0 + 20 / 2.0) / 2.0
+    assert state.concurrency == 3
+    assert slot.delay == state.delay
+
+
+def test_fast_responses_recover_only_after_cooldown(throttle, spider, downloader, clock):
+    downloader.slot(SHOP)
+    state = _respond(throttle, spider, status=429)
+    assert (state.delay, state.concurrency) == (2.0, 2)
+
+    # Within the cooldown fast responses neither lower the delay nor add concurrency
+    for _ in range(5):
+        _respond(throttle, spider, latency=0.5)
+    assert state.delay == 2.0
+    assert state.concurrency == 2
+
+    clock.advance(31)
+    for _ in range(3):
+        _respond(throttle, spider, latency=0.5)
+    assert state.concurrency == 3
+    assert state.delay < 2.0
+
+    # The delay settles towards latency / target_concurrency, never below min_delay
+    for _ in range(30):
+        _respond(throttle, spider, latency=0.5)
+    assert state.delay == pytest.approx(0.25, abs=1e-3)
+    assert state.concurrency == 8  # back up to max_concurrency
+
+
+def test_state_is_kept_per_domain(throttle, spider, downloader):
+    shop_slot = downloader.slot(SHOP)
+    other_slot = downloader.slot(OTHER)
+
+    _respond(throttle, spider, base=SHOP, status=429)
+    other = _respond(throttle, spider, base=OTHER, latency=0.5)
+
+    assert (shop_slot.delay, shop_slot.concurrency) == (2.0, 2)
+    assert other.concurrency == 4
+    assert other_slot.delay == other.delay < 1.0
+    assert throttle.domains["shop.example.com"] is not other
+
+
+def test_response_without_slot_is_passed_through(throttle, spider):
+    request = Request(f"{SHOP}/catalog/")
+    response = Response(request.url, status=429, request=request)
+
+    assert throttle.process_response(request, response, spider) is response
+    assert throttle.domains == {}
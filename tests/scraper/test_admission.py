@@ -0,0 +1,170 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import fakeredis.aioredis
+import pytest
+
+import admission as admission_module
+import run_worker
+from admission import EWMA_ALPHA, MEMORY_PROFILE_KEY, AdmissionController
+
+
+class FakePsutil:
+    """Live host usage as the test sets it."""
+
+    def __init__(self):
+        self.memory_percent = 40.0
+        self.cpu = 10.0
+
+    def virtual_memory(self):
+        return SimpleNamespace(total=16 * 1024**3, percent=self.memory_percent)
+
+    def cpu_percent(self, interval=None):
+        return self.cpu
+
+
+@pytest.fixture
+def host(monkeypatch):
+    host = FakePsutil()
+    monkeypatch.setattr(admission_module, "psutil", host)
+    return host
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def controller(host, redis):
+    return AdmissionController(redis, max_tasks=4, memory_budget_mb=1000, site_max_concurrent=1, default_memory_mb=300)
+
+
+def _task(site_key, **config):
+    return {"source_id": 1, "site_key": site_key, "config": config}
+
+
+@pytest.mark.asyncio
+async def test_admits_while_predicted_memory_fits_the_budget(controller, redis):
+    await redis.hset(MEMORY_PROFILE_KEY, "detmir", 450)
+
+    first, reason = await controller.try_admit("t1", _task("mvideo"))
+    assert reason is None and first.reserved_mb == 300
+    second, reason = await controller.try_admit("t2", _task("detmir"))
+    assert reason is None and second.reserved_mb == 450
+    assert controller.reserved_mb == 750
+
+    # 750 + 300 > 1000
+    third, reason = await controller.try_admit("t3", _task("vseigrushki"))
+    assert third is None and reason == "memory_budget"
+    assert set(controller.running) == {"t1", "t2"}
+
+
+@pytest.mark.asyncio
+async def test_idle_worker_admits_a_task_over_the_budget(controller, redis):
+    await redis.hset(MEMORY_PROFILE_KEY, "mvideo", 2500)
+
+    admitted, reason = await controller.try_admit("t1", _task("mvideo"))
+
+    assert reason is None and admitted.reserved_mb == 2500
+
+
+@pytest.mark.asyncio
+async def test_rejection_reasons(controller, host):
+    await controller.try_admit("t1", _task("mvideo"))
+
+    assert (await controller.try_admit("t2", _task("mvideo")))[1] == "site_limit"
+    assert (await controller.try_admit("t2", _task("mvideo", max_concurrent_crawls=2)))[0] is not None
+
+    host.memory_percent = 90.0
+    assert (await controller.try_admit("t3", _task("detmir")))[1] == "memory"
+    host.memory_percent, host.cpu = 40.0, 95.0
+    assert (await controller.try_admit("t3", _task("detmir")))[1] == "cpu"
+
+
+@pytest.mark.asyncio
+async def test_release_folds_peak_rss_into_the_shared_estimate(controller, redis):
+    admitted, _ = await controller.try_admit("t1", _task("mvideo"))
+    await controller.release(admitted, peak_rss_mb=500)
+
+    # The first observation replaces the default, later ones are averaged in
+    assert controller.running == {}
+    assert float(await redis.hget(MEMORY_PROFILE_KEY, "mvideo")) == 500
+    assert await controller.estimate_mb("mvideo") == 500
+
+    admitted, _ = await controller.try_admit("t2", _task("mvideo"))
+    assert admitted.reserved_mb == 500
+    await controller.release(admitted, peak_rss_mb=900)
+    expected = (1 - EWMA_ALPHA) * 500 + EWMA_ALPHA * 900
+    assert float(await redis.hget(MEMORY_PROFILE_KEY, "mvideo")) == pytest.approx(expected)
+
+    # Another worker sharing the Redis profile predicts the same
+    other = AdmissionController(redis, memory_budget_mb=1000)
+    assert await other.estimate_mb("mvideo") == pytest.approx(expected)
+
+
+@pytest.mark.asyncio
+async def test_release_without_peak_keeps_the_estimate(controller, redis):
+    admitted, _ = await controller.try_admit("t1", _task("mvideo"))
+
+    await controller.release(admitted, peak_rss_mb=None)
+
+    assert controller.running == {}
+    assert await redis.hget(MEMORY_PROFILE_KEY, "mvideo") is None
+
+
+class FakeMessage:
+    def __init__(self, task, delivery_tag, headers=None):
+        self.body = json.dumps(task).encode()
+        self.delivery_tag = delivery_tag
+        self.headers = headers or {}
+        self.content_type = "application/json"
+        self.acked = False
+
+    async def ack(self):
+        self.acked = True
+
+
+class FakeExchange:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        self.published.append((message, routing_key))
+
+
+@pytest.mark.asyncio
+async def test_deferred_task_starts_once_memory_is_freed(controller, redis, monkeypatch):
+    await redis.hset(MEMORY_PROFILE_KEY, "detmir", 800)
+    worker = run_worker.ScraperWorker()
+    worker.admission = controller
+    exchange = FakeExchange()
+    worker.channel = SimpleNamespace(default_exchange=exchange)
+    started = []
+
+    async def run_spider(task, message=None, admission=None):
+        started.append((task["site_key"], admission))
+
+    monkeypatch.setattr(worker, "run_spider", run_spider)
+
+    await worker.process_message(FakeMessage(_task("detmir"), delivery_tag=1))
+    await asyncio.sleep(0)
+    (_, running), = started
+
+    # Memory is taken: the next task waits in the delay queue
+    message = FakeMessage(_task("mvideo"), delivery_tag=2)
+    await worker.process_message(message)
+    await asyncio.sleep(0)
+    assert len(started) == 1
+    assert message.acked
+    (deferred, routing_key), = exchange.published
+    assert routing_key == run_worker.DELAY_QUEUE
+    assert deferred.headers["x-admission-attempts"] == 1
+
+    # The running crawl ends; the redelivered task is admitted
+    await controller.release(running, peak_rss_mb=800)
+    await worker.process_message(FakeMessage(_task("mvideo"), delivery_tag=3, headers=deferred.headers))
+    await asyncio.sleep(0)
+    assert [site for site, _ in started] == ["detmir", "mvideo"]
+    assert len(exchange.published) == 1
@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+import inspect
+import json
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.downloadermiddlewares.httpcompression import HttpCompressionMiddleware
+from scrapy.http import HtmlResponse, Response
+from scrapy.settings import Settings
+from scrapy.utils.conf import build_component_list
+from scrapy.utils.test import get_crawler
+
+from gifty_scraper import settings as project_settings
+from gifty_scraper.middlewares import (
+    ConditionalCacheMiddleware,
+    ConditionalCacheSpiderMiddleware,
+    ConditionalCacheStore,
+    _skip_unchanged_page,
+)
+
+PAGE_URL = "https://shop.example.com/catalog/"
+HTML = b"<html><body><a href='/catalog/?page=2'>next</a></body></html>"
+
+
+class FakeStore:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, entry):
+        # Through JSON, as Redis stores it
+        self.entries[key] = json.loads(json.dumps(entry))
+
+    async def close(self):
+        pass
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+    def get_value(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+
+class CatalogSpider(Spider):
+    name = "catalog"
+    source_id = 7
+
+    def parse(self, response):
+        yield Request(f"{PAGE_URL}?page=2", callback=self.parse_page, cb_kwargs={"page": 2}, meta={"category": "toys"})
+        yield {"title": "Plush bear"}
+
+    def parse_page(self, response, page):
+        return []
+
+
+@pytest.fixture
+def spider():
+    return CatalogSpider()
+
+
+@pytest.fixture
+def store():
+    return FakeStore()
+
+
+@pytest.fixture
+def stats():
+    return FakeStats()
+
+
+def _chain(store, stats):
+    """HttpCompression and the conditional cache, in the order the project settings put them."""
+    settings = Settings()
+    settings.setmodule(project_settings)
+    order = build_component_list(settings.getwithbase("DOWNLOADER_MIDDLEWARES"))
+    middlewares = {
+        "scrapy.downloadermiddlewares.httpcompression.HttpCompressionMiddleware": HttpCompressionMiddleware.from_crawler(get_crawler()),
+        "gifty_scraper.middlewares.ConditionalCacheMiddleware": ConditionalCacheMiddleware(store, stats),
+    }
+    return [middlewares[path] for path in order if path in middlewares]
+
+
+async def _call(method, spider, **kwargs):
+    # Scrapy's own middlewares no longer take the spider argument, ours still do
+    param = inspect.signature(method).parameters.get("spider")
+    if param is not None and param.default is inspect.Parameter.empty:
+        kwargs["spider"] = spider
+    result = method(**kwargs)
+    return await result if inspect.isawaitable(result) else result
+
+
+async def _fetch(chain, spider, response_for):
+    """Runs a request for PAGE_URL through `chain` like Scrapy: requests in priority order, responses in reverse."""
+    request = Request(PAGE_URL, callback=spider.parse)
+    for mw in chain:
+        assert await _call(mw.process_request, request=request, spider=spider) is None
+    result = response_for(request)
+    for mw in reversed(chain):
+        result = await _call(mw.process_response, request=request, response=result, spider=spider)
+        if isinstance(result, Request):
+            break
+    return request, result
+
+
+async def _spider_output(spider_mw, spider, response):
+    result = response.request.callback(response, **response.request.cb_kwargs)
+    return [obj async for obj in spider_mw.process_spider_output(response, result, spider)]
+
+
+def _gzipped(request, mtime):
+    return HtmlResponse(
+        PAGE_URL,
+        body=gzip.compress(HTML, mtime=mtime),
+        headers={"Content-Encoding": "gzip", "Content-Type": "text/html"},
+        request=request,
+    )
+
+
+@pytest.mark.asyncio
+async def test_cache_hashes_the_decoded_body(spider, store, stats):
+    chain = _chain(store, stats)
+    assert [type(mw) for mw in chain] == [ConditionalCacheMiddleware, HttpCompressionMiddleware]
+
+    await _fetch(chain, spider, lambda request: _gzipped(request, mtime=1))
+    (entry,) = store.entries.values()
+    assert entry["body_hash"] == hashlib.sha1(HTML).hexdigest()
+
+    # Same page, compressed again with another gzip header: still the same body
+    request, response = await _fetch(chain, spider, lambda request: _gzipped(request, mtime=2))
+    assert stats.get_value("conditional_cache/same_body") == 1
+    assert response.body == HTML
+
+
+@pytest.mark.asyncio
+async def test_not_modified_page_replays_recorded_followups(spider, store, stats):
+    chain = _chain(store, stats)
+    spider_mw = ConditionalCacheSpiderMiddleware(SimpleNamespace(conditional_cache_store=store))
+
+    # First crawl: the page is parsed and its follow-ups are recorded with the validators
+    request, response = await _fetch(
+        chain, spider, lambda request: HtmlResponse(PAGE_URL, body=HTML, headers={"ETag": '"v1"'}, request=request)
+    )
+    first = await _spider_output(spider_mw, spider, response)
+    assert len(first) == 2
+    (entry,) = store.entries.values()
+    assert entry["etag"] == '"v1"'
+    assert entry["replayable"]
+
+    # Next crawl: a conditional request, the site answers 304
+    sent = {}
+
+    def not_modified(request):
+        sent["If-None-Match"] = request.headers.get("If-None-Match")
+        return Response(PAGE_URL, status=304, request=request)
+
+    request, response = await _fetch(chain, spider, not_modified)
+    assert sent["If-None-Match"] == b'"v1"'
+    assert response.status == 200
+    assert "not_modified" in response.flags
+    assert response.request.callback is _skip_unchanged_page
+
+    replayed = await _spider_output(spider_mw, spider, response)
+    assert len(replayed) == 1
+    followup = replayed[0]
+    assert followup.url == f"{PAGE_URL}?page=2"
+    assert followup.callback == spider.parse_page
+    assert followup.cb_kwargs == {"page": 2}
+    assert followup.meta["category"] == "toys"
+    assert stats.get_value("conditional_cache/not_modified") == 1
+
+
+@pytest.mark.asyncio
+async def test_not_modified_page_without_followups_is_fetched_again(spider, store, stats):
+    chain = _chain(store, stats)
+    store.entries[ConditionalCacheStore.key(spider, PAGE_URL)] = {"etag": '"v1"', "replayable": False}
+
+    request, result = await _fetch(chain, spider, lambda request: Response(PAGE_URL, status=304, request=request))
+
+    # No validators were sent for it, and a 304 anyway is turned into a plain refetch
+    assert "If-None-Match" not in request.headers
+    assert isinstance(result, Request)
+    assert result.dont_filter
+    assert result.meta["conditional_cache_bypass"]
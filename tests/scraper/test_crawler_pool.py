@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+import crawler_pool
+from crawler_pool import CrawlerPool
+
+
+class FakeConn:
+    """The parent end of the pipe; `on_send` plays the pool process."""
+
+    def __init__(self, on_send=None):
+        self.sent = []
+        self.replies = deque()
+        self.on_send = on_send
+        self.closed = False
+
+    def send(self, job):
+        self.sent.append(job)
+        if self.on_send:
+            self.on_send(job)
+
+    def poll(self):
+        return bool(self.replies)
+
+    def recv(self):
+        if not self.replies:
+            raise EOFError
+        return self.replies.popleft()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeProcess:
+    """Stands in for _CrawlerProcess: no real process, the test scripts its answers."""
+
+    _pids = itertools.count(1000)
+    behaviour = None  # callable(proc, job), set per test
+
+    def __init__(self, ctx, max_jobs, max_rss_mb):
+        self.pid = next(self._pids)
+        self.alive = True
+        self.killed = False
+        self.process = SimpleNamespace(exitcode=None)
+        self.conn = FakeConn(on_send=lambda job: type(self).behaviour(self, job))
+
+    def is_alive(self):
+        return self.alive
+
+    def kill(self):
+        self.killed = True
+        self.alive = False
+
+
+def answers(result):
+    def behaviour(proc, job):
+        proc.conn.replies.append(dict(result))
+
+    return behaviour
+
+
+def hangs(proc, job):
+    pass
+
+
+def crashes(proc, job):
+    proc.alive = False
+    proc.process.exitcode = -9
+
+
+@pytest.fixture
+def fake_processes(monkeypatch):
+    spawned = []
+
+    class Recorded(FakeProcess):
+        def __init__(self, *args):
+            super().__init__(*args)
+            spawned.append(self)
+
+    monkeypatch.setattr(crawler_pool, "_CrawlerProcess", Recorded)
+    monkeypatch.setattr(crawler_pool, "process_tree_rss_mb", lambda pid: 300.0)
+    monkeypatch.setattr(crawler_pool, "KILL_GRACE_S", 0)
+    return Recorded, spawned
+
+
+async def _pool(fake_processes, behaviour, size=1):
+    Recorded, spawned = fake_processes
+    Recorded.behaviour = staticmethod(behaviour)
+    pool = CrawlerPool(size=size, max_jobs=5, max_rss_mb=1000)
+    await pool.start()
+    return pool
+
+
+JOB = {"site_key": "mvideo", "spider_kwargs": {"url": "https://www.mvideo.ru/"}}
+
+
+@pytest.mark.asyncio
+async def test_finished_job_keeps_the_process(fake_processes):
+    _, spawned = fake_processes
+    pool = await _pool(fake_processes, answers({"status": "success", "rss_mb": 200.0, "recycle": False}))
+
+    result = await pool.run(JOB, timeout=30)
+
+    assert result["status"] == "success"
+    assert result["peak_rss_mb"] == 200.0  # answered before any RSS sample was taken
+    assert spawned[0].conn.sent == [{**JOB, "timeout": 30}]
+    assert len(spawned) == 1 and not spawned[0].killed
+    assert pool._idle.qsize() == 1 and pool._busy == {}
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_the_process_and_replaces_it(fake_processes):
+    _, spawned = fake_processes
+    pool = await _pool(fake_processes, hangs)
+
+    result = await pool.run(JOB, timeout=0)
+
+    assert result == {"status": "timeout", "error": "Subprocess timeout", "logs": []}
+    assert spawned[0].killed
+    assert len(spawned) == 2
+    assert pool._idle.get_nowait() is spawned[1]
+
+
+@pytest.mark.asyncio
+async def test_crash_during_job_is_reported_and_respawned(fake_processes):
+    _, spawned = fake_processes
+    pool = await _pool(fake_processes, crashes)
+
+    result = await pool.run(JOB, timeout=30)
+
+    assert result["status"] == "error"
+    assert f"Crawler process {spawned[0].pid} died" in result["error"]
+    assert "exit code -9" in result["error"]
+    assert spawned[0].killed
+    assert pool._idle.get_nowait() is spawned[1]
+    assert pool._busy == {}
+
+
+@pytest.mark.asyncio
+async def test_process_that_died_while_idle_is_replaced_before_the_job(fake_processes):
+    _, spawned = fake_processes
+    pool = await _pool(fake_processes, answers({"status": "success", "recycle": False}))
+    spawned[0].alive = False
+
+    result = await pool.run(JOB, timeout=30)
+
+    assert result["status"] == "success"
+    assert spawned[0].killed and spawned[0].conn.sent == []
+    assert spawned[1].conn.sent == [{**JOB, "timeout": 30}]
+    assert pool._idle.get_nowait() is spawned[1]
+
+
+@pytest.mark.asyncio
+async def test_process_asking_to_recycle_is_replaced(fake_processes):
+    _, spawned = fake_processes
+    pool = await _pool(fake_processes, answers({"status": "success", "rss_mb": 1200.0, "recycle": True}))
+
+    result = await pool.run(JOB, timeout=30)
+
+    assert result["status"] == "success"
+    assert result["peak_rss_mb"] == 1200.0
+    assert spawned[0].killed
+    assert pool._idle.get_nowait() is spawned[1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "max_jobs, rss_mb, answered",
+    [
+        (2, 100.0, 2),     # retires after max_jobs
+        (10, 1600.0, 1),   # retires as soon as RSS passes the limit
+        (10, 100.0, 3),    # serves until the parent closes the pipe
+    ],
+)
+async def test_pool_process_decides_when_to_recycle(monkeypatch, max_jobs, rss_mb, answered):
+    jobs = deque({"site_key": "mvideo", "n": n} for n in range(3))
+    sent = []
+
+    def recv():
+        if not jobs:
+            raise EOFError
+        return jobs.popleft()
+
+    async def run_job(job, settings, spiders):
+        return {"status": "success", "n": job["n"]}
+
+    monkeypatch.setattr(crawler_pool, "_run_job", run_job)
+    monkeypatch.setattr(crawler_pool, "_rss_mb", lambda: rss_mb)
+    conn = SimpleNamespace(recv=recv, send=sent.append)
+
+    await asyncio.wait_for(crawler_pool._serve_jobs(conn, None, {}, max_jobs, 1536), timeout=5)
+
+    assert [r["n"] for r in sent] == list(range(answered))
+    assert [r["recycle"] for r in sent] == [False] * (answered - 1) + [answered < 3]
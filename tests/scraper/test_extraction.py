@@ -0,0 +1,121 @@
+import json
+import math
+
+import pytest
+
+from gifty_scraper.extraction import js_string_json, script_json
+
+STATE = {"props": {"pageProps": {"categoryId": "3451", "title": "Конструкторы «LEGO»"}}}
+STATE_JSON = json.dumps(STATE, ensure_ascii=False).encode()
+
+
+def _page(script_tag: bytes, content: bytes = STATE_JSON) -> bytes:
+    return (
+        b"<html><head><script src='/app.js'></script></head><body>"
+        + script_tag + content + b"</script></body></html>"
+    )
+
+
+@pytest.mark.parametrize(
+    "tag",
+    [
+        b'<script id="__NEXT_DATA__" type="application/json">',
+        b'<script type="application/json" id="__NEXT_DATA__">',
+        b"<script type='application/json' id='__NEXT_DATA__' nonce='abc'>",
+        b"<script id=__NEXT_DATA__>",
+        b'<script\n  type="application/json"\n  id="__NEXT_DATA__"\n>',
+    ],
+)
+def test_script_json_finds_the_script_whatever_the_attributes(tag):
+    assert script_json(_page(tag), "__NEXT_DATA__") == STATE
+
+
+def test_script_json_skips_scripts_with_a_similar_id():
+    body = (
+        b'<script data-id="__NEXT_DATA__">{"wrong": 1}</script>'
+        b'<script id="__NEXT_DATA__2">{"wrong": 2}</script>'
+        b'<script id="__NEXT_DATA__">{"right": true}</script>'
+    )
+    assert script_json(body, "__NEXT_DATA__") == {"right": True}
+
+
+def test_script_json_keeps_escaped_quotes_and_backslashes():
+    value = {"text": 'Игрушка "Мишка" \\ 30 см', "path": "C:\\\\toys"}
+    body = _page(b'<script id="state">', json.dumps(value, ensure_ascii=False).encode())
+
+    assert script_json(body, "state") == value
+
+
+def test_script_json_accepts_nan():
+    body = _page(b'<script id="state">', b'{"rating": NaN}')
+
+    assert math.isnan(script_json(body, "state")["rating"])
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        _page(b'<script id="other">'),
+        b'<script id="__NEXT_DATA__">{"unterminated": true}',
+        _page(b'<script id="__NEXT_DATA__">', b"{not json"),
+        b"",
+    ],
+)
+def test_script_json_returns_none_when_missing_or_broken(body):
+    assert script_json(body, "__NEXT_DATA__") is None
+
+
+MARKER = b'window.appData = JSON.parse("'
+
+
+def _js_page(literal: bytes) -> bytes:
+    return b"<script>var a = 1;" + MARKER + literal + b'");window.ready = true;</script>'
+
+
+def _js_literal(value) -> bytes:
+    """The value as the site inlines it: JSON, escaped again as a JS string literal."""
+    return json.dumps(json.dumps(value, ensure_ascii=False), ensure_ascii=False)[1:-1].encode()
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {"catalog": {"data": {"items": [{"id": 1, "title": "Пазл «Котики»"}]}}},
+        {"title": 'Кукла "Маша"'},
+        {"path": "C:\\toys\\new"},
+        {"ends_with_backslash": "a\\"},
+        {"quote_after_backslash": 'a\\"b'},
+        {"unicode": "\u2009₽", "newline": "a\nb"},
+        [],
+    ],
+)
+def test_js_string_json_unescapes_the_literal(value):
+    assert js_string_json(_js_page(_js_literal(value)), MARKER) == value
+
+
+def test_js_string_json_handles_js_unicode_escapes():
+    literal = b'{\\"url\\": \\"https:\\u002F\\u002Fcdn.detmir.st\\u002Fmedia\\u002F1.jpeg\\", \\"name\\": \\"\\u041a\\u0443\\u0431\\u0438\\u043a\\u0438\\"}'
+
+    assert js_string_json(_js_page(literal), MARKER) == {
+        "url": "https://cdn.detmir.st/media/1.jpeg",
+        "name": "Кубики",
+    }
+
+
+def test_js_string_json_uses_the_first_marker():
+    body = _js_page(_js_literal({"n": 1})) + _js_page(_js_literal({"n": 2}))
+
+    assert js_string_json(body, MARKER) == {"n": 1}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"<script>window.appData = {};</script>",
+        MARKER + b'{\\"unterminated\\": 1}\\");',
+        _js_page(b"{not json"),
+        _js_page(b'\\"just a string'),
+    ],
+)
+def test_js_string_json_returns_none_when_missing_or_broken(body):
+    assert js_string_json(body, MARKER) is None
@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from gifty_scraper.pipelines import SPOOL_CLAIM_TIMEOUT_S, IngestionPipeline
+
+
+def _payload(n: int) -> dict:
+    return {
+        "items": [{"title": f"Gift {n}", "product_url": f"https://shop.example.com/{n}"}],
+        "categories": [],
+        "source_id": 7,
+        "run_id": "run-1",
+        "stats": {"count": 1},
+    }
+
+
+def _status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://api/ingest-batch")
+    return httpx.HTTPStatusError(str(code), request=request, response=httpx.Response(code, request=request))
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = IngestionPipeline()
+    pipeline.spool_dir = tmp_path / "spool"
+    pipeline.max_retries = 2
+    pipeline.backoff_base = 0  # no real sleeping between attempts
+    pipeline.send = AsyncMock()
+    return pipeline
+
+
+def _spool_file(pipeline, name: str, payload: dict, suffix: str = ".json"):
+    pipeline.spool_dir.mkdir(parents=True, exist_ok=True)
+    path = pipeline.spool_dir / f"{name}{suffix}"
+    path.write_text(json.dumps(payload), encoding="utf-8")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_deliver_retries_transient_failures_then_succeeds(pipeline):
+    pipeline.send.side_effect = [httpx.ConnectError("down"), _status_error(429), None]
+
+    assert await pipeline._deliver(_payload(1))
+
+    assert pipeline.send.await_count == 3
+    assert not pipeline.spool_dir.exists()
+
+
+@pytest.mark.asyncio
+async def test_deliver_drops_batch_rejected_with_4xx(pipeline):
+    pipeline.send.side_effect = _status_error(422)
+
+    assert await pipeline._deliver(_payload(1))
+
+    assert pipeline.send.await_count == 1
+    assert not pipeline.spool_dir.exists()
+
+
+@pytest.mark.asyncio
+async def test_deliver_spools_batch_after_last_retry(pipeline):
+    pipeline.send.side_effect = _status_error(503)
+
+    assert not await pipeline._deliver(_payload(1))
+
+    assert pipeline.send.await_count == 3  # first attempt + max_retries
+    files = list(pipeline.spool_dir.glob("*.json"))
+    assert len(files) == 1
+    assert json.loads(files[0].read_text(encoding="utf-8")) == _payload(1)
+    assert not list(pipeline.spool_dir.glob(".*.tmp"))
+
+
+@pytest.mark.asyncio
+async def test_replay_deletes_delivered_batches_and_keeps_the_rest(pipeline):
+    _spool_file(pipeline, "1-a", _payload(1))
+    _spool_file(pipeline, "2-b", _payload(2))
+    _spool_file(pipeline, "3-c", _payload(3))
+    # The first batch goes through, the second keeps failing: replay stops there
+    pipeline.send.side_effect = [None] + [httpx.ConnectError("down")] * 3
+
+    await pipeline.replay_spool()
+
+    sent = [call.args[0] for call in pipeline.send.await_args_list]
+    assert sent == [_payload(1)] + [_payload(2)] * 3
+    assert sorted(p.name for p in pipeline.spool_dir.iterdir()) == ["2-b.json", "3-c.json"]
+
+    # The next start delivers what is left, oldest first
+    pipeline.send.reset_mock(side_effect=True)
+    await pipeline.replay_spool()
+
+    assert [call.args[0] for call in pipeline.send.await_args_list] == [_payload(2), _payload(3)]
+    assert list(pipeline.spool_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_replay_picks_up_stale_claims_only(pipeline):
+    stale = _spool_file(pipeline, "1-a", _payload(1), suffix=".replaying")
+    old = time.time() - SPOOL_CLAIM_TIMEOUT_S - 60
+    os.utime(stale, (old, old))
+    # Claimed a moment ago by a spider replaying in parallel
+    _spool_file(pipeline, "2-b", _payload(2), suffix=".replaying")
+
+    await pipeline.replay_spool()
+
+    assert [call.args[0] for call in pipeline.send.await_args_list] == [_payload(1)]
+    assert [p.name for p in pipeline.spool_dir.iterdir()] == ["2-b.replaying"]
@@ -0,0 +1,56 @@
+import copy
+import importlib
+from pathlib import Path
+
+import pytest
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+
+from gifty_scraper.replay import ReplayStore, diff_golden, replay_spider
+
+FIXTURES = ReplayStore(str(Path(__file__).resolve().parents[2] / "services" / "replay_fixtures"))
+
+
+def _spider(name: str) -> Spider:
+    """The spider as scripts/replay_spiders.py builds it, from its module rather than the spider loader."""
+    module = importlib.import_module(f"gifty_scraper.spiders.{name}")
+    spidercls = next(
+        obj for obj in vars(module).values()
+        if isinstance(obj, type) and issubclass(obj, Spider) and getattr(obj, "name", None) == name
+    )
+    args = FIXTURES.spider_args(name)
+    start_urls = args.pop("start_urls", [])
+    return spidercls.from_crawler(get_crawler(spidercls), url=start_urls[0] if start_urls else None, **args)
+
+
+def test_fixtures_are_recorded():
+    # Spiders moved to the extraction helpers; their goldens come from the spiders before the move
+    assert {"detmir", "mvideo", "vseigrushki"} <= set(FIXTURES.spiders())
+
+
+@pytest.mark.parametrize("name", FIXTURES.spiders())
+def test_replayed_output_matches_golden(name):
+    golden = FIXTURES.golden(name)
+    assert golden is not None, f"{name} has no golden.json"
+
+    result = replay_spider(_spider(name), FIXTURES, repeat=1, measure_alloc=False)
+
+    assert result.errors == {}
+    assert diff_golden(golden, result.output) == []
+    assert result.pages == len(golden)
+    assert result.items == sum(len(page["items"]) for page in golden.values()) > 0
+
+
+def test_diff_golden_reports_changed_fields_and_pages():
+    golden = FIXTURES.golden("vseigrushki")
+    first_url = sorted(golden)[0]
+    actual = copy.deepcopy(golden)
+    actual[first_url]["items"][0]["price"] = "1"
+    actual[first_url]["requests"] = []
+    actual["https://vseigrushki.com/new/"] = {"items": [], "requests": []}
+
+    assert diff_golden(golden, actual) == [
+        f"{first_url}: items[0] differs in price",
+        f"{first_url}: 0 requests, golden has {len(golden[first_url]['requests'])}",
+        "https://vseigrushki.com/new/: not in golden file (run with --update-golden)",
+    ]
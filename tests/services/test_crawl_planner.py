@@ -0,0 +1,47 @@
+import fakeredis.aioredis
+import pytest
+from types import SimpleNamespace
+
+from app.services.crawl_planner import SiteBudgets, plan_window
+
+
+def _source(id, site_key, priority=50, config=None):
+    return SimpleNamespace(id=id, site_key=site_key, priority=priority, config=config)
+
+
+def test_plan_window_interleaves_sites_by_priority():
+    big = [_source(i, "big", priority=50) for i in range(1, 41)]
+    small = [_source(100, "small", priority=50), _source(101, "small", priority=50)]
+    urgent = [_source(200 + i, "urgent", priority=100) for i in range(10)]
+
+    plan = plan_window(big + urgent + small, {"big": 100, "small": 100, "urgent": 100}, limit=12)
+
+    sites = [s.site_key for s in plan]
+    # Every site gets a turn right away, the urgent one first and more often than the others
+    assert sites[:3] == ["urgent", "big", "small"]
+    assert sites.count("small") == 2
+    assert sites.count("urgent") > sites.count("big") >= 3
+
+
+def test_plan_window_respects_site_budget():
+    sources = [_source(i, "big") for i in range(10)] + [_source(50, "other")]
+
+    plan = plan_window(sources, {"big": 2.7, "other": 0}, limit=10)
+
+    assert [s.id for s in plan] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_site_budgets_refill_and_overrides():
+    budgets = SiteBudgets(fakeredis.aioredis.FakeRedis(decode_responses=True), burst=4, per_hour=60)
+    sources = [_source(1, "shop"), _source(2, "slow", config={"crawl_budget": {"burst": 1, "per_hour": 1}})]
+
+    assert await budgets.available(sources, now=1000) == {"shop": 4, "slow": 1}
+    await budgets.consume({"shop": 4, "slow": 1}, now=1000)
+
+    # 60 per hour: one token back per minute, the override site stays empty
+    tokens = await budgets.available(sources, now=1000 + 120)
+    assert tokens["shop"] == pytest.approx(2)
+    assert tokens["slow"] == pytest.approx(120 / 3600)
+    # Never more than the burst
+    assert (await budgets.available(sources, now=100_000))["shop"] == 4
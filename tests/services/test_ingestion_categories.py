@@ -0,0 +1,58 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import ParsingSource
+from app.schemas.parsing import ScrapedCategory
+from app.services.ingestion import IngestionService
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sources.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[ParsingSource.__table__])
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        session.bind = engine
+        yield session
+
+    await engine.dispose()
+
+
+def _category(path: str) -> ScrapedCategory:
+    return ScrapedCategory(name=path, url=f"https://shop.example.com/{path}", site_key="shop")
+
+
+@pytest.mark.asyncio
+async def test_ingest_categories_bulk_inserts_new_urls_with_quota(sqlite_session):
+    sqlite_session.add(ParsingSource(url="https://shop.example.com/known", type="list", site_key="shop"))
+    await sqlite_session.commit()
+
+    categories = [
+        _category("known"),
+        _category("a?utm_source=tg"),
+        _category("a"),  # same URL after normalization
+        _category("b"),
+        _category("c"),
+        _category("d"),
+    ]
+    result = await IngestionService(sqlite_session).ingest_categories(categories, activation_quota=3)
+
+    # "known" counts towards today's activations, so only two new sources get activated
+    assert result == {"inserted": 4, "skipped": 2, "backlogged": 2}
+
+    rows = (await sqlite_session.execute(select(ParsingSource).order_by(ParsingSource.id))).scalars().all()
+    by_url = {r.url: r for r in rows}
+    assert by_url["https://shop.example.com/a"].status == "waiting"
+    assert by_url["https://shop.example.com/b"].is_active
+    assert by_url["https://shop.example.com/c"].status == "discovered"
+    assert not by_url["https://shop.example.com/d"].is_active
+    assert by_url["https://shop.example.com/a"].config["discovery_name"] == "a?utm_source=tg"
+
+    # Re-ingesting the same discovery page inserts nothing
+    again = await IngestionService(sqlite_session).ingest_categories(categories, activation_quota=3)
+    assert again == {"inserted": 0, "skipped": 6, "backlogged": 0}
@@ -0,0 +1,119 @@
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import CategoryMap, ParsingSource, Product, ProductDuplicateBucket, ProductPriceHistory
+from app.schemas.parsing import ScrapedProduct
+from app.services import embedding_queue
+from app.services.embedding_queue import EmbeddingQueue
+from app.services.ingestion import IngestionService
+from app.utils.bloom import BloomFilter
+from app.utils.catalog import build_content_hash, build_content_text, build_known_offer_key
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ingest.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Product.__table__, ProductDuplicateBucket.__table__, ProductPriceHistory.__table__, ParsingSource.__table__, CategoryMap.__table__],
+        )
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        session.bind = engine
+        yield session
+
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_queue(monkeypatch):
+    monkeypatch.setattr(embedding_queue, "_memory_queue", set())
+
+
+def _product(slug: str, description: str = "Warm", price: float = 100.0) -> ScrapedProduct:
+    return ScrapedProduct(
+        title=f"Plaid {slug}",
+        description=description,
+        product_url=f"https://shop.example.com/{slug}?utm_source=tg",
+        price=price,
+        site_key="shop",
+        merchant="Shop",
+        category="Home",
+    )
+
+
+@pytest.mark.asyncio
+async def test_ingest_sets_content_fields_and_enqueues_only_changed_products(sqlite_session):
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    queue = EmbeddingQueue(redis)
+
+    report, _ = await IngestionService(sqlite_session, redis=redis).ingest_batch(
+        [_product("a"), _product("b")], [], source_id=1
+    )
+    assert report == {"ingested": 2, "new": 2}
+    assert sorted(await queue.pop(10)) == ["shop:https://shop.example.com/a", "shop:https://shop.example.com/b"]
+
+    row = (await sqlite_session.execute(
+        select(Product).where(Product.gift_id == "shop:https://shop.example.com/a")
+    )).scalar_one()
+    assert row.content_text == "Plaid a Home Warm Shop"
+    assert row.content_hash == build_content_hash(build_content_text({
+        "title": "Plaid a", "category": "Home", "description": "Warm", "merchant": "Shop",
+    }))
+
+    # Re-scrape: "a" is unchanged, "b" only changed price, "c" is new, "a" twice in the batch
+    report, _ = await IngestionService(sqlite_session, redis=redis).ingest_batch(
+        [_product("a"), _product("b", price=90.0), _product("c"), _product("a")], [], source_id=1
+    )
+    assert report == {"ingested": 3, "new": 1}
+    assert await queue.pop(10) == ["shop:https://shop.example.com/c"]
+
+    # A description change alters the embedding input
+    await IngestionService(sqlite_session, redis=redis).ingest_batch(
+        [_product("b", description="Soft")], [], source_id=1
+    )
+    assert await queue.pop(10) == ["shop:https://shop.example.com/b"]
+    assert await queue.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_embedding_queue_dedupes_pending_ids():
+    queue = EmbeddingQueue(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    assert await queue.enqueue(["x", "y", "x"]) == 2
+    assert await queue.enqueue(["y", "z"]) == 1
+    assert await queue.size() == 3
+
+    first = await queue.pop(2)
+    rest = await queue.pop(10)
+    assert len(first) == 2
+    assert sorted(first + rest) == ["x", "y", "z"]
+
+
+@pytest.mark.asyncio
+async def test_known_products_filter_covers_stored_offers(sqlite_session):
+    source = ParsingSource(url="https://shop.example.com/catalog", type="list", site_key="shop", strategy="incremental")
+    sqlite_session.add(source)
+    await sqlite_session.commit()
+
+    service = IngestionService(sqlite_session, redis=fakeredis.aioredis.FakeRedis(decode_responses=True))
+    await service.ingest_batch([_product("a", price=100), _product("b", price=250.5)], [], source_id=source.id)
+
+    data = await service.known_products_filter(source.id)
+    assert data["site_key"] == "shop"
+    assert "utm_source" in data["strip_params"]
+    bloom = BloomFilter.from_dict(data)
+    assert bloom.count == 2
+    assert build_known_offer_key("shop:https://shop.example.com/a", 100) in bloom
+    assert build_known_offer_key("shop:https://shop.example.com/b", "250.50") in bloom
+    # Price change or unseen product: not known
+    assert build_known_offer_key("shop:https://shop.example.com/a", 90) not in bloom
+    assert build_known_offer_key("shop:https://shop.example.com/z", 100) not in bloom
+
+    assert await service.known_products_filter(source.id + 100) is None
@@ -0,0 +1,71 @@
+import fakeredis.aioredis
+import pytest
+
+from app.services import ingestion_stats
+from app.services.ingestion_stats import CrawlStatsBuffer
+
+
+@pytest.mark.asyncio
+async def test_stats_accumulate_in_redis_until_popped():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    buffer = CrawlStatsBuffer(redis)
+
+    await buffer.record(7, processed_items=50, new_items=10)
+    await buffer.record(7, processed_items=30, new_items=0)
+    await buffer.record(8, processed_items=1)
+
+    stats = await buffer.pop(7)
+    assert stats["processed_items"] == 80
+    assert stats["new_items"] == 10
+    assert stats["batches"] == 2
+    assert stats["duration_seconds"] >= 0
+
+    # Popping resets the crawl, other sources are untouched
+    assert await buffer.pop(7) == {}
+    assert (await buffer.pop(8))["processed_items"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_are_kept_per_run():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    buffer = CrawlStatsBuffer(redis)
+
+    await buffer.record(7, "run-1", processed_items=50)
+    await buffer.record(7, "run-2", processed_items=5)
+    assert (await buffer.pop(7, "run-1"))["processed_items"] == 50
+
+    # A late batch of the finished run (queue drain, spool replay) doesn't leak into the next one
+    await buffer.record(7, "run-1", processed_items=20)
+    assert (await buffer.pop(7, "run-2"))["processed_items"] == 5
+    assert await buffer.pop(7, "run-3") == {}
+
+
+@pytest.mark.asyncio
+async def test_stats_are_dropped_when_redis_fails(monkeypatch):
+    monkeypatch.setattr(ingestion_stats, "_memory_stats", {})
+
+    class BrokenRedis:
+        def pipeline(self, transaction=True):
+            raise ConnectionError("redis down")
+
+    buffer = CrawlStatsBuffer(BrokenRedis())
+    # Never fails the ingestion, and never parks counters in this process only
+    await buffer.record(3, "run-1", processed_items=5, new_items=2)
+
+    assert ingestion_stats._memory_stats == {}
+    assert await buffer.pop(3, "run-1") == {}
+
+
+@pytest.mark.asyncio
+async def test_stats_stay_in_memory_without_redis(monkeypatch):
+    monkeypatch.setattr(ingestion_stats, "_memory_stats", {})
+    buffer = CrawlStatsBuffer()
+
+    await buffer.record(3, "run-1", processed_items=5, new_items=2)
+    await buffer.record(3, "run-1", processed_items=5, new_items=1)
+    await buffer.record(3, "run-2", processed_items=1)
+
+    stats = await buffer.pop(3, "run-1")
+    assert stats["processed_items"] == 10
+    assert stats["new_items"] == 3
+    assert stats["batches"] == 2
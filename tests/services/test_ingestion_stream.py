@@ -0,0 +1,152 @@
+import gzip
+
+import orjson
+import pytest
+
+from app.services.ingestion_stream import (
+    CorruptedStreamError,
+    StreamDecoder,
+    ingest_ndjson_stream,
+    iter_ndjson_lines,
+    zstd,
+)
+
+
+class FakeIngestionService:
+    def __init__(self):
+        self.batches = []
+
+    async def ingest_batch(self, products, categories, source_id, run_id=None):
+        self.batches.append((list(products), list(categories), source_id))
+        return {"ingested": len(products), "new": len(products)}, {"inserted": len(categories), "skipped": 0, "backlogged": 0}
+
+
+async def _chunked(data: bytes, size: int = 37):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _ndjson(lines) -> bytes:
+    return b"".join((line if isinstance(line, bytes) else orjson.dumps(line)) + b"\n" for line in lines)
+
+
+def _product(i: int) -> dict:
+    return {"title": f"Gift {i}", "product_url": f"https://shop.example.com/p/{i}", "site_key": "shop", "price": i}
+
+
+@pytest.mark.asyncio
+async def test_gzip_stream_is_ingested_in_chunks():
+    body = gzip.compress(_ndjson([_product(i) for i in range(12)] + [
+        {"name": "Mugs", "url": "https://shop.example.com/mugs", "site_key": "shop"},
+    ]))
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body), source_id=5, content_encoding="gzip", chunk_size=5)
+
+    assert [len(p) + len(c) for p, c, _ in service.batches] == [5, 5, 3]
+    assert all(source_id == 5 for _, _, source_id in service.batches)
+    assert result.items_ingested == 12
+    assert result.items_new == 12
+    assert result.categories_ingested == 1
+    assert result.errors_count == 0
+    assert result.lines == 13
+
+
+@pytest.mark.asyncio
+async def test_bad_lines_are_reported_without_rejecting_the_batch():
+    body = _ndjson([
+        _product(1),
+        b"{not json",
+        {"title": "No url", "site_key": "shop"},
+        {"title": "Bad price", "product_url": "https://x", "site_key": "shop", "price": "free"},
+        b"[1, 2]",
+        _product(2),
+    ])
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body), source_id=1)
+
+    assert result.items_ingested == 2
+    assert [e["line"] for e in result.errors] == [2, 3, 4, 5]
+    assert "price" in result.errors[2]["error"]
+
+
+@pytest.mark.skipif(zstd is None, reason="zstd support not installed")
+@pytest.mark.asyncio
+async def test_zstd_stream_and_missing_trailing_newline():
+    body = zstd.compress(_ndjson([_product(1)]) + orjson.dumps(_product(2)))
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body, size=8), source_id=1, content_encoding="zstd")
+
+    assert result.items_ingested == 2
+
+
+@pytest.mark.asyncio
+async def test_oversized_line_is_skipped_without_buffering_it():
+    body = _ndjson([_product(1)]) + b'{"title": "' + b"x" * 500 + b'"}\n' + _ndjson([_product(2)])
+
+    lines = [line async for line in iter_ndjson_lines(_chunked(body, size=64), max_line_bytes=200)]
+
+    assert [no for no, _ in lines] == [1, 2, 3]
+    assert lines[1][1] is None
+    assert orjson.loads(lines[2][1])["title"] == "Gift 2"
+
+
+@pytest.mark.asyncio
+async def test_corrupted_gzip_keeps_decoded_prefix():
+    good = gzip.compress(_ndjson([_product(i) for i in range(3)]))
+    body = good[:-8] + b"garbage!" + b"\x00" * 64
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body, size=16), source_id=1, content_encoding="gzip")
+
+    # Lines decoded before the damaged chunk are kept
+    assert result.items_ingested == 2
+    assert result.truncated
+    assert result.errors == [{"line": 3, "error": result.errors[0]["error"]}]
+    assert "decompress" in result.errors[0]["error"]
+
+
+@pytest.mark.asyncio
+async def test_multi_member_gzip_is_fully_decoded():
+    body = gzip.compress(_ndjson([_product(1), _product(2)])) + gzip.compress(_ndjson([_product(3)]))
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body, size=16), source_id=1, content_encoding="gzip")
+
+    assert result.items_ingested == 3
+    assert not result.truncated
+
+
+@pytest.mark.asyncio
+async def test_truncated_gzip_is_reported():
+    body = gzip.compress(_ndjson([_product(i) for i in range(3)]))[:-6]
+    service = FakeIngestionService()
+
+    result = await ingest_ndjson_stream(service, _chunked(body), source_id=1, content_encoding="gzip")
+
+    assert result.items_ingested == 3
+    assert result.truncated
+    assert "ended before" in result.errors[0]["error"]
+
+
+@pytest.mark.parametrize("encoding", [
+    "gzip",
+    pytest.param("zstd", marks=pytest.mark.skipif(zstd is None, reason="zstd support not installed")),
+])
+def test_decoder_output_is_bounded(encoding):
+    bomb = b"\n" * (4 * 1024 * 1024)
+    body = gzip.compress(bomb) if encoding == "gzip" else zstd.compress(bomb)
+    decoder = StreamDecoder(encoding, max_output=64 * 1024)
+
+    pieces = [len(piece) for piece in decoder.feed(body)] + [len(piece) for piece in decoder.finish()]
+
+    assert max(pieces) <= 64 * 1024
+    assert sum(pieces) == len(bomb)
+
+
+def test_decoder_rejects_trailing_garbage():
+    decoder = StreamDecoder("gzip")
+    with pytest.raises(CorruptedStreamError):
+        list(decoder.feed(gzip.compress(b"{}\n") + b"not gzip"))
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import Product, ProductDuplicateBucket
+from app.repositories.catalog import PostgresCatalogRepository
+from app.services.near_duplicates import NearDuplicateIndex
+from app.utils.near_duplicates import (
+    collapse_duplicates,
+    hamming_distance,
+    normalize_title,
+    price_band,
+    title_simhash,
+)
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'dups.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Product.__table__, ProductDuplicateBucket.__table__])
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        session.bind = engine
+        yield session
+
+    await engine.dispose()
+
+
+def test_title_signature_ignores_order_case_and_filler_words():
+    a = title_simhash("Наушники Sony WH-1000XM4, чёрные")
+    b = title_simhash("SONY WH-1000XM4 наушники черные — подарок")
+    assert a == b
+    assert normalize_title("Кружка «Кот» 350 мл") == ["кружка", "кот", "350", "мл"]
+    assert title_simhash("!!!") is None
+
+    other = title_simhash("Плед флисовый клетчатый 150x200")
+    assert hamming_distance(a, other) > 3
+    assert -(1 << 63) <= a < (1 << 63)
+
+
+def test_price_bands_are_log_scale():
+    assert price_band(1050) == price_band(1250)
+    # Close prices across a band edge are neighbours (and still compared on lookup)
+    assert price_band(1100) - price_band(1000) == 1
+    assert price_band(1000) != price_band(5000)
+    assert price_band(None) is None
+
+
+def test_collapse_keeps_best_ranked_member():
+    products = [
+        SimpleNamespace(gift_id="mvideo:1", duplicate_cluster_id="mvideo:1"),
+        SimpleNamespace(gift_id="detmir:7", duplicate_cluster_id=None),
+        SimpleNamespace(gift_id="letu:3", duplicate_cluster_id="mvideo:1"),
+        SimpleNamespace(gift_id="letu:4"),
+    ]
+    assert [p.gift_id for p in collapse_duplicates(products)] == ["mvideo:1", "detmir:7", "letu:4"]
+
+
+async def _clusters(session) -> dict:
+    result = await session.execute(select(Product.gift_id, Product.duplicate_cluster_id))
+    return dict(result.all())
+
+
+@pytest.mark.asyncio
+async def test_index_clusters_same_item_across_merchants_incrementally(sqlite_session):
+    repo = PostgresCatalogRepository(sqlite_session)
+    index = NearDuplicateIndex(repo)
+
+    def row(gift_id, title, price):
+        return {"gift_id": gift_id, "title": title, "price": price, "product_url": f"https://x/{gift_id}", "is_active": True}
+
+    first = [
+        row("mvideo:1", "Наушники Sony WH-1000XM4 черные", 24990),
+        row("detmir:9", "Детский конструктор LEGO City 60337", 8990),
+    ]
+    await repo.upsert_products(first)
+    await index.assign(first)
+    await sqlite_session.commit()
+
+    # Later ingests from other merchants join the existing clusters
+    second = [
+        row("letu:5", "Sony WH-1000XM4 наушники, черные", 25990),
+        row("ozon:2", "Наушники Sony WH-1000XM4 черные", 69990),  # same title, very different price
+        row("ozon:3", "LEGO City 60337 конструктор детский", 8490),
+    ]
+    await repo.upsert_products(second)
+    assigned = await index.assign(second)
+    await sqlite_session.commit()
+
+    assert assigned == {"letu:5": "mvideo:1", "ozon:2": "ozon:2", "ozon:3": "detmir:9"}
+    assert await _clusters(sqlite_session) == {
+        "mvideo:1": "mvideo:1",
+        "detmir:9": "detmir:9",
+        "letu:5": "mvideo:1",
+        "ozon:2": "ozon:2",
+        "ozon:3": "detmir:9",
+    }
+
+    # Re-assigning a retitled product replaces its buckets
+    await index.assign([row("letu:5", "Плед флисовый клетчатый", 25990)])
+    await sqlite_session.commit()
+    assert (await _clusters(sqlite_session))["letu:5"] == "letu:5"
+    buckets = await sqlite_session.execute(
+        select(ProductDuplicateBucket.bucket).where(ProductDuplicateBucket.gift_id == "letu:5")
+    )
+    assert len(buckets.scalars().all()) == 4
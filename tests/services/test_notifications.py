@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.services.notifications import NotificationService
+from app.utils.rabbitmq import InMemoryBroker, RabbitPublisher
+
+
+async def _drain(service: NotificationService):
+    for _ in range(100):
+        if service.buffered == 0:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_notify_does_not_wait_for_broker_and_coalesces_repeats():
+    broker = InMemoryBroker()
+    service = NotificationService(RabbitPublisher(broker), coalesce_window_s=0.05, tick_s=0.01)
+
+    for _ in range(5):
+        assert await service.notify("errors", "Vector search failed", data={"error": "timeout"})
+    await service.notify("private", "Reminder", data={"target_chat_id": 1})
+    await service.notify("private", "Reminder", data={"target_chat_id": 2})
+    await _drain(service)
+    await asyncio.sleep(0.1)
+
+    messages = broker.messages("notifications")
+    texts = [(m["topic"], m["text"]) for m in messages]
+    assert texts[:3] == [
+        ("errors", "Vector search failed"),
+        ("private", "Reminder"),
+        ("private", "Reminder"),
+    ]
+    # One follow-up with the count once the window closes
+    assert messages[3]["data"] == {"error": "timeout", "repeat_count": 4}
+    assert len(messages) == 4
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_broker_outage_does_not_block_notify():
+    broker = InMemoryBroker()
+    broker.available = False
+    service = NotificationService(RabbitPublisher(broker, reconnect_delay_s=10), tick_s=0.01)
+
+    started = asyncio.get_running_loop().time()
+    assert await service.notify("errors", "Rerank failed")
+    assert asyncio.get_running_loop().time() - started < 0.05
+    await service.close(timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_topic_rate_limit_and_drop_policy():
+    broker = InMemoryBroker()
+    service = NotificationService(
+        RabbitPublisher(broker), buffer_size=3, topic_rate_per_min=0.001, topic_burst=1, tick_s=0.01
+    )
+
+    for i in range(5):
+        await service.notify("errors", f"error {i}")
+    await asyncio.sleep(0.05)
+
+    # The full buffer dropped the two oldest; one message per burst goes out, the rest waits
+    assert [m["text"] for m in broker.messages("notifications")] == ["error 2"]
+    assert service.buffered == 2
+    await service.close(timeout=0)
+
+    rejecting = NotificationService(RabbitPublisher(InMemoryBroker()), buffer_size=1, drop_policy="newest")
+    assert await rejecting.notify("errors", "first")
+    assert not await rejecting.notify("errors", "second")
+    await rejecting.close()
@@ -0,0 +1,130 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.jobs.price_history import compact_price_history
+from app.models import Product, ProductPriceHistory
+from app.repositories.catalog import PostgresCatalogRepository
+from app.services.price_history import PriceHistory, window_stats
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'prices.sqlite'}", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Product.__table__, ProductPriceHistory.__table__])
+
+    maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    @asynccontextmanager
+    async def factory():
+        async with maker() as session:
+            session.bind = engine
+            yield session
+
+    yield factory
+    await engine.dispose()
+
+
+def _row(gift_id, price, title="Кружка"):
+    return {"gift_id": gift_id, "title": title, "price": price, "product_url": f"https://x/{gift_id}", "content_hash": title}
+
+
+async def _points(session) -> list[tuple]:
+    result = await session.execute(
+        select(ProductPriceHistory.gift_id, ProductPriceHistory.price).order_by(ProductPriceHistory.gift_id, ProductPriceHistory.ts)
+    )
+    return [(gift_id, float(price)) for gift_id, price in result.all()]
+
+
+@pytest.mark.asyncio
+async def test_upsert_records_a_point_only_when_the_price_changes(session_factory):
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        await repo.upsert_changed_products([_row("a", 1000), _row("b", 500), _row("c", None)])
+        await session.commit()
+        # Same prices (one as a string, one with a float round trip), then a new content with the same price
+        await repo.upsert_changed_products([_row("a", "1000.00"), _row("b", 500.0000001), _row("c", None)])
+        await repo.upsert_changed_products([_row("a", 1000, title="Кружка XL")])
+        await session.commit()
+        assert await _points(session) == [("a", 1000.0), ("b", 500.0)]
+
+        await repo.upsert_changed_products([_row("a", 900), _row("b", 500), _row("c", 300)])
+        await session.commit()
+        assert await _points(session) == [("a", 1000.0), ("a", 900.0), ("b", 500.0), ("c", 300.0)]
+
+
+def test_window_stats_are_time_weighted_from_the_price_at_window_start():
+    start, end = NOW - timedelta(days=10), NOW
+    points = [
+        (NOW - timedelta(days=40), 1000),  # in effect at the window start
+        (NOW - timedelta(days=2), 800),
+        (NOW - timedelta(days=1), 700),
+    ]
+    stats = window_stats("a", points, start, end)
+    assert (stats.current, stats.min, stats.max, stats.changes) == (700, 700, 1000, 2)
+    assert stats.avg == pytest.approx((1000 * 8 + 800 + 700) / 10)
+    assert stats.drop == pytest.approx(1 - 700 / stats.avg)
+
+    # Naive timestamps (SQLite) are UTC; no points means no stats
+    assert window_stats("a", [(NOW.replace(tzinfo=None) - timedelta(days=1), 500)], start, end).avg == 500
+    assert window_stats("a", [], start, end) is None
+
+
+@pytest.mark.asyncio
+async def test_price_drops_use_the_window_and_its_anchor_point(session_factory):
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        await repo.upsert_products([_row(g, p) for g, p in (("a", 700), ("b", 1000), ("c", 1200))])
+        await repo.add_price_points([
+            {"gift_id": "a", "ts": NOW - timedelta(days=90), "price": 1200},
+            {"gift_id": "a", "ts": NOW - timedelta(days=60), "price": 1000},
+            {"gift_id": "a", "ts": NOW - timedelta(days=1), "price": 700},
+            {"gift_id": "b", "ts": NOW - timedelta(days=5), "price": 1000},
+            {"gift_id": "c", "ts": NOW - timedelta(days=20), "price": 1000},
+            {"gift_id": "c", "ts": NOW - timedelta(days=3), "price": 1200},
+        ])
+        await session.commit()
+
+        history = PriceHistory(repo)
+        stats = await history.stats(["a", "b", "c", "missing"], days=30, now=NOW)
+        assert set(stats) == {"a", "b", "c"}
+        # Only the last point before the window (1000) counts, not the older 1200
+        assert stats["a"].max == 1000 and stats["a"].min == 700
+        assert stats["b"].drop == 0 and stats["c"].drop == 0
+
+        drops = await history.price_drops(["a", "b", "c"], days=30, min_drop=0.1, now=NOW)
+        assert list(drops) == ["a"]
+        assert drops["a"] == pytest.approx(0.29, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_compaction_downsamples_old_days_and_keeps_the_anchor_past_retention(session_factory):
+    async with session_factory() as session:
+        repo = PostgresCatalogRepository(session)
+        await repo.upsert_products([_row("a", 500)])
+        old_day = (NOW - timedelta(days=100)).replace(hour=8)
+        await repo.add_price_points([
+            {"gift_id": "a", "ts": NOW - timedelta(days=500), "price": 100},
+            {"gift_id": "a", "ts": NOW - timedelta(days=400), "price": 200},
+            {"gift_id": "a", "ts": old_day, "price": 300},
+            {"gift_id": "a", "ts": old_day + timedelta(hours=5), "price": 350},
+            {"gift_id": "a", "ts": NOW - timedelta(days=1, hours=3), "price": 450},
+            {"gift_id": "a", "ts": NOW - timedelta(days=1), "price": 500},
+        ])
+        await session.commit()
+
+    counts = await compact_price_history(downsample_after_days=30, retention_days=365, now=NOW, session_factory=session_factory)
+    assert counts == {"downsampled": 1, "pruned": 1}
+
+    async with session_factory() as session:
+        # 100 is gone, 200 stays as the price at the retention cutoff, the old day keeps its last price,
+        # recent points keep full resolution
+        assert [price for _, price in await _points(session)] == [200.0, 350.0, 450.0, 500.0]
@@ -1,6 +1,7 @@
 import pytest
 import pytest_asyncio
 import uuid
+import fakeredis.aioredis
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -10,8 +11,9 @@ from pgvector.sqlalchemy import Vector
 
 from app.main import app
 from app.db import get_db, Base, get_redis
-from app.models import ParsingSource, ParsingRun, CategoryMap, Product
+from app.models import ParsingSource, ParsingRun, CategoryMap, Product, ProductDuplicateBucket, ProductPriceHistory
 from app.services.notifications import get_notification_service
+from app.utils.rabbitmq import InMemoryBroker, RabbitPublisher, get_task_publisher
 
 # --- SQLite Compiles for Postgres Dialects ---
 @compiles(UUID, "sqlite")
@@ -38,7 +40,9 @@ async def sqlite_db_session(tmp_path):
                 ParsingSource.__table__,
                 ParsingRun.__table__,
                 CategoryMap.__table__,
-                Product.__table__
+                Product.__table__,
+                ProductDuplicateBucket.__table__,
+                ProductPriceHistory.__table__,
             ],
         )
 
@@ -55,11 +59,10 @@ async def internal_client(sqlite_db_session):
     async def override_get_db():
         yield sqlite_db_session
 
+    fake_redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
     async def override_get_redis():
-        mock = AsyncMock()
-        mock.get.return_value = None
-        mock.set.return_value = True
-        return mock
+        return fake_redis
 
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_redis] = override_get_redis
@@ -93,10 +96,12 @@ async def test_parsing_internal_flow(internal_client):
     source_id = source["id"]
 
     # 2. Force Run
-    with patch("app.utils.rabbitmq.publish_parsing_task", return_value=True):
-        response = internal_client.post(f"/api/v1/internal/sources/{source_id}/force-run", headers=HEADERS)
-        assert response.status_code == 200
-        assert response.json()["status"] == "ok"
+    broker = InMemoryBroker()
+    app.dependency_overrides[get_task_publisher] = lambda: RabbitPublisher(broker)
+    response = internal_client.post(f"/api/v1/internal/sources/{source_id}/force-run", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert broker.messages("parsing_tasks")[0]["source_id"] == source_id
 
     # 3. Ingest Batch
     ingest_data = {
@@ -126,9 +131,31 @@ async def test_parsing_internal_flow(internal_client):
     response = internal_client.post("/api/v1/internal/ingest-batch", json=ingest_data, headers=HEADERS)
     assert response.status_code == 200, f"Ingest failed: {response.text}"
     res = response.json()
-    assert res["items_ingested"] >= 0 # Rowcount in SQLite might be 1 if new
+    assert res["items_ingested"] == 1
+    assert res["items_new"] == 1
     assert res["categories_ingested"] > 0
 
+    # The same batch again: the product is still ingested, but is no longer new
+    response = internal_client.post("/api/v1/internal/ingest-batch", json=ingest_data, headers=HEADERS)
+    assert response.status_code == 200, response.text
+    res = response.json()
+    assert res["items_ingested"] == 1
+    assert res["items_new"] == 0
+    assert res["categories_ingested"] == 0
+
+    # 3b. Worker reports the end of the crawl: buffered stats become one ParsingRun
+    response = internal_client.post(
+        f"/api/v1/internal/sources/{source_id}/report-status", json={"status": "waiting"}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    response = internal_client.get("/api/v1/internal/sources", headers=HEADERS)
+    assert response.status_code == 200
+    details = next(s for s in response.json() if s["id"] == source_id)
+    assert details["status"] == "waiting"
+    assert details["config"]["last_stats"]["processed_items"] == 2
+    assert details["config"]["last_stats"]["new_items"] == 1
+    assert details["config"]["last_stats"]["batches"] == 2
+
     # 4. Check Categories Tasks (CategoryMap)
     response = internal_client.get("/api/v1/internal/categories/tasks", headers=HEADERS)
     assert response.status_code == 200
@@ -150,3 +177,44 @@ async def test_parsing_internal_flow(internal_client):
     assert mon[0]["total_sources"] > 0
 
     print("\n✅ Internal Parsing API flow and Monitoring test passed successfully!")
+
+
+@pytest.mark.asyncio
+async def test_ingest_stream_gzip_ndjson(internal_client):
+    import gzip
+    import json
+    from app.config import get_settings
+    settings = get_settings()
+    HEADERS = {"X-Internal-Token": settings.internal_api_token}
+
+    response = internal_client.post("/api/v1/internal/sources", json={
+        "site_key": "mrgeek", "url": "https://mrgeek.ru/catalog/", "type": "list", "strategy": "deep"
+    }, headers=HEADERS)
+    source_id = response.json()["id"]
+
+    lines = [
+        json.dumps({"title": f"Gift {i}", "product_url": f"https://mrgeek.ru/p/{i}", "site_key": "mrgeek"})
+        for i in range(7)
+    ] + ['{"title": "broken"']
+    body = gzip.compress("\n".join(lines).encode())
+
+    response = internal_client.post(
+        f"/api/v1/internal/ingest-stream?source_id={source_id}&chunk_size=3",
+        content=body,
+        headers={**HEADERS, "Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    res = response.json()
+    assert res["products_accepted"] == 7
+    assert res["items_ingested"] == 7
+    assert res["items_new"] == 7
+    assert res["chunks"] == 3
+    assert res["errors_count"] == 1
+    assert res["errors"][0]["line"] == 8
+
+    response = internal_client.post(
+        f"/api/v1/internal/ingest-stream?source_id={source_id}",
+        content=b"{}",
+        headers={**HEADERS, "Content-Encoding": "br"},
+    )
+    assert response.status_code == 415
@@ -8,10 +8,11 @@ from sqlalchemy.dialects.postgresql import UUID, JSONB
 from pgvector.sqlalchemy import Vector
 
 from app.db import Base
-from app.models import ParsingSource, ParsingRun, CategoryMap, Product
+from app.models import ParsingSource, ParsingRun, CategoryMap, Product, ProductDuplicateBucket, ProductPriceHistory
 from app.repositories.parsing import ParsingRepository
 from app.jobs.parsing_scheduler import run_parsing_scheduler
 from app.repositories.catalog import PostgresCatalogRepository
+from app.utils.rabbitmq import InMemoryBroker, RabbitPublisher
 
 # --- SQLite Compiles for Postgres Dialects ---
 @compiles(UUID, "sqlite")
@@ -38,7 +39,9 @@ async def sqlite_db_session(tmp_path):
                 ParsingSource.__table__,
                 ParsingRun.__table__,
                 CategoryMap.__table__,
-                Product.__table__
+                Product.__table__,
+                ProductDuplicateBucket.__table__,
+                ProductPriceHistory.__table__,
             ],
         )
 
@@ -78,8 +81,8 @@ async def test_parsing_scheduler_flow(sqlite_db_session):
 
     # 3. Run the scheduler
     # We mock get_session_context to yield our sqlite session
-    # We mock publish_parsing_task to capture what is sent to RabbitMQ
-    mock_publish = MagicMock(return_value=True)
+    # A local fake broker captures what is sent to RabbitMQ
+    broker = InMemoryBroker()
     
     with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx:
         # Define an async context manager mock
@@ -91,14 +94,12 @@ async def test_parsing_scheduler_flow(sqlite_db_session):
         
         mock_ctx.return_value = AsyncContextManagerMock()
         
-        with patch("app.jobs.parsing_scheduler.publish_parsing_task", mock_publish):
-            await run_parsing_scheduler()
+        await run_parsing_scheduler(publisher=RabbitPublisher(broker))
 
     # 4. Assertions
     # Check RabbitMQ publish call
-    assert mock_publish.called
-    assert mock_publish.call_count == 1
-    task_sent = mock_publish.call_args[0][0]
+    assert len(broker.messages("parsing_tasks")) == 1
+    task_sent = broker.messages("parsing_tasks")[0]
     assert task_sent["url"] == "https://test.com/due"
     assert task_sent["site_key"] == "test_site"
 
@@ -113,6 +114,43 @@ async def test_parsing_scheduler_flow(sqlite_db_session):
 
     print("\n✅ Parsing Scheduler flow (DB -> RabbitMQ) passed!")
 
+@pytest.mark.asyncio
+async def test_parsing_scheduler_interleaves_sites(sqlite_db_session):
+    due = datetime.utcnow() - timedelta(hours=1)
+    sqlite_db_session.add_all(
+        [ParsingSource(site_key="bigshop", url=f"https://big.com/c{i}", type="list", priority=50,
+                       is_active=True, next_sync_at=due, status="waiting") for i in range(30)]
+        + [ParsingSource(site_key="smallshop", url=f"https://small.com/c{i}", type="list", priority=40,
+                         is_active=True, next_sync_at=due, status="waiting") for i in range(2)]
+    )
+    await sqlite_db_session.commit()
+
+    window = await ParsingRepository(sqlite_db_session).get_due_window(limit=100, per_site=5)
+    assert len(window) == 7
+
+    broker = InMemoryBroker()
+    with patch("app.jobs.parsing_scheduler.get_session_context") as mock_ctx:
+        class AsyncContextManagerMock:
+            async def __aenter__(self):
+                return sqlite_db_session
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        mock_ctx.return_value = AsyncContextManagerMock()
+        await run_parsing_scheduler(publisher=RabbitPublisher(broker), max_queued=4)
+
+    # The small site is not starved behind the 30 categories of the big one
+    sites = [t["site_key"] for t in broker.messages("parsing_tasks")]
+    assert sites[:2] == ["bigshop", "smallshop"]
+    assert sites.count("smallshop") == 2
+    assert len(sites) == 4
+
+    from sqlalchemy import select, func
+    queued = await sqlite_db_session.scalar(
+        select(func.count(ParsingSource.id)).where(ParsingSource.status == "queued")
+    )
+    assert queued == 4
+
 @pytest.mark.asyncio
 async def test_scraper_ingestion_with_stats(sqlite_db_session):
     from app.services.ingestion import IngestionService
@@ -153,18 +191,26 @@ async def test_scraper_ingestion_with_stats(sqlite_db_session):
         )
     ]
 
-    # Ingest products
-    # IngestionService.ingest_products callsParsingRepository.log_parsing_run and update_source_stats
-    new_count = await service.ingest_products(products, source.id)
-    assert new_count > 0
+    # Ingest products: stats are only buffered per batch
+    ingested = await service.ingest_products(products, source.id)
+    assert ingested == 1
 
-    # Verify run history (ParsingRun)
     from sqlalchemy import select
     runs_result = await sqlite_db_session.execute(select(ParsingRun))
+    assert runs_result.scalars().all() == []
+
+    # ...and written once when the crawl finishes
+    await service.finish_crawl(source.id)
+
+    # Verify run history (ParsingRun)
+    runs_result = await sqlite_db_session.execute(select(ParsingRun))
     runs = runs_result.scalars().all()
     assert len(runs) == 1
     assert runs[0].items_scraped == 1
     assert runs[0].items_new == 1
     assert runs[0].status == "completed"
+    await sqlite_db_session.refresh(source)
+    assert source.status == "waiting"
+    assert source.config["last_stats"]["processed_items"] == 1
 
     print("✅ Ingestion flow with stats logging passed!")
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.utils.rabbitmq import InMemoryBroker, RabbitPublisher
+
+
+@pytest.mark.asyncio
+async def test_publish_many_uses_one_connection():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(broker)
+    await publisher.start()
+
+    assert await publisher.publish_many("parsing_tasks", [{"source_id": 1}, {"source_id": 2}]) == 2
+    assert await publisher.publish("parsing_tasks", {"source_id": 3})
+
+    assert [m["source_id"] for m in broker.messages("parsing_tasks")] == [1, 2, 3]
+    assert broker.connects == 1
+    await publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_outage_buffers_and_flushes_in_order_after_reconnect():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(broker, buffer_size=3, reconnect_delay_s=0.01)
+    await publisher.start()
+
+    broker.available = False
+    assert await publisher.publish_many("parsing_tasks", [{"n": 1}, {"n": 2}]) == 2
+    # Only one slot left in the buffer: the accepted part is a prefix, the rest is dropped
+    assert await publisher.publish_many("parsing_tasks", [{"n": 3}, {"n": 4}]) == 1
+    assert publisher.buffered == 3
+    assert broker.messages("parsing_tasks") == []
+
+    broker.available = True
+    for _ in range(100):
+        if publisher.buffered == 0:
+            break
+        await asyncio.sleep(0.01)
+
+    assert publisher.connected
+    assert [m["n"] for m in broker.messages("parsing_tasks")] == [1, 2, 3]
+    assert await publisher.publish("parsing_tasks", {"n": 5})
+    assert [m["n"] for m in broker.messages("parsing_tasks")] == [1, 2, 3, 5]
+    await publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_start_with_broker_down_keeps_retrying():
+    broker = InMemoryBroker()
+    broker.available = False
+    publisher = RabbitPublisher(broker, reconnect_delay_s=0.01)
+    await publisher.start()
+    assert not publisher.connected
+
+    assert await publisher.publish("parsing_tasks", {"n": 1})
+    broker.available = True
+    for _ in range(100):
+        if publisher.connected and publisher.buffered == 0:
+            break
+        await asyncio.sleep(0.01)
+
+    assert broker.messages("parsing_tasks") == [{"n": 1}]
+    await publisher.close()